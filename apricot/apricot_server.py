@@ -2,29 +2,53 @@ from __future__ import annotations
 
 import inspect
 import logging
+import signal
 from typing import TYPE_CHECKING, Any, Self, cast
 
-from twisted.internet import reactor, task
+from twisted.internet import reactor, task, threads
 from twisted.internet.endpoints import quoteStringArgument, serverFromString
 from twisted.logger import Logger
 from twisted.python import log
+from twisted.web.resource import Resource
+from twisted.web.server import Site
 
-from apricot.cache import LocalCache, RedisCache, UidCache
-from apricot.ldap import OAuthLDAPServerFactory
-from apricot.oauth import OAuthBackend, OAuthClientMap, OAuthDataAdaptor
+from apricot.cache import LocalCache, NegativeCache, RedisCache, UidCache
+from apricot.ldap import (
+    LDAPSlowQueryLog,
+    LDIFExporter,
+    OAuthLDAPServerFactory,
+    RefreshCircuitBreaker,
+)
+from apricot.log_level import LOGGER_NAME
+from apricot.metrics import MetricsResource, metrics, refresh_profiler
+from apricot.oauth import (
+    FileClient,
+    OAuthBackend,
+    OAuthClient,
+    OAuthClientMap,
+    OAuthDataAdaptor,
+)
+from apricot.snapshot import FileSnapshotStore, RedisSnapshotStore
 
 if TYPE_CHECKING:
-    from twisted.internet.interfaces import IReactorCore, IStreamServerEndpoint
+    from types import FrameType
+
+    from twisted.internet.interfaces import (
+        IReactorCore,
+        IReactorThreads,
+        IStreamServerEndpoint,
+    )
+    from twisted.python.failure import Failure
 
 
 class ApricotServer:
     """The Apricot server running via Twisted."""
 
-    def __init__(  # noqa: PLR0913
+    def __init__(  # noqa: C901, PLR0912, PLR0913, PLR0915
         self: Self,
         backend: OAuthBackend,
-        client_id: str,
-        client_secret: str,
+        client_id: str | None,
+        client_secret: str | None,
         domain: str,
         port: int,
         *,
@@ -33,10 +57,27 @@ class ApricotServer:
         debug: bool = False,
         enable_mirrored_groups: bool = True,
         enable_primary_groups: bool = True,
+        enable_transitive_membership: bool = False,
         enable_user_domain_verification: bool = True,
+        ldif_export: str | None = None,
+        ldif_export_only: bool = False,
+        max_value_range: int = 0,
+        metrics_port: int | None = None,
+        negative_cache_size: int = 10000,
+        negative_cache_ttl: int = 60,
+        profile_refresh: str | None = None,
+        profile_refresh_threshold: float = 30,
         redis_host: str | None = None,
         redis_port: int | None = None,
+        refresh_backoff: float = 10,
         refresh_interval: int = 60,
+        refresh_max_backoff: float = 600,
+        refresh_max_shrink: float = 0.5,
+        refresh_shrink_confirmations: int = 3,
+        shared_refresh: bool = False,
+        slow_query_log: str | None = None,
+        slow_query_threshold: float | None = None,
+        snapshot_path: str | None = None,
         tls_port: int | None = None,
         tls_certificate: str | None = None,
         tls_private_key: str | None = None,
@@ -47,8 +88,8 @@ class ApricotServer:
         Args:
             allow_anonymous_binds: Whether to allow anonymous LDAP binds
             backend: An OAuth backend,
-            client_id: An OAuth client ID
-            client_secret: An OAuth client secret
+            client_id: An OAuth client ID (required by OAuth backends)
+            client_secret: An OAuth client secret (required by OAuth backends)
             domain: The OAuth domain
             port: Port to expose LDAP on
             background_refresh: Whether to refresh the LDAP tree in the background
@@ -56,18 +97,49 @@ class ApricotServer:
             enable_mirrored_groups: Whether to create a mirrored LDAP group-of-groups
                 for each group-of-users
             enable_primary_groups: Whether to create an LDAP primary group for each user
+            enable_transitive_membership: Whether to add an isMemberOf attribute listing
+                nested group memberships
             enable_user_domain_verification: Whether to verify users belong to the
                 correct domain
+            ldif_export: Where to export the LDAP tree as LDIF when SIGUSR1 is received:
+                a file, a UNIX socket or '-' for standard output
+            ldif_export_only: Whether to export the LDAP tree once instead of serving it
+            max_value_range: Maximum number of values of an attribute to return in a
+                search result, or 0 for no limit
+            metrics_port: Port to serve Prometheus metrics on (if used)
+            negative_cache_size: Maximum number of lookups and searches that found
+                nothing to remember, or 0 to disable the negative cache
+            negative_cache_ttl: Time in seconds to remember lookups and searches that
+                found nothing
+            profile_refresh: Directory in which to save a profile of each slow refresh
+            profile_refresh_threshold: Time in seconds after which a refresh is slow
             redis_host: Host for a Redis cache (if used)
             redis_port: Port for a Redis cache (if used)
+            refresh_backoff: Time in seconds to wait before retrying a failed refresh,
+                which doubles with each consecutive failure
             refresh_interval: Interval after which the LDAP information is stale
+            refresh_max_backoff: Maximum time in seconds to wait before retrying a
+                failed refresh
+            refresh_max_shrink: Largest fraction of users or groups that a refresh may
+                remove from the LDAP tree, or 1 to allow any change
+            refresh_shrink_confirmations: Number of consecutive refreshes that must
+                return the same smaller directory before it is served
+            shared_refresh: Whether to share the LDAP tree with other replicas using the
+                same Redis server, so that only one of them queries the OAuth backend
+            slow_query_log: File to write slow LDAP requests to instead of the main log
+            slow_query_threshold: Time in seconds after which LDAP requests are logged
+                as slow (if used)
+            snapshot_path: Path to a file used to persist the LDAP tree between restarts
             tls_port: Port to expose LDAPS on
             tls_certificate: TLS certificate for LDAPS
             tls_private_key: TLS private key for LDAPS
             kwargs: Backend-dependent arguments
 
         Raises:
-            ValueError: if the OAuth backend could not be initialised
+            ValueError: if the OAuth backend could not be initialised or is missing
+                its credentials, if shared
+                refresh is requested without a Redis server or if an export is
+                requested without a target
         """
         # Set up Python root logger
         logging.basicConfig(
@@ -76,16 +148,28 @@ class ApricotServer:
             format=r"%(asctime)s [%(levelname)-8s] %(message)s",
         )
         if debug:
-            logging.getLogger("apricot").setLevel(logging.DEBUG)
+            logging.getLogger(LOGGER_NAME).setLevel(logging.DEBUG)
 
         # Configure Twisted loggers to write to Python logging
-        observer = log.PythonLoggingObserver("apricot")
+        observer = log.PythonLoggingObserver(LOGGER_NAME)
         observer.start()
         self.logger = Logger()
 
         # Load the Twisted reactor
         self.reactor = cast("IReactorCore", reactor)
 
+        # Profile slow refreshes
+        if profile_refresh:
+            self.logger.info(
+                "Saving profiles of refreshes slower than {threshold}s to '{path}'.",
+                threshold=profile_refresh_threshold,
+                path=profile_refresh,
+            )
+            refresh_profiler.enable_profiling(
+                profile_refresh,
+                profile_refresh_threshold,
+            )
+
         # Initialise the UID cache
         uid_cache: UidCache
         if redis_host and redis_port:
@@ -100,21 +184,32 @@ class ApricotServer:
             uid_cache = LocalCache()
 
         # Initialise the appropriate OAuth client
+        oauth_backend = OAuthClientMap[backend]
+        oauth_backend_kwargs = {
+            arg: kwargs[arg]
+            for arg in inspect.getfullargspec(
+                oauth_backend.__init__,  # type: ignore[misc]
+            ).args
+            if arg in kwargs
+        }
+        # Only OAuth backends need client credentials
+        if issubclass(oauth_backend, OAuthClient):
+            if not (client_id and client_secret):
+                msg = (
+                    f"The {backend.value} backend requires OAuth client credentials. "
+                    "Please provide them with --client-id and --client-secret."
+                )
+                raise ValueError(msg)
+            oauth_backend_kwargs |= {
+                "client_id": client_id,
+                "client_secret": client_secret,
+            }
         try:
             self.logger.debug(
                 "Creating an OAuthClient for the {backend} backend.",
                 backend=backend.value,
             )
-            oauth_backend = OAuthClientMap[backend]
-            oauth_backend_args = inspect.getfullargspec(
-                oauth_backend.__init__,  # type: ignore[misc]
-            ).args
-            oauth_client = oauth_backend(
-                client_id=client_id,
-                client_secret=client_secret,
-                uid_cache=uid_cache,
-                **{k: v for k, v in kwargs.items() if k in oauth_backend_args},
-            )
+            oauth_client = oauth_backend(uid_cache=uid_cache, **oauth_backend_kwargs)
         except Exception as exc:
             msg = (
                 f"Could not construct an OAuth client for the {backend.value} backend."
@@ -129,9 +224,55 @@ class ApricotServer:
             oauth_client,
             enable_mirrored_groups=enable_mirrored_groups,
             enable_primary_groups=enable_primary_groups,
+            enable_transitive_membership=enable_transitive_membership,
             enable_user_domain_verification=enable_user_domain_verification,
         )
 
+        # Initialise the directory snapshot store
+        snapshot_store = None
+        if snapshot_path:
+            self.logger.info(
+                "Using a directory snapshot at '{path}'.",
+                path=snapshot_path,
+            )
+            snapshot_store = FileSnapshotStore(snapshot_path)
+
+        # Initialise the shared snapshot store
+        shared_store = None
+        if shared_refresh:
+            if not (redis_host and redis_port):
+                msg = (
+                    "Shared refresh requires a Redis server. "
+                    "Please provide one with --redis-host and --redis-port."
+                )
+                raise ValueError(msg)
+            self.logger.info("Sharing the LDAP tree with other replicas using Redis.")
+            shared_store = RedisSnapshotStore(
+                redis_host=redis_host,
+                redis_port=redis_port,
+                namespace=f"apricot-{domain}",
+            )
+
+        # Initialise the negative cache
+        negative_cache = None
+        if negative_cache_size > 0:
+            negative_cache = NegativeCache(
+                max_size=negative_cache_size,
+                ttl=negative_cache_ttl,
+            )
+
+        # Initialise the slow query log
+        ldap_slow_query_log = None
+        if slow_query_threshold is not None:
+            self.logger.info(
+                "Logging LDAP requests slower than {threshold}s.",
+                threshold=slow_query_threshold,
+            )
+            ldap_slow_query_log = LDAPSlowQueryLog(
+                slow_query_threshold,
+                slow_query_log,
+            )
+
         # Create an OAuthLDAPServerFactory
         self.logger.debug("Creating an OAuthLDAPServerFactory.")
         factory = OAuthLDAPServerFactory(
@@ -139,16 +280,74 @@ class ApricotServer:
             oauth_client,
             allow_anonymous_binds=allow_anonymous_binds,
             background_refresh=background_refresh,
+            circuit_breaker=RefreshCircuitBreaker(
+                backoff=refresh_backoff,
+                max_backoff=refresh_max_backoff,
+                max_shrink=refresh_max_shrink,
+                shrink_confirmations=refresh_shrink_confirmations,
+            ),
+            max_value_range=max_value_range,
+            negative_cache=negative_cache,
             refresh_interval=refresh_interval,
+            shared_store=shared_store,
+            slow_query_log=ldap_slow_query_log,
+            snapshot_store=snapshot_store,
         )
 
+        # Export the LDAP tree once without serving it
+        self.ldif_export = ldif_export
+        self.ldif_exporter = LDIFExporter(factory.adaptor)
+        self.ldif_export_only = ldif_export_only
+        if ldif_export_only:
+            if not ldif_export:
+                msg = (
+                    "No LDIF export target provided. "
+                    "Please provide one with --ldif-export."
+                )
+                raise ValueError(msg)
+            return
+
+        # Export the LDAP tree whenever SIGUSR1 is received
+        if ldif_export:
+            self.logger.info(
+                "Exporting the LDAP tree to '{target}' on SIGUSR1.",
+                target=ldif_export,
+            )
+            signal.signal(signal.SIGUSR1, self.handle_export_signal)
+
+        # Load each tree published by the leader replica as soon as it is available
+        if shared_store:
+            shared_store.subscribe(factory.adaptor.refresh_from_shared_store)
+
+        # If we are serving a snapshot then run the first refresh in a separate thread
+        if factory.adaptor.stale:
+            self.logger.info("Serving the directory snapshot until the first refresh.")
+            self.reactor.callWhenRunning(self.refresh_in_thread, factory)
+
         if background_refresh:
             self.logger.info(
                 "Starting background refresh (interval={interval})",
                 interval=refresh_interval,
             )
             loop = task.LoopingCall(factory.adaptor.refresh)
-            loop.start(refresh_interval)
+            loop.start(refresh_interval, now=not factory.adaptor.stale)
+
+        # Refresh as soon as a file export changes
+        if isinstance(oauth_client, FileClient):
+            self.logger.info(
+                "Checking '{path}' for changes every {interval} seconds.",
+                interval=oauth_client.poll_interval,
+                path=str(oauth_client.path),
+            )
+            task.LoopingCall(
+                self.refresh_if_changed,
+                factory,
+                oauth_client,
+            ).start(oauth_client.poll_interval, now=False)
+
+        # Serve metrics over HTTP
+        if metrics_port:
+            self.serve_metrics(factory, metrics_port)
 
         # Attach a listening endpoint
         self.logger.info("Listening for LDAP requests on port {port}.", port=port)
@@ -185,6 +384,84 @@ class ApricotServer:
             )
             ssl_endpoint.listen(factory)
 
+    def refresh_in_thread(self: Self, factory: OAuthLDAPServerFactory) -> None:
+        """Refresh the LDAP tree without blocking the reactor.
+
+        Args:
+            factory: The OAuthLDAPServerFactory whose tree should be refreshed
+        """
+
+        def failure_callback(failure: Failure) -> None:
+            self.logger.error(
+                "Failed to refresh LDAP tree. {error}",
+                error=failure.getErrorMessage(),
+            )
+
+        threads.deferToThread(factory.adaptor.refresh).addErrback(failure_callback)
+
+    def export_in_thread(self: Self) -> None:
+        """Export the LDAP tree as LDIF without blocking the reactor."""
+
+        def failure_callback(failure: Failure) -> None:
+            self.logger.error(
+                "Failed to export LDAP tree. {error}",
+                error=failure.getErrorMessage(),
+            )
+
+        threads.deferToThread(
+            self.ldif_exporter.export,
+            self.ldif_export,
+        ).addErrback(failure_callback)
+
+    def handle_export_signal(self: Self, signum: int, frame: FrameType | None) -> None:
+        """Schedule an export of the LDAP tree when SIGUSR1 is received.
+
+        Args:
+            signum: The signal that was received
+            frame: The stack frame that was interrupted
+        """
+        id((signum, frame))  # ignore unused arguments
+        cast("IReactorThreads", self.reactor).callFromThread(self.export_in_thread)
+
+    def refresh_if_changed(
+        self: Self,
+        factory: OAuthLDAPServerFactory,
+        file_client: FileClient,
+    ) -> None:
+        """Refresh the LDAP tree if the export read by a file client has changed.
+
+        Args:
+            factory: The OAuthLDAPServerFactory whose tree should be refreshed
+            file_client: The FileClient whose export should be checked
+        """
+        if factory.adaptor.refresh_lock.locked() or not file_client.has_changed():
+            return
+        self.logger.info(
+            "Refreshing the LDAP tree as '{path}' has changed.",
+            path=str(file_client.path),
+        )
+        factory.adaptor.stale = True
+        self.refresh_in_thread(factory)
+
+    def serve_metrics(self: Self, factory: OAuthLDAPServerFactory, port: int) -> None:
+        """Start recording metrics and serve them over HTTP at '/metrics'.
+
+        Args:
+            factory: The OAuthLDAPServerFactory whose tree should be described
+            port: Port to serve metrics on
+        """
+        metrics.enabled = True
+        metrics.add_collector(factory.adaptor.collect_metrics)
+        root = Resource()  # type: ignore[no-untyped-call]
+        root.putChild(b"metrics", MetricsResource(metrics))  # type: ignore[arg-type]
+        self.logger.info("Serving metrics at /metrics on port {port}.", port=port)
+        endpoint: IStreamServerEndpoint = serverFromString(self.reactor, f"tcp:{port}")
+        endpoint.listen(Site(root))  # type: ignore[no-untyped-call]
+
     def run(self: Self) -> None:
-        """Start the Twisted reactor."""
+        """Start the Twisted reactor, or export the LDAP tree if requested."""
+        if self.ldif_export_only and self.ldif_export:
+            self.ldif_exporter.tree.refresh()
+            self.ldif_exporter.export(self.ldif_export)
+            return
         self.reactor.run()
@@ -1,9 +1,11 @@
 from .local_cache import LocalCache
+from .negative_cache import NegativeCache
 from .redis_cache import RedisCache
 from .uid_cache import UidCache
 
 __all__ = [
     "LocalCache",
+    "NegativeCache",
     "RedisCache",
     "UidCache",
 ]
@@ -28,4 +28,5 @@ class LocalCache(UidCache):
 
     @override
     def values(self: Self, keys: list[str]) -> list[int]:
-        return [v for k, v in self.cache.items() if k in keys]
+        keys_ = set(keys)
+        return [v for k, v in self.cache.items() if k in keys_]
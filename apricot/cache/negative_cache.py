@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Self
+
+
+class NegativeCache:
+    """A bounded cache of LDAP lookups and searches that found nothing.
+
+    Each key is stored with the generation of the LDAP tree it was found to be missing
+    from, so a miss is forgotten as soon as a new tree is built. Misses also expire
+    after a fixed time, and the least recently used miss is dropped when the cache is
+    full.
+    """
+
+    def __init__(self: Self, *, max_size: int = 10000, ttl: float = 60) -> None:
+        """Initialise a NegativeCache.
+
+        Args:
+            max_size: Maximum number of misses to remember
+            ttl: Time in seconds after which a miss is forgotten
+        """
+        self.entries: OrderedDict[tuple[int, str], float] = OrderedDict()
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.additions = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def add(self: Self, generation: int, key: str) -> None:
+        """Remember that a lookup or search found nothing.
+
+        Args:
+            generation: Generation of the LDAP tree that was searched
+            key: Normalised distinguished name or search that found nothing
+        """
+        cache_key = (generation, key)
+        with self.lock:
+            self.entries[cache_key] = time.monotonic() + self.ttl
+            self.entries.move_to_end(cache_key)
+            self.additions += 1
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def contains(self: Self, generation: int, key: str) -> bool:
+        """Whether a lookup or search is known to find nothing.
+
+        Args:
+            generation: Generation of the LDAP tree being searched
+            key: Normalised distinguished name or search
+
+        Returns:
+            True if the same lookup or search recently found nothing in this
+            generation of the LDAP tree.
+        """
+        cache_key = (generation, key)
+        with self.lock:
+            if (expiry := self.entries.get(cache_key)) is None:
+                self.misses += 1
+                return False
+            if expiry < time.monotonic():
+                del self.entries[cache_key]
+                self.expirations += 1
+                self.misses += 1
+                return False
+            self.entries.move_to_end(cache_key)
+            self.hits += 1
+            return True
+
+    def stats(self: Self) -> dict[str, int]:
+        """Counters describing how the cache has been used.
+
+        Returns:
+            A dictionary of counters.
+        """
+        return {
+            "additions": self.additions,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+        }
@@ -5,12 +5,16 @@ from typing import Self, cast
 import redis
 from typing_extensions import override
 
+from apricot.metrics import metrics
+
 from .uid_cache import UidCache
 
 
 class RedisCache(UidCache):
     """Implementation of UidCache using a Redis backend."""
 
+    metric = "apricot_uid_cache_request_duration_seconds"
+
     def __init__(self: Self, redis_host: str, redis_port: int) -> None:
         """Initialise a RedisCache.
 
@@ -39,17 +43,23 @@ class RedisCache(UidCache):
 
     @override
     def get(self: Self, identifier: str) -> int | None:
-        value = self.cache.get(identifier)
+        with metrics.timer(self.metric, operation="get"):
+            value = self.cache.get(identifier)
         return None if value is None else int(value)
 
     @override
     def keys(self: Self) -> list[str]:
-        return [str(k) for k in self.cache.keys()]  # noqa: SIM118
+        with metrics.timer(self.metric, operation="keys"):
+            keys = self.cache.keys()
+        return [str(k) for k in keys]
 
     @override
     def set(self: Self, identifier: str, uid_value: int) -> None:
-        self.cache.set(identifier, uid_value)
+        with metrics.timer(self.metric, operation="set"):
+            self.cache.set(identifier, uid_value)
 
     @override
     def values(self: Self, keys: list[str]) -> list[int]:
-        return [int(cast("str", v)) for v in self.cache.mget(keys)]
+        with metrics.timer(self.metric, operation="mget"):
+            values = self.cache.mget(keys)
+        return [int(cast("str", v)) for v in values]
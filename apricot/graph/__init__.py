@@ -0,0 +1,5 @@
+from .membership_graph import MembershipGraph
+
+__all__ = [
+    "MembershipGraph",
+]
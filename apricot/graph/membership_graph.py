@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class MembershipGraph:
+    """A directed graph from each member to the groups it directly belongs to.
+
+    The transitive closure is computed in a single pass. Strongly connected
+    components are found with Tarjan's algorithm, so membership cycles are detected
+    and every member of a cycle belongs to every group in it. Each component is
+    visited after all of the components it points to, so the groups of each component
+    are computed once from the groups of its direct parents.
+    """
+
+    def __init__(self: Self) -> None:
+        """Initialise a MembershipGraph."""
+        self.logger = Logger()
+        self.parents: dict[str, list[str]] = {}
+
+    def add_memberships(self: Self, member: str, groups: list[str]) -> None:
+        """Record that a member belongs directly to some groups.
+
+        Args:
+            member: Identifier of the member, such as its distinguished name
+            groups: Identifiers of the groups it belongs to
+        """
+        self.parents.setdefault(member, []).extend(groups)
+
+    def components(self: Self) -> list[list[str]]:
+        """Find the strongly connected components of this graph.
+
+        Returns:
+            A list of components, each of which is a list of nodes. Each component
+            comes after every component that it has an edge to.
+        """
+        index: dict[str, int] = {}
+        lowlink: dict[str, int] = {}
+        on_stack: set[str] = set()
+        stack: list[str] = []
+        components: list[list[str]] = []
+        for root in list(self.parents):
+            if root in index:
+                continue
+            # Iterative depth-first search to avoid hitting the recursion limit
+            work = [(root, iter(self.parents.get(root, [])))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, edges = work[-1]
+                parent = self._next_unvisited(node, edges, index, lowlink, on_stack)
+                if parent is not None:
+                    index[parent] = lowlink[parent] = len(index)
+                    stack.append(parent)
+                    on_stack.add(parent)
+                    work.append((parent, iter(self.parents.get(parent, []))))
+                    continue
+                work.pop()
+                if work:
+                    caller = work[-1][0]
+                    lowlink[caller] = min(lowlink[caller], lowlink[node])
+                if lowlink[node] == index[node]:
+                    # This node and every node above it form a component
+                    component = [stack.pop()]
+                    while component[-1] != node:
+                        component.append(stack.pop())
+                    on_stack.difference_update(component)
+                    components.append(component)
+        return components
+
+    @staticmethod
+    def _next_unvisited(
+        node: str,
+        edges: Iterator[str],
+        index: dict[str, int],
+        lowlink: dict[str, int],
+        on_stack: set[str],
+    ) -> str | None:
+        """Find the next unvisited parent of a node, updating its low-link value.
+
+        Args:
+            node: The node being visited
+            edges: The remaining parents of this node
+            index: The order in which each node was visited
+            lowlink: The lowest index reachable from each node on the stack
+            on_stack: Nodes whose component has not been found yet
+
+        Returns:
+            The next unvisited parent or None if all parents have been visited.
+        """
+        for parent in edges:
+            if parent not in index:
+                return parent
+            if parent in on_stack:
+                lowlink[node] = min(lowlink[node], index[parent])
+        return None
+
+    def transitive_groups(self: Self) -> dict[str, frozenset[str]]:
+        """Find every group that each member belongs to, directly or through nesting.
+
+        Returns:
+            A dictionary mapping each node to the set of groups it belongs to. A node
+            only belongs to itself if it is part of a membership cycle.
+        """
+        closure: dict[str, frozenset[str]] = {}
+        for component in self.components():
+            nodes = set(component)
+            groups: set[str] = set()
+            for node in component:
+                for parent in self.parents.get(node, []):
+                    groups.add(parent)
+                    if parent not in nodes:
+                        groups.update(closure[parent])
+            if len(component) > 1 or component[0] in groups:
+                self.logger.warn(
+                    "Found a group membership cycle between {groups}.",
+                    groups=", ".join(sorted(component)),
+                )
+                groups.update(component)
+            shared_groups = frozenset(groups)
+            for node in component:
+                closure[node] = shared_groups
+        return closure
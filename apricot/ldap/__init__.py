@@ -1,5 +1,11 @@
+from .ldap_slow_query_log import LDAPSlowQueryLog
+from .ldif_exporter import LDIFExporter
 from .oauth_ldap_server_factory import OAuthLDAPServerFactory
+from .refresh_circuit_breaker import RefreshCircuitBreaker
 
 __all__ = [
+    "LDAPSlowQueryLog",
+    "LDIFExporter",
     "OAuthLDAPServerFactory",
+    "RefreshCircuitBreaker",
 ]
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, ClassVar, Self
+
+from ldaptor.protocols.pureldap import (
+    LDAPFilter_and,
+    LDAPFilter_approxMatch,
+    LDAPFilter_equalityMatch,
+    LDAPFilter_extensibleMatch,
+    LDAPFilter_greaterOrEqual,
+    LDAPFilter_lessOrEqual,
+    LDAPFilter_not,
+    LDAPFilter_or,
+    LDAPFilter_present,
+    LDAPFilter_substrings,
+    LDAPFilter_substrings_final,
+    LDAPFilter_substrings_initial,
+    LDAPSearchRequest,
+    escape,
+)
+
+from .oauth_ldap_filter_compiler import OAuthLDAPFilterCompiler
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterable, Iterator
+
+    from ldaptor.protocols.pureldap import LDAPFilter, LDAPProtocolRequest
+
+    from .oauth_ldap_entry import OAuthLDAPEntry
+
+
+class LDAPRequestStatistics:
+    """Timings and counters describing how a single LDAP request was handled.
+
+    Searches record when their base DN and attributes were parsed and when the
+    filter was applied, so the time taken to handle a search can be split into
+    parsing, looking up the base entry, evaluating the filter and sending results.
+    The statistics for the request being handled are available to the LDAP tree
+    through 'current()' while they are active.
+    """
+
+    comparisons: ClassVar[dict[type, str]] = {
+        LDAPFilter_approxMatch: "~=",
+        LDAPFilter_equalityMatch: "=",
+        LDAPFilter_greaterOrEqual: ">=",
+        LDAPFilter_lessOrEqual: "<=",
+    }
+    current_: ClassVar[ContextVar[LDAPRequestStatistics | None]] = ContextVar(
+        "current_",
+        default=None,
+    )
+
+    def __init__(
+        self: Self,
+        message_id: int,
+        operation: str,
+        request: LDAPProtocolRequest,
+    ) -> None:
+        """Initialise LDAPRequestStatistics.
+
+        Args:
+            message_id: ID of the LDAP message containing the request
+            operation: Name of the LDAP operation
+            request: LDAP request
+        """
+        self.bytes_written = 0
+        self.entries_returned = 0
+        self.entries_scanned = 0
+        self.finished_at = 0.0
+        self.message_id = message_id
+        self.operation = operation
+        self.parsed_at = 0.0
+        self.request = request
+        self.result_code: int | None = None
+        self.search_finished_at = 0.0
+        self.search_started_at = 0.0
+        self.sending_seconds = 0.0
+        self.started_at = time.perf_counter()
+
+    @classmethod
+    def current(cls: type[Self]) -> LDAPRequestStatistics | None:
+        """Get the statistics for the request that is being handled.
+
+        Returns:
+            The active statistics or None if there are none.
+        """
+        return cls.current_.get()
+
+    @property
+    def duration(self: Self) -> float:
+        """Time in seconds taken to handle the request."""
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @contextmanager
+    def activate(self: Self) -> Generator[None, None, None]:
+        """Make these statistics current while handling the request.
+
+        Yields:
+            None
+        """
+        token = self.current_.set(self)
+        try:
+            yield
+        finally:
+            self.current_.reset(token)
+
+    def scan(self: Self, entries: Iterable[OAuthLDAPEntry]) -> Iterator[OAuthLDAPEntry]:
+        """Count the entries considered by a search.
+
+        Args:
+            entries: Entries in the scope of the search
+
+        Yields:
+            Each entry.
+        """
+        for entry in entries:
+            self.entries_scanned += 1
+            yield entry
+
+    def send(
+        self: Self,
+        callback: Callable[[OAuthLDAPEntry], Any],
+    ) -> Callable[[OAuthLDAPEntry], None]:
+        """Count the entries returned by a search and the time taken to send them.
+
+        Args:
+            callback: Function called with each matching entry
+
+        Returns:
+            A function that calls the callback with each matching entry.
+        """
+
+        def send_entry(entry: OAuthLDAPEntry) -> None:
+            start = time.perf_counter()
+            callback(entry)
+            self.sending_seconds += time.perf_counter() - start
+            self.entries_returned += 1
+
+        return send_entry
+
+    def to_dict(self: Self) -> dict[str, Any]:
+        """Describe the request as a dictionary suitable for a structured log.
+
+        Returns:
+            The operation, its duration and result, and for searches the base DN,
+            scope, filter, counts of entries scanned and returned, and how long each
+            stage of the search took.
+        """
+        output: dict[str, Any] = {
+            "bytes_written": self.bytes_written,
+            "duration": round(self.duration, 6),
+            "message_id": self.message_id,
+            "operation": self.operation,
+            "result_code": self.result_code,
+        }
+        if isinstance(self.request, LDAPSearchRequest):
+            parsed_at = self.parsed_at or self.started_at
+            search_started_at = self.search_started_at or parsed_at
+            search_finished_at = self.search_finished_at or search_started_at
+            base_dn = self.request.baseObject
+            output |= {
+                "attributes": [
+                    a.decode("utf-8") if isinstance(a, bytes) else a
+                    for a in self.request.attributes
+                ],
+                "base_dn": (
+                    base_dn.decode("utf-8")
+                    if isinstance(base_dn, bytes)
+                    else base_dn.getText()
+                ),
+                "entries_returned": self.entries_returned,
+                "entries_scanned": self.entries_scanned,
+                "filter": self.filter_text(self.request.filter),
+                "filter_seconds": round(
+                    search_finished_at - search_started_at - self.sending_seconds,
+                    6,
+                ),
+                "lookup_seconds": round(search_started_at - parsed_at, 6),
+                "parse_seconds": round(parsed_at - self.started_at, 6),
+                "scope": self.request.scope,
+            }
+        return output
+
+    @staticmethod
+    def filter_text(ldap_filter: LDAPFilter) -> str:
+        """Convert an LDAP filter to text.
+
+        ldaptor can only do this for filters built from strings, whereas filters
+        received from clients hold bytes.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            The filter in the string representation used by LDAP clients.
+        """
+        filter_text = LDAPRequestStatistics.filter_text
+        if isinstance(ldap_filter, LDAPFilter_and | LDAPFilter_or):
+            operator = "&" if isinstance(ldap_filter, LDAPFilter_and) else "|"
+            return f"({operator}{''.join(map(filter_text, ldap_filter))})"
+        if isinstance(ldap_filter, LDAPFilter_not):
+            return f"(!{filter_text(ldap_filter.value)})"
+        return LDAPRequestStatistics.term_text(ldap_filter)
+
+    @staticmethod
+    def term_text(ldap_filter: LDAPFilter) -> str:
+        """Convert an LDAP filter that does not contain other filters to text.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            The filter in the string representation used by LDAP clients.
+        """
+        decode = OAuthLDAPFilterCompiler.decode
+        if isinstance(ldap_filter, LDAPFilter_present):
+            return f"({decode(ldap_filter.value)}=*)"
+        if isinstance(ldap_filter, LDAPFilter_substrings):
+            initial, final, middle = "", "", []
+            for substring in ldap_filter.substrings:
+                value = escape(decode(substring.value))
+                if isinstance(substring, LDAPFilter_substrings_initial):
+                    initial = value
+                elif isinstance(substring, LDAPFilter_substrings_final):
+                    final = value
+                else:
+                    middle.append(value)
+            return f"({decode(ldap_filter.type)}={'*'.join([initial, *middle, final])})"
+        if isinstance(ldap_filter, LDAPFilter_extensibleMatch):
+            return "".join(
+                (
+                    "(",
+                    decode(ldap_filter.type.value) if ldap_filter.type else "",
+                    (
+                        ":dn"
+                        if ldap_filter.dnAttributes and ldap_filter.dnAttributes.value
+                        else ""
+                    ),
+                    (
+                        f":{decode(ldap_filter.matchingRule.value)}"
+                        if ldap_filter.matchingRule
+                        else ""
+                    ),
+                    f":={escape(decode(ldap_filter.matchValue.value))})",
+                ),
+            )
+        if comparison := LDAPRequestStatistics.comparisons.get(type(ldap_filter)):
+            return "".join(
+                (
+                    f"({decode(ldap_filter.attributeDesc.value)}{comparison}",
+                    f"{escape(decode(ldap_filter.assertionValue.value))})",
+                ),
+            )
+        return repr(ldap_filter)
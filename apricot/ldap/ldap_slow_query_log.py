@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import threading
+import time
+from typing import TYPE_CHECKING, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from .ldap_request_statistics import LDAPRequestStatistics
+
+
+class LDAPSlowQueryLog:
+    """A structured log of LDAP requests that took longer than a threshold.
+
+    Each slow request is written as a single line of JSON, either to its own file or
+    to the main log, so that the filters that scan the most entries can be found.
+    """
+
+    def __init__(self: Self, threshold: float, path: str | None = None) -> None:
+        """Initialise an LDAPSlowQueryLog.
+
+        Args:
+            threshold: Time in seconds above which a request is slow
+            path: Optional file to append slow requests to instead of the main log
+        """
+        self.lock = threading.Lock()
+        self.logger = Logger()
+        self.path = pathlib.Path(path) if path else None
+        self.threshold = threshold
+
+    def record(self: Self, statistics: LDAPRequestStatistics, client: str) -> None:
+        """Log a request if it was slow.
+
+        Args:
+            statistics: Statistics describing how the request was handled
+            client: Address of the client that made the request
+        """
+        if statistics.duration < self.threshold:
+            return
+        line = json.dumps(
+            {
+                "client": client,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                **statistics.to_dict(),
+            },
+            sort_keys=True,
+        )
+        if not self.path:
+            self.logger.warn("Slow LDAP request: {request}", request=line)
+            return
+        try:
+            with self.lock, self.path.open("a", encoding="utf-8") as f_log:
+                f_log.write(line + "\n")
+        except OSError as exc:
+            self.logger.warn(
+                "Failed to write to the slow query log. {error}",
+                error=str(exc),
+            )
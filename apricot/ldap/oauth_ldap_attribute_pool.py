@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import sys
+from typing import TYPE_CHECKING, ClassVar, Self
+
+from .oauth_ldap_attribute_set import OAuthLDAPAttributeSet
+from .oauth_ldap_dn_set import OAuthLDAPDNSet
+from .oauth_ldap_dn_table import OAuthLDAPDNTable
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class OAuthLDAPAttributePool:
+    """Share identical attributes between the entries of a read-only LDAP tree.
+
+    Attribute names and values are interned, and entries whose attributes have the
+    same values (such as objectClass) share a single attribute set. Values of
+    attributes that hold distinguished names are stored as references into a DN table
+    that belongs to this tree. The pool is only needed while a tree is being built and
+    should be discarded afterwards.
+    """
+
+    dn_attributes: ClassVar[frozenset[str]] = frozenset(
+        {"ismemberof", "member", "memberof"},
+    )
+
+    def __init__(self: Self) -> None:
+        """Initialise an OAuthLDAPAttributePool."""
+        self.attributes: dict[
+            tuple[str, frozenset[str]],
+            tuple[str, OAuthLDAPAttributeSet],
+        ] = {}
+        self.dn_attributes_: dict[
+            tuple[str, frozenset[int]],
+            tuple[str, OAuthLDAPAttributeSet],
+        ] = {}
+        self.dn_table = OAuthLDAPDNTable()
+
+    def attribute(
+        self: Self,
+        key: str,
+        values: Iterable[str],
+    ) -> tuple[str, OAuthLDAPAttributeSet]:
+        """Get a shared attribute set for a key and values.
+
+        Args:
+            key: Name of the attribute
+            values: Values of the attribute
+
+        Returns:
+            A tuple of the interned attribute name and an attribute set that must not
+            be modified.
+        """
+        key = sys.intern(key)
+        if key.lower() in self.dn_attributes:
+            return self.dn_attribute(key, values)
+        frozen_values = frozenset(map(sys.intern, values))
+        pool_key = (key, frozen_values)
+        if not (attribute := self.attributes.get(pool_key)):
+            attribute = (key, OAuthLDAPAttributeSet(key, frozen_values))
+            self.attributes[pool_key] = attribute
+        return attribute
+
+    def dn_attribute(
+        self: Self,
+        key: str,
+        values: Iterable[str],
+    ) -> tuple[str, OAuthLDAPAttributeSet]:
+        """Get a shared attribute set for a key whose values are distinguished names.
+
+        Args:
+            key: Name of the attribute
+            values: Distinguished names
+
+        Returns:
+            A tuple of the attribute name and an attribute set that must not be
+            modified.
+        """
+        refs = frozenset(map(self.dn_table.ref, values))
+        pool_key = (key, refs)
+        if not (attribute := self.dn_attributes_.get(pool_key)):
+            attribute = (key, OAuthLDAPDNSet(key, refs, self.dn_table))
+            self.dn_attributes_[pool_key] = attribute
+        return attribute
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import sys
+from typing import TYPE_CHECKING, Self
+
+from ldaptor.attributeset import LDAPAttributeSet
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+
+class OAuthLDAPAttributeSet(LDAPAttributeSet):
+    """An LDAPAttributeSet that stores its key in a slot rather than a dictionary.
+
+    A case-folded copy of the values is made when the set is created so that
+    case-insensitive filters do not need to lower-case every value on every search.
+    As attribute sets are shared between entries and rebuilt with each generation of
+    the LDAP tree, this happens once for each distinct set of values in a generation.
+    """
+
+    __slots__ = ("folded_", "key")
+
+    def __init__(self: Self, key: str, values: frozenset[str]) -> None:
+        """Initialise an OAuthLDAPAttributeSet.
+
+        Args:
+            key: Name of the attribute
+            values: Values of the attribute
+        """
+        super().__init__(key, values)
+        # Only store a copy if any of the values are not already in lower case
+        self.folded_: frozenset[str] | None = None
+        if any(value != value.lower() for value in values):
+            self.folded_ = frozenset(sys.intern(value.lower()) for value in values)
+
+    def folded(self: Self) -> Collection[str]:
+        """The values of this attribute in lower case.
+
+        Returns:
+            The case-folded values, which must not be modified.
+        """
+        return self if self.folded_ is None else self.folded_
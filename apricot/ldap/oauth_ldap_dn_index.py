@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Self
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .oauth_ldap_dn_table import OAuthLDAPDNTable
+    from .oauth_ldap_entry import OAuthLDAPEntry
+
+
+class OAuthLDAPDNIndex:
+    """An index of the entries in an LDAP tree by distinguished name.
+
+    This finds an entry with a single lookup rather than descending through the tree
+    one RDN at a time. Entries are stored by their reference in the DN table of the
+    tree, so the index shares the distinguished names that are used as attribute
+    values rather than storing its own copy.
+    """
+
+    def __init__(
+        self: Self,
+        dn_table: OAuthLDAPDNTable,
+        entries: Iterable[tuple[str, OAuthLDAPEntry]],
+    ) -> None:
+        """Initialise an OAuthLDAPDNIndex.
+
+        Args:
+            dn_table: Table of the distinguished names used in the tree
+            entries: The distinguished name of each entry together with the entry
+        """
+        self.dn_table = dn_table
+        self.entries: list[OAuthLDAPEntry | None] = []
+        for dn, entry in entries:
+            ref = dn_table.ref(dn)
+            if ref >= len(self.entries):
+                self.entries.extend([None] * (ref + 1 - len(self.entries)))
+            self.entries[ref] = entry
+
+    def find(self: Self, dn: str) -> OAuthLDAPEntry | None:
+        """Find the entry with a distinguished name.
+
+        Args:
+            dn: A distinguished name
+
+        Returns:
+            The entry with this distinguished name or None if there is not one.
+        """
+        if (ref := self.dn_table.find(dn)) is None or ref >= len(self.entries):
+            return None
+        return self.entries[ref]
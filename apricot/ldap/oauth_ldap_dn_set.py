@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Self
+
+from ldaptor.attributeset import LDAPAttributeSet
+
+from .oauth_ldap_attribute_set import OAuthLDAPAttributeSet
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterable, Iterator
+
+    from .oauth_ldap_dn_table import OAuthLDAPDNTable
+
+
+class OAuthLDAPDNSet(OAuthLDAPAttributeSet):
+    """An attribute set whose values are distinguished names.
+
+    Values are stored as references into an OAuthLDAPDNTable and are only expanded
+    into strings when they are iterated over, for example when encoding a search
+    result. Membership tests compare references. The case-folded values come from the
+    lower-case names kept by the DN table, so they are not stored a second time.
+    """
+
+    __slots__ = ("dn_table",)
+
+    def __init__(
+        self: Self,
+        key: str,
+        refs: Iterable[int],
+        dn_table: OAuthLDAPDNTable,
+    ) -> None:
+        """Initialise an OAuthLDAPDNSet.
+
+        Args:
+            key: Name of the attribute
+            refs: References to the distinguished names in the table
+            dn_table: Table of distinguished names
+        """
+        # Values are references so there is nothing to case-fold
+        LDAPAttributeSet.__init__(self, key, refs)
+        self.dn_table = dn_table
+
+    def __contains__(self: Self, value: object) -> bool:
+        """Whether a distinguished name is in this set.
+
+        Args:
+            value: A distinguished name or a reference to one
+
+        Returns:
+            True if the distinguished name is in this set.
+        """
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        if isinstance(value, str):
+            value = self.dn_table.find(value)
+        return bool(super().__contains__(value))
+
+    def __eq__(self: Self, other: object) -> bool:
+        """Compare the expanded values with another attribute set or iterable.
+
+        Args:
+            other: An LDAPAttributeSet or other iterable of values
+
+        Returns:
+            True if the key (for attribute sets) and the values are the same.
+        """
+        if isinstance(other, LDAPAttributeSet) and self.key != other.key:
+            return False
+        return bool(sorted(self) == sorted(other))  # type: ignore[call-overload]
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __iter__(self: Self) -> Iterator[str]:
+        """Iterate over the expanded distinguished names.
+
+        Returns:
+            An iterator over the distinguished names in this set.
+        """
+        return map(self.dn_table.dns.__getitem__, super().__iter__())
+
+    def folded(self: Self) -> Collection[str]:
+        """The distinguished names in this set in lower case.
+
+        Returns:
+            The case-folded distinguished names.
+        """
+        return [self.dn_table.lower_dns[ref] for ref in super().__iter__()]
+
+    def copy(self: Self) -> LDAPAttributeSet:
+        """Copy the expanded values into a new attribute set.
+
+        Returns:
+            An LDAPAttributeSet containing the distinguished names in this set.
+        """
+        return LDAPAttributeSet(self.key, list(self))
+
+    __copy__ = copy
+
+    def __deepcopy__(self: Self, memo: dict[int, Any]) -> LDAPAttributeSet:
+        """Copy the expanded values into a new attribute set.
+
+        Args:
+            memo: Objects that have already been copied
+
+        Returns:
+            An LDAPAttributeSet containing the distinguished names in this set.
+        """
+        memo[id(self)] = result = self.copy()
+        return result
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Self
+
+from ldaptor.protocols.ldap.distinguishedname import (
+    DistinguishedName,
+    InvalidRelativeDistinguishedName,
+    RelativeDistinguishedName,
+)
+
+
+@lru_cache(maxsize=65536)
+def canonical_rdn(rdn: str) -> str:
+    """Convert a relative distinguished name into the form used by ldaptor.
+
+    The same names are used every time the LDAP tree is refreshed, so the cache is
+    large enough to hold the names of every entry in a typical tree.
+
+    Args:
+        rdn: A relative distinguished name
+
+    Returns:
+        The relative distinguished name with any special characters escaped.
+    """
+    return str(RelativeDistinguishedName(stringValue=rdn).getText())
+
+
+@lru_cache(maxsize=4096)
+def normalise_dn(dn: bytes | str) -> str | None:
+    """Convert a distinguished name into lower-case normalised form.
+
+    Args:
+        dn: A distinguished name
+
+    Returns:
+        The normalised distinguished name or None if it could not be parsed.
+    """
+    try:
+        return str(parse_dn(dn).getText()).lower()
+    except InvalidRelativeDistinguishedName:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def parse_dn(dn: bytes | str) -> DistinguishedName:
+    """Parse a distinguished name, reusing the result for names seen recently.
+
+    Clients use the same few base DNs over and over, so this avoids parsing them for
+    every request. The result is shared and must not be modified.
+
+    Args:
+        dn: A distinguished name
+
+    Returns:
+        The parsed distinguished name.
+    """
+    return DistinguishedName(stringValue=dn)
+
+
+class OAuthLDAPDNTable:
+    """A table of the distinguished names used as values in one LDAP tree.
+
+    Each distinguished name is stored once and is referred to by its integer index
+    in the table. Distinguished names are compared case-insensitively, using the
+    lower-case form that is also kept for each of them.
+    """
+
+    def __init__(self: Self) -> None:
+        """Initialise an OAuthLDAPDNTable."""
+        self.dns: list[str] = []
+        self.lower_dns: list[str] = []
+        self.refs: dict[str, int] = {}
+
+    def __len__(self: Self) -> int:
+        """Number of distinguished names in the table.
+
+        Returns:
+            The number of distinguished names.
+        """
+        return len(self.dns)
+
+    def find(self: Self, dn: str) -> int | None:
+        """Find the reference for a distinguished name that may not be normalised.
+
+        Args:
+            dn: A distinguished name, for example from an LDAP filter
+
+        Returns:
+            The reference for this distinguished name or None if it is not in the
+            table.
+        """
+        if (ref := self.refs.get(dn.lower())) is not None:
+            return ref
+        if (normalised_dn := normalise_dn(dn)) is None:
+            return None
+        return self.refs.get(normalised_dn)
+
+    def ref(self: Self, dn: str) -> int:
+        """Get the reference for a distinguished name, adding it if necessary.
+
+        Args:
+            dn: A distinguished name in normalised form
+
+        Returns:
+            The reference for this distinguished name.
+        """
+        lower_dn = dn.lower()
+        if (ref := self.refs.get(lower_dn)) is None:
+            ref = self.refs[lower_dn] = len(self.dns)
+            self.dns.append(dn)
+            self.lower_dns.append(lower_dn)
+        return ref
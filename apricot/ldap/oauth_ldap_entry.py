@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Self, cast
+import sys
+import time
+from typing import TYPE_CHECKING, Self
 
 from ldaptor.inmemory import ReadOnlyInMemoryLDAPEntry
 from ldaptor.protocols.ldap.distinguishedname import (
@@ -10,37 +12,100 @@ from ldaptor.protocols.ldap.distinguishedname import (
 from ldaptor.protocols.ldap.ldaperrors import (
     LDAPEntryAlreadyExists,
     LDAPInvalidCredentials,
+    LDAPNoSuchObject,
+    LDAPProtocolError,
+)
+from ldaptor.protocols.pureldap import (
+    LDAP_SCOPE_baseObject,
+    LDAP_SCOPE_singleLevel,
+    LDAP_SCOPE_wholeSubtree,
+    LDAPFilter,
+    LDAPFilter_and,
+    LDAPFilterMatchAll,
 )
 from twisted.internet import defer
 from twisted.logger import Logger
+from twisted.python.util import InsensitiveDict
+
+from apricot.oauth import DirectoryClient, LDAPAttributeDict
+
+from .ldap_request_statistics import LDAPRequestStatistics
+from .oauth_ldap_attribute_pool import OAuthLDAPAttributePool
+from .oauth_ldap_dn_table import canonical_rdn
+from .oauth_ldap_filter_compiler import OAuthLDAPFilterCompiler
 
-from apricot.oauth import LDAPAttributeDict, OAuthClient
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from .oauth_ldap_attribute_set import OAuthLDAPAttributeSet
+    from .oauth_ldap_membership_index import OAuthLDAPMembershipIndex
 
 
 class OAuthLDAPEntry(ReadOnlyInMemoryLDAPEntry):
-    """An LDAP entry that represents a view of an OAuth object."""
+    """An LDAP entry that represents a view of an OAuth object.
+
+    As a tree may contain many thousands of entries, these are kept compact. Entries
+    use slots and share a logger, attributes are shared between entries through an
+    OAuthLDAPAttributePool and the distinguished name of a child entry is only
+    constructed from its parent when it is needed.
+    """
 
-    dn: DistinguishedName
+    __slots__ = (
+        "_attributes",
+        "_children",
+        "_dn",
+        "_parent",
+        "_rdn",
+        "membership_index_",
+        "oauth_client_",
+    )
     attributes: LDAPAttributeDict
+    filter_compiler = OAuthLDAPFilterCompiler()
+    logger = Logger()
 
     def __init__(
         self: Self,
-        dn: DistinguishedName | str,
+        dn: DistinguishedName | RelativeDistinguishedName | str,
         attributes: LDAPAttributeDict,
-        oauth_client: OAuthClient | None = None,
+        oauth_client: DirectoryClient | None = None,
+        *,
+        attribute_pool: OAuthLDAPAttributePool | None = None,
+        parent: OAuthLDAPEntry | None = None,
     ) -> None:
         """Initialise an OAuthLDAPEntry.
 
         Args:
-            dn: Distinguished Name of the object
+            dn: Distinguished Name of the object or, if it has a parent, its Relative
+                Distinguished Name
             attributes: Attributes of the object.
             oauth_client: An OAuth client used for binding
+            attribute_pool: Pool used to share attributes with other entries
+            parent: The parent of this entry in the LDAP tree
         """
-        self.logger = Logger()
+        # Do not call the base class initialiser as this would construct the full
+        # distinguished name and an unshared copy of every attribute
+        self._children: dict[str, OAuthLDAPEntry] = {}
+        self._parent = parent
+        self.membership_index_: OAuthLDAPMembershipIndex | None = None
         self.oauth_client_ = oauth_client
-        if not isinstance(dn, DistinguishedName):
-            dn = DistinguishedName(stringValue=dn)
-        super().__init__(dn, attributes)
+        if parent:
+            self._dn: DistinguishedName | None = None
+            if isinstance(dn, RelativeDistinguishedName):
+                self._rdn = dn.getText()
+            else:
+                self._rdn = canonical_rdn(str(dn))
+        else:
+            self._dn = DistinguishedName(stringValue=str(dn))
+            self._rdn = self._dn.split()[0].getText()
+
+        # Attribute names are case-insensitive so merge any that differ only by case
+        attribute_pool = attribute_pool or OAuthLDAPAttributePool()
+        self._attributes: InsensitiveDict[str] = InsensitiveDict()  # type: ignore[no-untyped-call]
+        for key, values in attributes.items():
+            lower_key = sys.intern(key.lower())
+            if existing := self._attributes.data.get(lower_key):
+                key, values = existing[0], [*existing[1], *values]  # noqa: PLW2901
+            self._attributes.data[lower_key] = attribute_pool.attribute(key, values)
 
     def __str__(self: Self) -> str:
         """Return a string representation of this entry and its children.
@@ -61,7 +126,56 @@ class OAuthLDAPEntry(ReadOnlyInMemoryLDAPEntry):
         return "\n".join(lines)
 
     @property
-    def oauth_client(self: Self) -> OAuthClient:
+    def dn(self: Self) -> DistinguishedName:
+        """The Distinguished Name of this entry.
+
+        Returns:
+            The stored Distinguished Name or, for a child entry, one constructed from
+            the Distinguished Name of its parent.
+
+        Raises:
+            LDAPNoSuchObject: if a child entry has been detached from its parent
+        """
+        if self._dn:
+            return self._dn
+        if not self._parent:
+            msg = f"Entry '{self._rdn}' has no parent."
+            raise LDAPNoSuchObject(msg)
+        return DistinguishedName(
+            listOfRDNs=(
+                RelativeDistinguishedName(stringValue=self._rdn),
+                *self._parent.dn.split(),
+            ),
+        )
+
+    @dn.setter
+    def dn(self: Self, dn: DistinguishedName | str) -> None:
+        self._dn = DistinguishedName(stringValue=str(dn))
+
+    @property
+    def rdn(self: Self) -> str:
+        """The Relative Distinguished Name of this entry.
+
+        Returns:
+            The Relative Distinguished Name as text.
+        """
+        return str(self._rdn)
+
+    @property
+    def membership_index(self: Self) -> OAuthLDAPMembershipIndex | None:
+        """Find the index of nested group memberships for the tree of this entry.
+
+        If it does not already have one, then use the parent entry.
+
+        Returns:
+            The OAuthLDAPMembershipIndex for this tree or None if there is not one.
+        """
+        if not self.membership_index_ and self._parent:
+            self.membership_index_ = self._parent.membership_index
+        return self.membership_index_
+
+    @property
+    def oauth_client(self: Self) -> DirectoryClient:
         """Find the OAuth client used by this OAuthLDAPEntry.
 
         If it does not already have one, then use the parent entry.
@@ -72,38 +186,103 @@ class OAuthLDAPEntry(ReadOnlyInMemoryLDAPEntry):
         Raises:
             TypeError: if the OAuth client could not be found.
         """
-        if not self.oauth_client_ and hasattr(self._parent, "oauth_client"):
+        if not self.oauth_client_ and self._parent:
             self.oauth_client_ = self._parent.oauth_client
-        if not isinstance(self.oauth_client_, OAuthClient):
-            msg = f"OAuthClient is of incorrect type {type(self.oauth_client_)}"
+        if not isinstance(self.oauth_client_, DirectoryClient):
+            msg = f"OAuth client is of incorrect type {type(self.oauth_client_)}"
             raise TypeError(msg)
         return self.oauth_client_
 
+    def _lookup(self: Self, dn: DistinguishedName) -> defer.Deferred[OAuthLDAPEntry]:
+        """Find an entry in the subtree below this one.
+
+        Descend through the children one RDN at a time rather than constructing the
+        Distinguished Name of each child.
+
+        Args:
+            dn: The Distinguished Name to find
+
+        Returns:
+            The matching entry as a deferred OAuthLDAPEntry.
+
+        Raises:
+            LDAPNoSuchObject: if there is no matching entry
+        """
+        own_rdns = self.dn.split()
+        if not self.dn.contains(dn):
+            raise LDAPNoSuchObject(dn.getText())
+        entry = self
+        for rdn in reversed(dn.split()[: len(dn.split()) - len(own_rdns)]):
+            if not (child := entry._children.get(rdn.getText().lower())):
+                raise LDAPNoSuchObject(dn.getText())
+            entry = child
+        return defer.succeed(entry)
+
+    def addChild(  # noqa: N802
+        self: Self,
+        rdn: RelativeDistinguishedName | str,
+        attributes: LDAPAttributeDict,
+        attribute_pool: OAuthLDAPAttributePool | None = None,
+    ) -> OAuthLDAPEntry:
+        """Add a child to this entry.
+
+        Args:
+            rdn: The relative distinguished name of the child
+            attributes: The LDAP attributes of the child
+            attribute_pool: Pool used to share attributes with other entries
+
+        Returns:
+            An OAuthLDAPEntry for the child.
+
+        Raises:
+            LDAPEntryAlreadyExists: if there is already a child with this RDN
+        """
+        if isinstance(rdn, RelativeDistinguishedName):
+            rdn = rdn.getText()
+        else:
+            rdn = canonical_rdn(rdn)
+        # RDNs are case-insensitive so use a normalised key for each child
+        child_key = rdn.lower()
+        if child_key in self._children:
+            raise LDAPEntryAlreadyExists(self._children[child_key].dn.getText())
+        child = self.__class__(
+            rdn,
+            attributes,
+            attribute_pool=attribute_pool,
+            parent=self,
+        )
+        self._children[child_key] = child
+        return child
+
     def add_child(
         self: Self,
         rdn: RelativeDistinguishedName | str,
         attributes: LDAPAttributeDict,
+        attribute_pool: OAuthLDAPAttributePool | None = None,
     ) -> OAuthLDAPEntry:
         """Attempt to a child to this entry or return one that already exists.
 
         Args:
             rdn: The relative distinguished name of the child
             attributes: The LDAP attributes of the child
+            attribute_pool: Pool used to share attributes with other entries
 
         Returns:
             An OAuthLDAPEntry for the child.
         """
-        if isinstance(rdn, str):
-            rdn = RelativeDistinguishedName(stringValue=rdn)
+        if isinstance(rdn, RelativeDistinguishedName):
+            rdn = rdn.getText()
+        else:
+            rdn = canonical_rdn(rdn)
         try:
-            output = self.addChild(rdn, attributes)
+            output = self.addChild(rdn, attributes, attribute_pool)
         except LDAPEntryAlreadyExists:
             self.logger.warn(
                 "Refusing to add child '{child}' as it already exists.",
-                child=rdn.getText(),
+                child=rdn,
             )
-            output = self._children[rdn.getText()]
-        return cast("OAuthLDAPEntry", output)
+            output = self._children[rdn.lower()]
+        return output
 
     def bind(self: Self, password: bytes) -> defer.Deferred[OAuthLDAPEntry]:
         """Attempt to authenticate as this user.
@@ -127,10 +306,166 @@ class OAuthLDAPEntry(ReadOnlyInMemoryLDAPEntry):
 
         return defer.maybeDeferred(_bind, password)
 
+    def match(self: Self, filter: LDAPFilter) -> bool:  # noqa: A002
+        """Whether this entry matches an LDAP filter.
+
+        The filter is compiled into a predicate, which is cached so that it can be
+        reused for other entries and later searches.
+
+        Args:
+            filter: The LDAP filter to match
+
+        Returns:
+            True if this entry matches the filter.
+        """
+        return self.filter_compiler.compile(filter)(self)
+
+    def search(  # noqa: PLR0913, PLR0917
+        self: Self,
+        filterText: str | None = None,  # noqa: N803
+        filterObject: LDAPFilter | None = None,  # noqa: N803
+        attributes: tuple[str, ...] = (),
+        scope: int | None = None,
+        derefAliases: int | None = None,  # noqa: N803
+        sizeLimit: int = 0,  # noqa: N803
+        timeLimit: int = 0,  # noqa: N803
+        typesOnly: int = 0,  # noqa: N803
+        callback: Callable[[OAuthLDAPEntry], None] | None = None,
+    ) -> defer.Deferred[list[OAuthLDAPEntry] | None]:
+        """Search the subtree below this entry.
+
+        The filter is compiled once and then applied to each entry in the scope of the
+        search. Searches for the members of a group through nested groups, on their
+        own or combined with other filters using '&', only consider the members of the
+        group from the membership index rather than walking the whole tree.
+
+        Args:
+            filterText: The LDAP filter as text
+            filterObject: The LDAP filter
+            attributes: Attributes to return
+            scope: Scope of the search
+            derefAliases: How to dereference aliases
+            sizeLimit: Maximum number of results
+            timeLimit: Maximum time to search for
+            typesOnly: Whether to return attribute names only
+            callback: Function to call with each matching entry
+
+        Returns:
+            A deferred list of matching entries or a deferred None if a callback was
+            provided.
+        """
+        if filterText is not None:
+            return super().search(  # type: ignore[no-any-return]
+                filterText=filterText,
+                filterObject=filterObject,
+                attributes=attributes,
+                scope=scope,
+                derefAliases=derefAliases,
+                sizeLimit=sizeLimit,
+                timeLimit=timeLimit,
+                typesOnly=typesOnly,
+                callback=callback,
+            )
+        if statistics := LDAPRequestStatistics.current():
+            statistics.search_started_at = time.perf_counter()
+        filterObject = filterObject or LDAPFilterMatchAll  # noqa: N806
+        predicate = self.filter_compiler.compile(filterObject)
+        terms = (
+            list(filterObject)
+            if isinstance(filterObject, LDAPFilter_and)
+            else [filterObject]
+        )
+        group_dns = [
+            group_dn
+            for term in terms
+            if (group_dn := self.filter_compiler.in_chain_group(term)) is not None
+        ]
+        if group_dns and self.membership_index:
+            entries: Iterable[OAuthLDAPEntry] = [
+                entry
+                for entry in self.membership_index.members_of(group_dns[0]).values()
+                if entry.in_scope(self, scope)
+            ]
+        else:
+            entries = self.entries_in_scope(scope)
+        results: list[OAuthLDAPEntry] = []
+        match_callback = callback or results.append
+        if statistics:
+            entries = statistics.scan(entries)
+            match_callback = statistics.send(match_callback)
+        for entry in entries:
+            if predicate(entry):
+                match_callback(entry)
+        if statistics:
+            statistics.search_finished_at = time.perf_counter()
+        return defer.succeed(None if callback else results)
+
+    def attribute_values(self: Self, name: str) -> OAuthLDAPAttributeSet | None:
+        """Get the values of an attribute from its lower-case name.
+
+        Unlike 'get', this does not try each type and case of the name in turn.
+
+        Args:
+            name: The lower-case name of the attribute
+
+        Returns:
+            The values of the attribute or None if this entry does not have it.
+        """
+        if (attribute := self._attributes.data.get(name)) is None:
+            return None
+        return attribute[1]  # type: ignore[no-any-return]
+
+    def entries_in_scope(self: Self, scope: int | None) -> Iterator[OAuthLDAPEntry]:
+        """Iterate over the entries within the scope of a search based at this entry.
+
+        Entries are visited in the same order as ldaptor walks the tree.
+
+        Args:
+            scope: Scope of the search, which defaults to the whole subtree
+
+        Yields:
+            Each entry in scope.
+
+        Raises:
+            LDAPProtocolError: if the scope is not recognised
+        """
+        if scope in {None, LDAP_SCOPE_wholeSubtree}:
+            stack = [self]
+            while stack:
+                entry = stack.pop()
+                yield entry
+                stack.extend(entry._children.values())  # noqa: SLF001
+        elif scope == LDAP_SCOPE_singleLevel:
+            yield from self._children.values()
+        elif scope == LDAP_SCOPE_baseObject:
+            yield self
+        else:
+            msg = f"unknown search scope: {scope!r}"
+            raise LDAPProtocolError(msg)
+
+    def in_scope(self: Self, base: OAuthLDAPEntry, scope: int | None) -> bool:
+        """Whether this entry is within the scope of a search.
+
+        Args:
+            base: The entry that the search is based at
+            scope: Scope of the search, which defaults to the whole subtree
+
+        Returns:
+            True if this entry is within the scope of the search.
+        """
+        if scope == LDAP_SCOPE_baseObject:
+            return self is base
+        if scope == LDAP_SCOPE_singleLevel:
+            return self._parent is base
+        ancestor: OAuthLDAPEntry | None = self
+        while ancestor and ancestor is not base:
+            ancestor = ancestor.parent()
+        return ancestor is base
+
     def list_children(self: Self) -> list[OAuthLDAPEntry]:
         """Return a list of LDAP children.
 
         Returns:
             A list of child OAuthLDAPEntry.
         """
-        return [cast("OAuthLDAPEntry", entry) for entry in self._children.values()]
+        return list(self._children.values())
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import operator
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Self
+
+from ldaptor.protocols.ldap.ldapsyntax import MatchNotImplemented
+from ldaptor.protocols.pureldap import (
+    LDAPFilter,
+    LDAPFilter_and,
+    LDAPFilter_equalityMatch,
+    LDAPFilter_extensibleMatch,
+    LDAPFilter_greaterOrEqual,
+    LDAPFilter_lessOrEqual,
+    LDAPFilter_not,
+    LDAPFilter_or,
+    LDAPFilter_present,
+    LDAPFilter_substrings,
+    LDAPFilter_substrings_any,
+    LDAPFilter_substrings_final,
+    LDAPFilter_substrings_initial,
+)
+
+from .oauth_ldap_dn_set import OAuthLDAPDNSet
+from .oauth_ldap_membership_index import LDAP_MATCHING_RULE_IN_CHAIN
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from .oauth_ldap_entry import OAuthLDAPEntry
+
+    LDAPFilterPredicate = Callable[[OAuthLDAPEntry], bool]
+
+
+class OAuthLDAPFilterCompiler:
+    """Compile LDAP filters into predicates that can be applied to entries.
+
+    ldaptor matches a filter against each entry by dispatching on the type of every
+    term and decoding and case-folding the assertion values each time. Compiling a
+    filter does this work once, producing a closure that only has to look up and
+    compare attribute values, using the case-folded values that are stored with each
+    attribute set. Compiled filters are cached by their BER encoding, which
+    is the same for every search that uses the same filter, so repeated searches skip
+    compilation entirely. As predicates only depend on the filter, they are shared
+    between every generation of the LDAP tree.
+    """
+
+    def __init__(self: Self, *, max_size: int = 1024) -> None:
+        """Initialise an OAuthLDAPFilterCompiler.
+
+        Args:
+            max_size: Maximum number of compiled filters to cache
+        """
+        self.cache: OrderedDict[bytes, LDAPFilterPredicate] = OrderedDict()
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        self.compilers: dict[type, Callable[[LDAPFilter], LDAPFilterPredicate]] = {
+            LDAPFilter_and: self.compile_and,
+            LDAPFilter_equalityMatch: self.compile_equality,
+            LDAPFilter_extensibleMatch: self.compile_extensible,
+            LDAPFilter_greaterOrEqual: self.compile_ordering,
+            LDAPFilter_lessOrEqual: self.compile_ordering,
+            LDAPFilter_not: self.compile_not,
+            LDAPFilter_or: self.compile_or,
+            LDAPFilter_present: self.compile_present,
+            LDAPFilter_substrings: self.compile_substrings,
+        }
+
+    def compile(self: Self, ldap_filter: LDAPFilter) -> LDAPFilterPredicate:
+        """Get a compiled predicate for an LDAP filter, using the cache if possible.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        key = bytes(ldap_filter.toWire())
+        with self.lock:
+            if (predicate := self.cache.get(key)) is not None:
+                self.cache.move_to_end(key)
+                return predicate
+        predicate = self.compile_filter(ldap_filter)
+        with self.lock:
+            self.cache[key] = predicate
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return predicate
+
+    def compile_filter(self: Self, ldap_filter: LDAPFilter) -> LDAPFilterPredicate:
+        """Compile an LDAP filter into a predicate.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter or raises
+            MatchNotImplemented if the filter is not supported.
+        """
+        if compiler := self.compilers.get(type(ldap_filter)):
+            return compiler(ldap_filter)
+        return self.not_implemented(ldap_filter)
+
+    def compile_and(self: Self, ldap_filter: LDAPFilter_and) -> LDAPFilterPredicate:
+        """Compile an '&' filter.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        predicates = [self.compile_filter(term) for term in ldap_filter]
+        return lambda entry: all(predicate(entry) for predicate in predicates)
+
+    def compile_equality(
+        self: Self,
+        ldap_filter: LDAPFilter_equalityMatch,
+    ) -> LDAPFilterPredicate:
+        """Compile an equality filter.
+
+        Attributes that hold distinguished names are checked with a single lookup in
+        the DN table rather than by comparing each value.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        name = self.decode(ldap_filter.attributeDesc.value).lower()
+        assertion = self.decode(ldap_filter.assertionValue.value)
+        folded = assertion.lower()
+
+        def match(entry: OAuthLDAPEntry) -> bool:
+            values = entry.attribute_values(name)
+            if values is None:
+                return False
+            if isinstance(values, OAuthLDAPDNSet):
+                return assertion in values
+            return folded in values.folded()
+
+        return match
+
+    def compile_extensible(
+        self: Self,
+        ldap_filter: LDAPFilter_extensibleMatch,
+    ) -> LDAPFilterPredicate:
+        """Compile an extensible match filter.
+
+        Nested group membership filters are answered from the membership index. Other
+        filters with a matching rule are not supported. Without a matching rule,
+        values are compared case-insensitively and, if requested, so are the
+        attributes in the distinguished name of the entry.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        if (group_dn := self.in_chain_group(ldap_filter)) is not None:
+
+            def match_in_chain(entry: OAuthLDAPEntry) -> bool:
+                if not (index := entry.membership_index):
+                    raise MatchNotImplemented(ldap_filter)
+                return id(entry) in index.members_of(group_dn)
+
+            return match_in_chain
+        if ldap_filter.matchingRule is not None:
+            return self.not_implemented(ldap_filter)
+        name = self.decode(ldap_filter.type.value).lower() if ldap_filter.type else None
+        folded = self.decode(ldap_filter.matchValue.value).lower()
+        dn_attributes = bool(
+            ldap_filter.dnAttributes and ldap_filter.dnAttributes.value,
+        )
+
+        def match(entry: OAuthLDAPEntry) -> bool:
+            values = entry.attribute_values(name) if name else None
+            if values is not None and folded in values.folded():
+                return True
+            return dn_attributes and any(
+                (name is None or attribute.attributeType.lower() == name)
+                and attribute.value.lower() == folded
+                for rdn in entry.dn.split()
+                for attribute in rdn.split()
+            )
+
+        return match
+
+    def compile_not(self: Self, ldap_filter: LDAPFilter_not) -> LDAPFilterPredicate:
+        """Compile a '!' filter.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        predicate = self.compile_filter(ldap_filter.value)
+        return lambda entry: not predicate(entry)
+
+    def compile_or(self: Self, ldap_filter: LDAPFilter_or) -> LDAPFilterPredicate:
+        """Compile an '|' filter.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        predicates = [self.compile_filter(term) for term in ldap_filter]
+        return lambda entry: any(predicate(entry) for predicate in predicates)
+
+    def compile_ordering(
+        self: Self,
+        ldap_filter: LDAPFilter_greaterOrEqual | LDAPFilter_lessOrEqual,
+    ) -> LDAPFilterPredicate:
+        """Compile a '>=' or '<=' filter.
+
+        Values are compared as integers if the assertion is an integer, as for
+        attributes such as uidNumber, and as strings otherwise.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        name = self.decode(ldap_filter.attributeDesc.value).lower()
+        assertion = self.decode(ldap_filter.assertionValue.value)
+        greater = isinstance(ldap_filter, LDAPFilter_greaterOrEqual)
+        compare = operator.ge if greater else operator.le
+        if (number := self.integer(assertion)) is not None:
+
+            def match_integer(entry: OAuthLDAPEntry) -> bool:
+                return any(
+                    compare(value, number)
+                    for value in map(self.integer, entry.attribute_values(name) or ())
+                    if value is not None
+                )
+
+            return match_integer
+        return lambda entry: any(
+            compare(value, assertion) for value in entry.attribute_values(name) or ()
+        )
+
+    def compile_present(
+        self: Self,
+        ldap_filter: LDAPFilter_present,
+    ) -> LDAPFilterPredicate:
+        """Compile a presence filter.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        name = self.decode(ldap_filter.value).lower()
+        return lambda entry: entry.attribute_values(name) is not None
+
+    def compile_substrings(
+        self: Self,
+        ldap_filter: LDAPFilter_substrings,
+    ) -> LDAPFilterPredicate:
+        """Compile a substring filter.
+
+        Args:
+            ldap_filter: The LDAP filter
+
+        Returns:
+            A function that returns True for entries that match the filter.
+        """
+        name = self.decode(ldap_filter.type).lower()
+        initial, final, middle = "", "", []
+        for substring in ldap_filter.substrings:
+            value = self.decode(substring.value).lower()
+            if isinstance(substring, LDAPFilter_substrings_initial):
+                initial = value
+            elif isinstance(substring, LDAPFilter_substrings_final):
+                final = value
+            elif isinstance(substring, LDAPFilter_substrings_any):
+                middle.append(value)
+
+        def match_value(value: str) -> bool:
+            if not (value.startswith(initial) and value.endswith(final)):
+                return False
+            start, end = len(initial), len(value) - len(final)
+            for substring in middle:
+                if (index := value.find(substring, start, end)) < 0:
+                    return False
+                start = index + len(substring)
+            return start <= end
+
+        def match(entry: OAuthLDAPEntry) -> bool:
+            values = entry.attribute_values(name)
+            return values is not None and any(map(match_value, values.folded()))
+
+        return match
+
+    @staticmethod
+    def decode(value: str | bytes) -> str:
+        """Decode a value from an LDAP filter, which may be bytes or str.
+
+        Args:
+            value: A value from an LDAP filter
+
+        Returns:
+            The value as a string.
+        """
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    @staticmethod
+    def in_chain_group(ldap_filter: LDAPFilter) -> str | bytes | None:
+        """Find the group in an LDAP_MATCHING_RULE_IN_CHAIN filter on memberOf.
+
+        Args:
+            ldap_filter: An LDAP filter
+
+        Returns:
+            The distinguished name of the group or None if this is not an in-chain
+            filter on memberOf.
+        """
+        if (
+            isinstance(ldap_filter, LDAPFilter_extensibleMatch)
+            and ldap_filter.matchingRule
+            and ldap_filter.matchingRule.value == LDAP_MATCHING_RULE_IN_CHAIN
+            and ldap_filter.type
+            and OAuthLDAPFilterCompiler.decode(ldap_filter.type.value).lower()
+            == "memberof"
+        ):
+            return ldap_filter.matchValue.value  # type: ignore[no-any-return]
+        return None
+
+    @staticmethod
+    def integer(value: str) -> int | None:
+        """Convert a value to an integer if it is one.
+
+        Args:
+            value: A string value
+
+        Returns:
+            The value as an integer or None if it is not an integer.
+        """
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def not_implemented(ldap_filter: LDAPFilter) -> LDAPFilterPredicate:
+        """Create a predicate for a filter that cannot be matched.
+
+        Args:
+            ldap_filter: An LDAP filter
+
+        Returns:
+            A function that raises MatchNotImplemented when it is called, as ldaptor
+            does when matching an entry against the filter.
+        """
+
+        def match(entry: OAuthLDAPEntry) -> bool:
+            id(entry)  # ignore unused arguments
+            raise MatchNotImplemented(ldap_filter)
+
+        return match
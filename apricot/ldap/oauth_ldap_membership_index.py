@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Self
+
+from apricot.graph import MembershipGraph
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from .oauth_ldap_dn_table import OAuthLDAPDNTable
+    from .oauth_ldap_entry import OAuthLDAPEntry
+
+LDAP_MATCHING_RULE_IN_CHAIN = "1.2.840.113556.1.4.1941"
+
+
+class OAuthLDAPMembershipIndex:
+    """An index of the entries that belong to each group, including through nesting.
+
+    This is used to evaluate LDAP_MATCHING_RULE_IN_CHAIN filters on memberOf, such as
+    '(memberOf:1.2.840.113556.1.4.1941:=CN=group,OU=groups,DC=example,DC=com)'. The
+    transitive closure of memberOf is computed once when the tree is built, so
+    checking whether an entry matches needs a single lookup and finding every matching
+    entry takes time proportional to the number of results.
+    """
+
+    def __init__(
+        self: Self,
+        dn_table: OAuthLDAPDNTable,
+        entries: Iterable[tuple[str, OAuthLDAPEntry]],
+    ) -> None:
+        """Initialise an OAuthLDAPMembershipIndex.
+
+        Args:
+            dn_table: Table of the distinguished names used in the tree
+            entries: The distinguished name of each entry together with the entry
+        """
+        self.dn_table = dn_table
+        self.members: dict[int, dict[int, OAuthLDAPEntry]] = {}
+
+        # Find every group that each entry belongs to
+        graph = MembershipGraph()
+        entries_by_dn: dict[str, OAuthLDAPEntry] = {}
+        for dn, entry in entries:
+            canonical_dn = dn_table.dns[dn_table.ref(dn)]
+            entries_by_dn[canonical_dn] = entry
+            graph.add_memberships(canonical_dn, list(entry.get("memberOf", [])))
+
+        # Invert this to find every entry that belongs to each group
+        for dn, group_dns in graph.transitive_groups().items():
+            if (member := entries_by_dn.get(dn)) is None:
+                continue
+            for group_dn in group_dns:
+                self.members.setdefault(dn_table.ref(group_dn), {})[id(member)] = member
+
+    def members_of(self: Self, group_dn: str | bytes) -> dict[int, OAuthLDAPEntry]:
+        """Find the entries that belong to a group, directly or through nested groups.
+
+        Args:
+            group_dn: Distinguished name of the group
+
+        Returns:
+            A dictionary of matching entries keyed by their identity, which must not be
+            modified.
+        """
+        if isinstance(group_dn, bytes):
+            group_dn = group_dn.decode("utf-8")
+        if (ref := self.dn_table.find(group_dn)) is None:
+            return {}
+        return self.members.get(ref, {})
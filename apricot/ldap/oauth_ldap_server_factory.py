@@ -1,25 +1,40 @@
-from typing import Self
+from __future__ import annotations
 
-from twisted.internet.interfaces import IAddress
-from twisted.internet.protocol import Protocol, ServerFactory
+from typing import TYPE_CHECKING, Self
 
-from apricot.oauth import OAuthClient, OAuthDataAdaptor
+from twisted.internet.protocol import Protocol, ServerFactory
 
 from .oauth_ldap_tree import OAuthLDAPTree
 from .read_only_ldap_server import ReadOnlyLDAPServer
 
+if TYPE_CHECKING:
+    from twisted.internet.interfaces import IAddress
+
+    from apricot.cache import NegativeCache
+    from apricot.oauth import DirectoryClient, OAuthDataAdaptor
+    from apricot.snapshot import RedisSnapshotStore, SnapshotStore
+
+    from .ldap_slow_query_log import LDAPSlowQueryLog
+    from .refresh_circuit_breaker import RefreshCircuitBreaker
+
 
 class OAuthLDAPServerFactory(ServerFactory):
     """A Twisted ServerFactory that provides an LDAP tree."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self: Self,
         oauth_adaptor: OAuthDataAdaptor,
-        oauth_client: OAuthClient,
+        oauth_client: DirectoryClient,
         *,
         allow_anonymous_binds: bool,
         background_refresh: bool,
         refresh_interval: int,
+        circuit_breaker: RefreshCircuitBreaker | None = None,
+        max_value_range: int = 0,
+        negative_cache: NegativeCache | None = None,
+        shared_store: RedisSnapshotStore | None = None,
+        slow_query_log: LDAPSlowQueryLog | None = None,
+        snapshot_store: SnapshotStore | None = None,
     ) -> None:
         """Initialise an OAuthLDAPServerFactory.
 
@@ -27,18 +42,31 @@ class OAuthLDAPServerFactory(ServerFactory):
             allow_anonymous_binds: Whether to allow anonymous LDAP binds
             background_refresh: Whether to refresh the LDAP tree in the background
                 rather than on access
+            circuit_breaker: Optional circuit breaker for failed refreshes
+            max_value_range: Maximum number of values of an attribute to return in a
+                search result, or 0 for no limit
+            negative_cache: Optional cache of lookups and searches that found nothing
             oauth_adaptor: An OAuth data adaptor used to construct the LDAP tree
             oauth_client: An OAuth client used to retrieve user and group data
             refresh_interval: Interval in seconds after which the tree must be refreshed
+            shared_store: Optional store used to share the tree between replicas
+            slow_query_log: Optional log of requests that took too long
+            snapshot_store: Optional store used to persist the tree between restarts
         """
         # Create an LDAP lookup tree
         self.adaptor = OAuthLDAPTree(
             oauth_adaptor,
             oauth_client,
             background_refresh=background_refresh,
+            circuit_breaker=circuit_breaker,
+            negative_cache=negative_cache,
             refresh_interval=refresh_interval,
+            shared_store=shared_store,
+            snapshot_store=snapshot_store,
         )
         self.allow_anonymous_binds = allow_anonymous_binds
+        self.max_value_range = max_value_range
+        self.slow_query_log = slow_query_log
 
     def __repr__(self: Self) -> str:
         """Generate string representation of OAuthLDAPServerFactory.
@@ -60,6 +88,10 @@ class OAuthLDAPServerFactory(ServerFactory):
             The ReadOnlyLDAPServer with an attached OAuth adaptor.
         """
         id(addr)  # ignore unused arguments
-        proto = ReadOnlyLDAPServer(allow_anonymous_binds=self.allow_anonymous_binds)
+        proto = ReadOnlyLDAPServer(
+            allow_anonymous_binds=self.allow_anonymous_binds,
+            max_value_range=self.max_value_range,
+            slow_query_log=self.slow_query_log,
+        )
         proto.factory = self.adaptor
         return proto
@@ -1,50 +1,100 @@
 from __future__ import annotations
 
+import threading
 import time
 from typing import TYPE_CHECKING, Self
 
 from ldaptor.interfaces import IConnectedLDAPEntry, ILDAPEntry
 from ldaptor.protocols.ldap.distinguishedname import DistinguishedName
+from ldaptor.protocols.ldap.ldaperrors import LDAPNoSuchObject
+from twisted.internet import defer
 from twisted.logger import Logger
 from zope.interface import implementer
 
+from apricot.ldap.oauth_ldap_attribute_pool import OAuthLDAPAttributePool
+from apricot.ldap.oauth_ldap_dn_index import OAuthLDAPDNIndex
+from apricot.ldap.oauth_ldap_dn_table import parse_dn
 from apricot.ldap.oauth_ldap_entry import OAuthLDAPEntry
+from apricot.ldap.oauth_ldap_membership_index import OAuthLDAPMembershipIndex
+from apricot.ldap.refresh_circuit_breaker import RefreshCircuitBreaker
+from apricot.log_level import debug_enabled
+from apricot.metrics import metrics, refresh_profiler
+from apricot.snapshot import DirectorySnapshot
 
 if TYPE_CHECKING:
-    from twisted.internet import defer
+    from collections.abc import Iterator
+
     from twisted.python.failure import Failure
 
-    from apricot.oauth import OAuthClient, OAuthDataAdaptor
+    from apricot.cache import NegativeCache
+    from apricot.oauth import DirectoryClient, OAuthDataAdaptor
+    from apricot.snapshot import RedisSnapshotStore, SnapshotStore
 
 
 @implementer(IConnectedLDAPEntry)
 class OAuthLDAPTree:
     """An LDAP tree that represents a view of an OAuth directory."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self: Self,
         oauth_adaptor: OAuthDataAdaptor,
-        oauth_client: OAuthClient,
+        oauth_client: DirectoryClient,
         *,
         background_refresh: bool,
         refresh_interval: int,
+        circuit_breaker: RefreshCircuitBreaker | None = None,
+        negative_cache: NegativeCache | None = None,
+        shared_store: RedisSnapshotStore | None = None,
+        snapshot_store: SnapshotStore | None = None,
     ) -> None:
         """Initialise an OAuthLDAPTree.
 
         Args:
             background_refresh: Whether to refresh the LDAP tree in the background
                 rather than on access
+            circuit_breaker: Optional circuit breaker that controls when failed
+                refreshes are retried, or a default one if not provided
+            negative_cache: Optional cache of lookups and searches that found nothing
             oauth_adaptor: An OAuth data adaptor used to construct the LDAP tree
             oauth_client: An OAuth client used to retrieve user and group data
             refresh_interval: Interval in seconds after which the tree must be refreshed
+            shared_store: Optional store used to share the tree between replicas so
+                that only one of them queries the OAuth backend
+            snapshot_store: Optional store used to persist the last good tree and to
+                load it on startup
         """
         self.background_refresh = background_refresh
+        self.circuit_breaker = circuit_breaker or RefreshCircuitBreaker()
+        self.dn_index: OAuthLDAPDNIndex | None = None
+        self.entry_counts: dict[str, int] = {}
+        self.generation = 0
+        self.generation_created_at = 0.0
         self.last_update = time.monotonic()
         self.logger = Logger()
+        self.negative_cache = negative_cache
         self.oauth_adaptor = oauth_adaptor
         self.oauth_client = oauth_client
         self.refresh_interval = refresh_interval
+        self.refresh_lock = threading.Lock()
         self.root_: OAuthLDAPEntry | None = None
+        self.shared_store = shared_store
+        self.snapshot_store = snapshot_store
+        self.stale = False
+
+        # Serve the last saved tree until the first live refresh completes
+        if self.snapshot_store and (snapshot := self.snapshot_store.load()):
+            if snapshot.root_dn == self.oauth_adaptor.root_dn:
+                self.logger.info(
+                    "Loaded a directory snapshot from {age:.0f} seconds ago.",
+                    age=snapshot.age,
+                )
+                self.build(snapshot)
+                self.stale = True
+            else:
+                self.logger.warn(
+                    "Ignoring directory snapshot for a different root '{root_dn}'.",
+                    root_dn=snapshot.root_dn,
+                )
 
     @property
     def dn(self: Self) -> DistinguishedName:
@@ -70,6 +120,8 @@ class OAuthLDAPTree:
         if not self.root_:
             msg = "LDAP tree could not be loaded"
             raise ValueError(msg)
+        if self.stale:
+            self.logger.debug("Serving a stale LDAP tree from a directory snapshot.")
         return self.root_
 
     def __repr__(self: Self) -> str:
@@ -80,7 +132,10 @@ class OAuthLDAPTree:
         """
         return f"{self.__class__.__name__} with backend {self.oauth_client.__class__.__name__}"  # noqa: E501
 
-    def lookup(self: Self, dn: DistinguishedName | str) -> defer.Deferred[ILDAPEntry]:
+    def lookup(  # noqa: C901
+        self: Self,
+        dn: DistinguishedName | str,
+    ) -> defer.Deferred[ILDAPEntry]:
         """Lookup a DistinguishedName in the LDAP tree.
 
         Args:
@@ -99,85 +154,323 @@ class OAuthLDAPTree:
             return ldap_entry
 
         def failure_callback(failure: Failure) -> Failure:
-            self.logger.debug(
-                "LDAP lookup failed: {error}",
-                error=failure.getErrorMessage(),
-            )
+            if debug_enabled():
+                self.logger.debug(
+                    "LDAP lookup failed: {error}",
+                    error=failure.getErrorMessage(),
+                )
+            if self.negative_cache and isinstance(failure.value, LDAPNoSuchObject):
+                self.negative_cache.add(generation, miss_key)
             return failure
 
         # Construct a complete DN
         if not isinstance(dn, DistinguishedName):
-            dn = DistinguishedName(stringValue=dn)
-        self.logger.info("Starting an LDAP lookup for '{dn}'.", dn=dn.getText())
+            dn = parse_dn(dn)
+        dn_text = dn.getText()
+        if debug_enabled():
+            self.logger.debug("Starting an LDAP lookup for '{dn}'.", dn=dn_text)
 
-        # Attach debug callbacks to the lookup and return
-        return (
-            self.root.lookup(dn)
-            .addErrback(failure_callback)
-            .addCallback(result_callback)
-        )
+        # Fail immediately if this DN was recently found to be missing
+        miss_key = f"lookup:{dn_text.lower()}"
+        if self.is_known_miss(miss_key):
+            if debug_enabled():
+                self.logger.debug("LDAP lookup failed: no entry for this DN was found.")
+            return defer.fail(LDAPNoSuchObject(dn_text))
+        root = self.root
+        generation = self.generation
 
-    def refresh(self: Self) -> None:
-        """Refresh the LDAP tree."""
-        if (
-            not self.root_
-            or (time.monotonic() - self.last_update) > self.refresh_interval
-        ):
-            # Update users and groups from the OAuth server
-            self.logger.info("Retrieving OAuth data.")
-            oauth_groups, oauth_users = self.oauth_adaptor.retrieve_all()
-
-            # Create a root node for the tree
-            self.logger.info("Rebuilding LDAP tree.")
-            self.root_ = OAuthLDAPEntry(
-                dn=self.oauth_adaptor.root_dn,
-                attributes={"objectClass": ["dcObject"]},
-                oauth_client=self.oauth_client,
-            )
+        # Find the entry in the index, falling back to walking the tree for any DN
+        # that is not indexed so that failures are reported in the usual way
+        if self.dn_index and (entry := self.dn_index.find(dn_text)):
+            deferred: defer.Deferred[OAuthLDAPEntry] = defer.succeed(entry)
+        else:
+            deferred = root.lookup(dn)
 
-            # Add OUs for users and groups
-            groups_ou = self.root_.add_child(
-                "OU=groups",
-                {"ou": ["groups"], "objectClass": ["organizationalUnit"]},
-            )
-            users_ou = self.root_.add_child(
-                "OU=users",
-                {"ou": ["users"], "objectClass": ["organizationalUnit"]},
-            )
+        # Attach callbacks to the lookup and return
+        deferred.addErrback(failure_callback)
+        if debug_enabled():
+            deferred.addCallback(result_callback)
+        return deferred
 
-            # Add groups to the groups OU
-            self.logger.debug(
-                "Attempting to add {n_groups} groups to the LDAP tree.",
-                n_groups=len(oauth_groups),
-            )
-            for group_attrs in oauth_groups:
-                groups_ou.add_child(f"CN={group_attrs.cn}", group_attrs.to_dict())
-            ldap_groups = groups_ou.list_children()
-            self.logger.info(
-                "There are {n_groups} groups in the LDAP tree.",
-                n_groups=len(ldap_groups),
+    def build(self: Self, snapshot: DirectorySnapshot) -> None:
+        """Build an LDAP tree from a directory snapshot and start serving it.
+
+        Args:
+            snapshot: Validated users and groups to build the tree from
+        """
+        # Create a root node for the tree
+        self.logger.info("Rebuilding LDAP tree.")
+        attribute_pool = OAuthLDAPAttributePool()
+        root = OAuthLDAPEntry(
+            dn=snapshot.root_dn,
+            attributes={"objectClass": ["dcObject"]},
+            oauth_client=self.oauth_client,
+            attribute_pool=attribute_pool,
+        )
+
+        # Add OUs for users and groups
+        groups_ou = root.add_child(
+            "OU=groups",
+            {"ou": ["groups"], "objectClass": ["organizationalUnit"]},
+            attribute_pool,
+        )
+        users_ou = root.add_child(
+            "OU=users",
+            {"ou": ["users"], "objectClass": ["organizationalUnit"]},
+            attribute_pool,
+        )
+
+        # Add groups to the groups OU
+        self.logger.debug(
+            "Attempting to add {n_groups} groups to the LDAP tree.",
+            n_groups=len(snapshot.groups),
+        )
+        for group_attrs in snapshot.groups:
+            groups_ou.add_child(
+                f"CN={group_attrs.cn}",
+                group_attrs.to_dict(),
+                attribute_pool,
             )
+        ldap_groups = groups_ou.list_children()
+        self.logger.info(
+            "There are {n_groups} groups in the LDAP tree.",
+            n_groups=len(ldap_groups),
+        )
+        if debug_enabled():
             for ldap_group in ldap_groups:
                 self.logger.debug(
                     "... {ldap_group}",
                     ldap_group=ldap_group.dn.getText(),
                 )
 
-            # Add users to the users OU
-            self.logger.debug(
-                "Attempting to add {n_users} users to the LDAP tree.",
-                n_users=len(oauth_users),
-            )
-            for user_attrs in oauth_users:
-                users_ou.add_child(f"CN={user_attrs.cn}", user_attrs.to_dict())
-            ldap_users = users_ou.list_children()
-            self.logger.info(
-                "There are {n_users} users in the LDAP tree.",
-                n_users=len(ldap_users),
+        # Add users to the users OU
+        self.logger.debug(
+            "Attempting to add {n_users} users to the LDAP tree.",
+            n_users=len(snapshot.users),
+        )
+        for user_attrs in snapshot.users:
+            users_ou.add_child(
+                f"CN={user_attrs.cn}",
+                user_attrs.to_dict(),
+                attribute_pool,
             )
+        ldap_users = users_ou.list_children()
+        self.logger.info(
+            "There are {n_users} users in the LDAP tree.",
+            n_users=len(ldap_users),
+        )
+        if debug_enabled():
             for ldap_user in ldap_users:
                 self.logger.debug("... {ldap_user}", ldap_user=ldap_user.dn.getText())
 
-            # Set last updated time
-            self.logger.info("Finished building LDAP tree.")
+        # Index entries by DN along with their nested group memberships
+        groups_dn = groups_ou.dn.getText()
+        users_dn = users_ou.dn.getText()
+        member_entries = [
+            *((f"{group.rdn},{groups_dn}", group) for group in ldap_groups),
+            *((f"{user.rdn},{users_dn}", user) for user in ldap_users),
+        ]
+        root.membership_index_ = OAuthLDAPMembershipIndex(
+            attribute_pool.dn_table,
+            member_entries,
+        )
+        dn_index = OAuthLDAPDNIndex(
+            attribute_pool.dn_table,
+            [
+                (root.dn.getText(), root),
+                (groups_dn, groups_ou),
+                (users_dn, users_ou),
+                *member_entries,
+            ],
+        )
+
+        # Swap in the completed tree so that lookups never see a partial tree
+        self.logger.info("Finished building LDAP tree.")
+        self.dn_index = dn_index
+        self.entry_counts = {"groups": len(ldap_groups), "users": len(ldap_users)}
+        self.root_ = root
+        self.generation += 1
+        self.generation_created_at = snapshot.created_at
+
+    def collect_metrics(self: Self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Describe the current LDAP tree, refresh and negative cache as metric samples.
+
+        Yields:
+            The name, labels and value of each sample.
+        """
+        yield ("apricot_tree_generation", {}, self.generation)
+        if self.root_:
+            yield (
+                "apricot_tree_generation_age_seconds",
+                {},
+                time.time() - self.generation_created_at,
+            )
+        for ou, n_entries in sorted(self.entry_counts.items()):
+            yield ("apricot_tree_entries", {"ou": ou}, n_entries)
+        yield from self.circuit_breaker.collect_metrics()
+        if self.negative_cache:
+            stats = self.negative_cache.stats()
+            yield ("apricot_negative_cache_hits_total", {}, stats["hits"])
+            yield ("apricot_negative_cache_misses_total", {}, stats["misses"])
+            yield ("apricot_negative_cache_size", {}, stats["size"])
+
+    def is_known_miss(self: Self, miss_key: str) -> bool:
+        """Whether a lookup or search recently found nothing in the current tree.
+
+        Args:
+            miss_key: Key describing the lookup or search
+
+        Returns:
+            True if the negative cache has a miss for this key in the current tree.
+        """
+        if not self.negative_cache:
+            return False
+        # Ensure that the current tree is up to date before checking for misses
+        if not self.background_refresh:
+            self.refresh()
+        return self.negative_cache.contains(self.generation, miss_key)
+
+    def needs_refresh(self: Self) -> bool:
+        """Whether the LDAP tree is missing, stale or older than the refresh interval.
+
+        Returns:
+            True if the tree should be refreshed from the OAuth backend.
+        """
+        return (
+            not self.root_
+            or self.stale
+            or (time.monotonic() - self.last_update) > self.refresh_interval
+        )
+
+    def refresh(self: Self) -> None:
+        """Refresh the LDAP tree.
+
+        If the refresh fails then the current tree continues to be served, and the
+        circuit breaker decides when the refresh is next attempted.
+        """
+        if not self.needs_refresh() or not self.circuit_breaker.allow():
+            return
+        # If there is already a tree to serve then do not wait for another refresh
+        if not self.refresh_lock.acquire(blocking=not self.root_):
+            self.logger.debug("An LDAP tree refresh is already in progress.")
+            return
+        try:
+            # Callers that waited for a failed refresh should not immediately retry it
+            if not self.needs_refresh() or not self.circuit_breaker.allow():
+                return
+
+            # Only the leader replica should query the OAuth server
+            if self.shared_store and not self.shared_store.acquire_leadership(
+                2 * self.refresh_interval,
+            ):
+                self.logger.debug("Another replica is responsible for refreshing.")
+                self.load_shared_snapshot()
+                return
+
+            # Update users and groups from the OAuth server
+            try:
+                snapshot = self.retrieve_and_build()
+            except Exception as exc:  # noqa: BLE001
+                self.circuit_breaker.record_failure()
+                self.logger.warn(
+                    "Failed to refresh the LDAP tree, so {serving} will be served "
+                    "until a refresh succeeds.\n{error}",
+                    error=str(exc),
+                    serving=(
+                        f"generation {self.generation}" if self.root_ else "nothing"
+                    ),
+                )
+                return
+            self.circuit_breaker.record_success()
+
+            # Set last updated time. This is also done if the new tree was rejected,
+            # as the OAuth server has been checked and should not be checked again
+            # until the next interval.
             self.last_update = time.monotonic()
+            self.stale = False
+            if not snapshot:
+                return
+
+            # Persist the tree and share it with any other replicas
+            self.save_snapshot(snapshot, self.shared_store, self.snapshot_store)
+        finally:
+            self.refresh_lock.release()
+
+    def retrieve_and_build(self: Self) -> DirectorySnapshot | None:
+        """Retrieve users and groups from the OAuth server and build a new tree.
+
+        The tree is not replaced if the circuit breaker rejects the new one for having
+        far fewer entries.
+
+        Returns:
+            The snapshot that the tree was built from, or None if it was rejected.
+        """
+        result = "failure"
+        try:
+            with refresh_profiler.refresh():
+                self.logger.info("Retrieving OAuth data.")
+                oauth_groups, oauth_users = self.oauth_adaptor.retrieve_all()
+                snapshot = DirectorySnapshot(
+                    root_dn=self.oauth_adaptor.root_dn,
+                    groups=oauth_groups,
+                    users=oauth_users,
+                )
+                if self.root_ and not self.circuit_breaker.check_shrinkage(
+                    self.entry_counts,
+                    {"groups": len(oauth_groups), "users": len(oauth_users)},
+                ):
+                    result = "rejected"
+                    return None
+                with refresh_profiler.phase("build_tree"):
+                    self.build(snapshot)
+            result = "success"
+        finally:
+            metrics.increment("apricot_refreshes_total", result=result)
+        return snapshot
+
+    def refresh_from_shared_store(self: Self) -> None:
+        """Load the tree most recently published by the leader replica."""
+        with self.refresh_lock:
+            self.load_shared_snapshot()
+
+    def load_shared_snapshot(self: Self) -> None:
+        """Build the LDAP tree from the shared store if it has a newer snapshot.
+
+        The caller must hold the refresh lock.
+        """
+        if not self.shared_store:
+            return
+        self.last_update = time.monotonic()
+        generation = self.shared_store.generation()
+        if generation is None or generation <= self.generation_created_at:
+            return
+        snapshot = self.shared_store.load()
+        if not snapshot or snapshot.root_dn != self.oauth_adaptor.root_dn:
+            return
+        self.logger.info(
+            "Loading a directory snapshot published {age:.0f} seconds ago.",
+            age=snapshot.age,
+        )
+        self.build(snapshot)
+        self.stale = False
+        self.save_snapshot(snapshot, self.snapshot_store)
+
+    def save_snapshot(
+        self: Self,
+        snapshot: DirectorySnapshot,
+        *stores: SnapshotStore | None,
+    ) -> None:
+        """Save a directory snapshot to one or more stores.
+
+        Args:
+            snapshot: The DirectorySnapshot to save
+            stores: Stores to save the snapshot to
+        """
+        for store in filter(None, stores):
+            try:
+                store.save(snapshot)
+            except OSError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to save directory snapshot. {error}",
+                    error=str(exc),
+                )
@@ -1,12 +1,35 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Callable, Self
-
-from ldaptor.protocols.ldap.ldaperrors import LDAPProtocolError
-from ldaptor.protocols.ldap.ldapserver import LDAPServer
+import re
+import time
+from typing import TYPE_CHECKING, Any, Callable, Self
+
+from ldaptor.protocols.ldap.ldaperrors import LDAPProtocolError, Success
+from ldaptor.protocols.ldap.ldapserver import (
+    LDAPServer,
+    LDAPServerConnectionLostException,
+)
+from ldaptor.protocols.pureldap import (
+    LDAPMessage,
+    LDAPSearchResultDone,
+    LDAPSearchResultEntry,
+    LDAPSearchResultReference,
+)
+from twisted.internet import defer
+from twisted.internet.address import IPv4Address, IPv6Address
+from twisted.internet.protocol import connectionDone
 from twisted.logger import Logger
 
+from apricot.log_level import debug_enabled
+from apricot.metrics import metrics
+
+from .ldap_request_statistics import LDAPRequestStatistics
+from .oauth_ldap_dn_table import parse_dn
+from .oauth_ldap_tree import OAuthLDAPTree
+
 if TYPE_CHECKING:
+    from collections.abc import Collection
+
     from ldaptor.interfaces import ILDAPEntry
     from ldaptor.protocols.pureldap import (
         LDAPAddRequest,
@@ -17,24 +40,233 @@ if TYPE_CHECKING:
         LDAPModifyDNRequest,
         LDAPModifyRequest,
         LDAPProtocolRequest,
+        LDAPProtocolResponse,
         LDAPSearchRequest,
-        LDAPSearchResultDone,
-        LDAPSearchResultEntry,
         LDAPUnbindRequest,
     )
-    from twisted.internet import defer
+    from twisted.python.failure import Failure
 
     from apricot.oauth import LDAPControlTuple
 
+    from .ldap_slow_query_log import LDAPSlowQueryLog
+
 
 class ReadOnlyLDAPServer(LDAPServer):
     """A read-only LDAP server."""
 
-    def __init__(self: Self, *, allow_anonymous_binds: bool = True) -> None:
-        """Initialise a ReadOnlyLDAPServer."""
+    range_option = re.compile(r"^(.+);range=(\d+)-(\d+|\*)$", re.IGNORECASE)
+
+    def __init__(
+        self: Self,
+        *,
+        allow_anonymous_binds: bool = True,
+        max_value_range: int = 0,
+        slow_query_log: LDAPSlowQueryLog | None = None,
+    ) -> None:
+        """Initialise a ReadOnlyLDAPServer.
+
+        Args:
+            allow_anonymous_binds: Whether to allow anonymous LDAP binds
+            max_value_range: Maximum number of values of an attribute to return in a
+                search result, or 0 for no limit. Attributes with more values are
+                returned in ranges as in Active Directory.
+            slow_query_log: Optional log of requests that took too long
+        """
         super().__init__()
         self.allow_anonymous_binds = allow_anonymous_binds
         self.logger = Logger()
+        self.max_value_range = max_value_range
+        self.pending: dict[int, LDAPRequestStatistics] = {}
+        self.slow_query_log = slow_query_log
+
+    def connectionMade(self: Self) -> None:  # noqa: N802
+        """Count the connection when it is opened."""
+        super().connectionMade()
+        metrics.increment("apricot_ldap_active_connections")
+
+    def connectionLost(  # noqa: N802
+        self: Self,
+        reason: Failure = connectionDone,
+    ) -> None:
+        """Stop counting the connection when it is closed.
+
+        Args:
+            reason: The reason the connection was closed
+        """
+        super().connectionLost(reason)
+        self.pending.clear()
+        metrics.increment("apricot_ldap_active_connections", -1)
+
+    def handle(self: Self, msg: LDAPMessage) -> None:
+        """Handle an LDAP message, timing how long it takes to respond.
+
+        Args:
+            msg: LDAP message containing a request
+        """
+        if not (metrics.enabled or self.slow_query_log):
+            super().handle(msg)
+            return
+        operation = (
+            msg.value.__class__.__name__.removeprefix("LDAP")
+            .removesuffix("Request")
+            .lower()
+        )
+        statistics = LDAPRequestStatistics(msg.id, operation, msg.value)
+        self.pending[msg.id] = statistics
+        if self.slow_query_log:
+            with statistics.activate():
+                super().handle(msg)
+        else:
+            super().handle(msg)
+        # Unbind and abandon requests finish without sending a response
+        if operation in {"abandon", "unbind"}:
+            self.finish_request(msg.id)
+
+    def queue(self: Self, id: int, op: LDAPProtocolResponse) -> None:  # noqa: A002
+        """Send a response to the client, recording the latency of final responses.
+
+        Args:
+            id: ID of the LDAP message being responded to
+            op: LDAP response
+
+        Raises:
+            LDAPServerConnectionLostException: if the connection has been closed
+        """
+        if (statistics := self.pending.get(id)) is None:
+            super().queue(id, op)
+            return
+        # Encode the response here rather than in ldaptor so that its size is known
+        if not self.connected:
+            raise LDAPServerConnectionLostException
+        data = LDAPMessage(op, id=id).toWire()
+        self.transport.write(data)
+        statistics.bytes_written += len(data)
+        if not isinstance(op, LDAPSearchResultEntry | LDAPSearchResultReference):
+            statistics.result_code = getattr(op, "resultCode", None)
+            self.finish_request(id)
+
+    def finish_request(self: Self, message_id: int) -> None:
+        """Record the time taken to handle a request, logging it if it was slow.
+
+        Args:
+            message_id: ID of the LDAP message containing the request
+        """
+        if (statistics := self.pending.pop(message_id, None)) is None:
+            return
+        statistics.finished_at = time.perf_counter()
+        metrics.observe(
+            "apricot_ldap_request_duration_seconds",
+            statistics.duration,
+            operation=statistics.operation,
+        )
+        if self.slow_query_log:
+            peer = self.transport.getPeer()
+            self.slow_query_log.record(
+                statistics,
+                (
+                    f"{peer.host}:{peer.port}"
+                    if isinstance(peer, IPv4Address | IPv6Address)
+                    else str(peer)
+                ),
+            )
+
+    def parse_value_ranges(
+        self: Self,
+        attributes: list[bytes | str],
+    ) -> tuple[list[bytes | str], dict[str, tuple[int, int | None]]]:
+        """Remove any range options, such as 'member;range=0-1499', from attributes.
+
+        Args:
+            attributes: Attributes requested in an LDAP search
+
+        Returns:
+            The requested attributes without range options together with a dictionary
+            of the requested range for each lower-case attribute name, where the end of
+            the range is None if it was '*'.
+        """
+        output: dict[bytes | str, None] = {}
+        ranges: dict[str, tuple[int, int | None]] = {}
+        for attribute in attributes:
+            text = (
+                attribute.decode("utf-8") if isinstance(attribute, bytes) else attribute
+            )
+            if not (match := self.range_option.match(text)):
+                output[attribute] = None
+                continue
+            name, low, high = match.groups()
+            ranges[name.lower()] = (int(low), None if high == "*" else int(high))
+            output[name.encode("utf-8") if isinstance(attribute, bytes) else name] = (
+                None
+            )
+        return (list(output), ranges)
+
+    def reply_with_ranges(
+        self: Self,
+        reply: Callable[[LDAPSearchResultEntry], None],
+        ranges: dict[str, tuple[int, int | None]],
+    ) -> Callable[[LDAPSearchResultEntry], None]:
+        """Wrap an LDAP search callback so that large attributes are sent in ranges.
+
+        Args:
+            reply: LDAP callback
+            ranges: The requested range for each lower-case attribute name
+
+        Returns:
+            An LDAP callback that replaces the attributes of each search result with
+            ranges of their values before sending it.
+        """
+
+        def send_reply(response: LDAPSearchResultEntry) -> None:
+            if isinstance(response, LDAPSearchResultEntry):
+                response.attributes = self.range_values(response.attributes, ranges)
+            reply(response)
+
+        return send_reply
+
+    def range_values(
+        self: Self,
+        attributes: list[tuple[bytes | str, Collection[Any]]],
+        ranges: dict[str, tuple[int, int | None]],
+    ) -> list[tuple[bytes | str, Collection[Any]]]:
+        """Return ranges of values for attributes that requested them or are too large.
+
+        Args:
+            attributes: Attributes of a search result
+            ranges: The requested range for each lower-case attribute name
+
+        Returns:
+            Attributes of the search result where each ranged attribute is renamed to,
+            for example, 'member;range=0-1499' or 'member;range=1500-*' for the last
+            range. Ranges are taken from the sorted values. Attributes whose requested
+            range starts after their last value are left out.
+        """
+        output: list[tuple[bytes | str, Collection[Any]]] = []
+        for key, values in attributes:
+            name = key.decode("utf-8") if isinstance(key, bytes) else key
+            if not (value_range := ranges.get(name.lower())):
+                if not self.max_value_range or len(values) <= self.max_value_range:
+                    output.append((key, values))
+                    continue
+                value_range = (0, None)
+            low, high = value_range
+            if low >= len(values):
+                continue
+            # Sort the values so that each range is consistent between searches
+            values = sorted(values)  # noqa: PLW2901
+            if self.max_value_range:
+                high = min(
+                    low + self.max_value_range - 1,
+                    len(values) - 1 if high is None else high,
+                )
+            if high is None or high >= len(values) - 1:
+                output.append(
+                    (f"{name};range={low}-*", values[low:]),
+                )
+            else:
+                output.append(
+                    (f"{name};range={low}-{high}", values[low : high + 1]),
+                )
+        return output
 
     def getRootDSE(  # noqa: N802
         self: Self,
@@ -104,12 +336,16 @@ class ReadOnlyLDAPServer(LDAPServer):
             LDAPProtocolError: if the bind request fails or if an anonymous bind is
                 attempted when they are disabled
         """
-        self.logger.debug("Handling an LDAP bind request.")
+        if debug_enabled():
+            self.logger.debug("Handling an LDAP bind request.")
         if not (self.allow_anonymous_binds or request.dn):
             msg = "Anonymous LDAP binds are disabled."
             self.logger.error(msg)
             raise LDAPProtocolError(msg)
         try:
+            # Reuse a cached parse of the DN rather than parsing it for every bind
+            if request.dn:
+                request.dn = parse_dn(request.dn)
             return super().handle_LDAPBindRequest(request, controls, reply)
         except Exception as exc:
             msg = f"LDAP bind request failed. {exc!s}"
@@ -136,7 +372,8 @@ class ReadOnlyLDAPServer(LDAPServer):
             LDAPProtocolError: if the compare request fails
         """
         try:
-            self.logger.debug("Handling an LDAP compare request.")
+            if debug_enabled():
+                self.logger.debug("Handling an LDAP compare request.")
             return super().handle_LDAPCompareRequest(request, controls, reply)
         except Exception as exc:
             msg = f"LDAP compare request failed. {exc!s}"
@@ -255,14 +492,86 @@ class ReadOnlyLDAPServer(LDAPServer):
         Raises:
             LDAPProtocolError: if the search request fails
         """
-        try:
+        if debug_enabled():
             self.logger.debug("Handling an LDAP search request.")
-            return super().handle_LDAPSearchRequest(request, controls, reply)
+        try:
+            # Reuse a cached parse of the base DN rather than parsing it for each search
+            if request.baseObject:
+                request.baseObject = parse_dn(request.baseObject)
+            request.attributes, ranges = self.parse_value_ranges(request.attributes)
+            if reply and (ranges or self.max_value_range):
+                reply = self.reply_with_ranges(reply, ranges)
+            return self.search_with_negative_cache(request, controls, reply)
         except Exception as exc:
             msg = f"LDAP search request failed. {exc!s}"
             self.logger.error(msg)  # noqa: TRY400
             raise LDAPProtocolError(msg) from exc
 
+    def search_with_negative_cache(
+        self: Self,
+        request: LDAPSearchRequest,
+        controls: list[LDAPControlTuple] | None,
+        reply: Callable[[LDAPSearchResultEntry], None] | None,
+    ) -> defer.Deferred[ILDAPEntry]:
+        """Handle an LDAP search request, remembering searches that find nothing.
+
+        Args:
+            request: LDAP request
+            controls: LDAP controls
+            reply: LDAP callback
+
+        Returns:
+            The result of the search as a deferred LDAP entry.
+        """
+        if statistics := LDAPRequestStatistics.current():
+            statistics.parsed_at = time.perf_counter()
+        tree = self.factory
+        if not (
+            reply
+            and isinstance(tree, OAuthLDAPTree)
+            and tree.negative_cache
+            and request.baseObject
+        ):
+            return super().handle_LDAPSearchRequest(request, controls, reply)
+
+        # Finish immediately if this search recently found nothing
+        base_dn = request.baseObject.getText().lower()
+        miss_key = f"search:{request.scope}:{base_dn}:{request.filter.toWire().hex()}"
+        if tree.is_known_miss(miss_key):
+            if debug_enabled():
+                self.logger.debug("LDAP search recently found no entries.")
+            return defer.succeed(LDAPSearchResultDone(resultCode=Success.resultCode))
+        generation = tree.generation
+
+        # Count the entries found by this search
+        n_entries = 0
+
+        def count_reply(response: LDAPSearchResultEntry) -> None:
+            nonlocal n_entries
+            if isinstance(response, LDAPSearchResultEntry):
+                n_entries += 1
+            reply(response)
+
+        def remember_miss(result: LDAPSearchResultDone) -> LDAPSearchResultDone:
+            if (
+                tree.negative_cache
+                and not n_entries
+                and isinstance(result, LDAPSearchResultDone)
+                and result.resultCode == Success.resultCode
+            ):
+                tree.negative_cache.add(generation, miss_key)
+            return result
+
+        return (
+            super()
+            .handle_LDAPSearchRequest(
+                request,
+                controls,
+                count_reply,
+            )
+            .addCallback(remember_miss)
+        )
+
     def handle_LDAPUnbindRequest(  # noqa: N802
         self: Self,
         request: LDAPUnbindRequest,
@@ -280,7 +589,8 @@ class ReadOnlyLDAPServer(LDAPServer):
             LDAPProtocolError: if the unbind request fails
         """
         try:
-            self.logger.debug("Handling an LDAP unbind request.")
+            if debug_enabled():
+                self.logger.debug("Handling an LDAP unbind request.")
             super().handle_LDAPUnbindRequest(request, controls, reply)
         except Exception as exc:
             msg = f"LDAP unbind request failed. {exc!s}"
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, ClassVar, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class RefreshCircuitBreaker:
+    """A circuit breaker that stops a failing refresh from being retried too often.
+
+    The breaker is closed while refreshes succeed. When a refresh fails the breaker
+    opens, and no refresh is attempted until a backoff has passed, which doubles with
+    each consecutive failure up to a maximum. The breaker is then half-open and allows
+    one refresh: if it succeeds the breaker closes, and otherwise it opens again. The
+    last good LDAP tree is served throughout.
+
+    A refresh that returns far fewer users or groups than the current tree is rejected
+    rather than served, as this is more likely to be a problem with the OAuth backend
+    than a real change to the directory. Rejections are not failures, as the backend
+    did respond, so they do not open the breaker. If several consecutive refreshes
+    return the same smaller directory then it is accepted, as a real deletion would.
+    """
+
+    states: ClassVar[tuple[str, ...]] = ("closed", "half-open", "open")
+
+    def __init__(
+        self: Self,
+        *,
+        backoff: float = 10,
+        max_backoff: float = 600,
+        max_shrink: float = 0.5,
+        shrink_confirmations: int = 3,
+    ) -> None:
+        """Initialise a RefreshCircuitBreaker.
+
+        Args:
+            backoff: Time in seconds to wait before retrying after the first failure
+            max_backoff: Maximum time in seconds to wait before retrying
+            max_shrink: Largest fraction of users or groups that a refresh may remove
+                from the tree, or 1 to allow any change
+            shrink_confirmations: Number of consecutive refreshes that must return the
+                same smaller directory before it is served
+        """
+        self.backoff = backoff
+        self.consecutive_failures = 0
+        self.consecutive_rejections = 0
+        self.logger = Logger()
+        self.max_backoff = max_backoff
+        self.max_shrink = max_shrink
+        self.rejected_counts: dict[str, int] = {}
+        self.retry_at = 0.0
+        self.shrink_confirmations = shrink_confirmations
+        self.state = "closed"
+
+    def allow(self: Self) -> bool:
+        """Whether a refresh may be attempted now.
+
+        Returns:
+            False if the breaker is open and its backoff has not yet passed.
+        """
+        if self.state == "open" and time.monotonic() >= self.retry_at:
+            self.logger.info(
+                "Retrying LDAP tree refresh after {n_failures} consecutive failures.",
+                n_failures=self.consecutive_failures,
+            )
+            self.state = "half-open"
+        return self.state != "open"
+
+    def check_shrinkage(
+        self: Self,
+        current_counts: dict[str, int],
+        new_counts: dict[str, int],
+    ) -> bool:
+        """Check whether a new tree has lost too many entries to be served.
+
+        Args:
+            current_counts: Number of entries in each OU of the current tree
+            new_counts: Number of entries in each OU of the new tree
+
+        Returns:
+            False if any OU has lost more than the maximum fraction of its entries,
+            unless enough consecutive refreshes have returned the same entry counts.
+        """
+        shrunk_ous = [
+            ou
+            for ou, n_current in sorted(current_counts.items())
+            if n_current
+            and (n_current - new_counts.get(ou, 0)) / n_current > self.max_shrink
+        ]
+        if not shrunk_ous:
+            self.consecutive_rejections = 0
+            self.rejected_counts = {}
+            return True
+        if new_counts == self.rejected_counts:
+            self.consecutive_rejections += 1
+        else:
+            self.consecutive_rejections = 1
+            self.rejected_counts = dict(new_counts)
+        changes = ", ".join(
+            f"{current_counts[ou]} {ou} with {new_counts.get(ou, 0)}"
+            for ou in shrunk_ous
+        )
+        if self.consecutive_rejections >= self.shrink_confirmations:
+            self.logger.warn(
+                "Accepting a refresh that replaces {changes}, as {n_refreshes} "
+                "consecutive refreshes have returned it.",
+                changes=changes,
+                n_refreshes=self.consecutive_rejections,
+            )
+            self.consecutive_rejections = 0
+            self.rejected_counts = {}
+            return True
+        self.logger.warn(
+            "Rejecting a refresh that would replace {changes}, as more than "
+            "{max_shrink:.0%} of them would be removed. It will be accepted if "
+            "{n_remaining} more consecutive refreshes return it.",
+            changes=changes,
+            max_shrink=self.max_shrink,
+            n_remaining=self.shrink_confirmations - self.consecutive_rejections,
+        )
+        return False
+
+    def collect_metrics(self: Self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Describe the state of the breaker as metric samples.
+
+        Yields:
+            The name, labels and value of each sample.
+        """
+        for state in self.states:
+            yield (
+                "apricot_refresh_breaker_state",
+                {"state": state},
+                float(state == self.state),
+            )
+        yield ("apricot_refresh_consecutive_failures", {}, self.consecutive_failures)
+        yield (
+            "apricot_refresh_consecutive_rejections",
+            {},
+            self.consecutive_rejections,
+        )
+
+    def record_failure(self: Self) -> None:
+        """Open the breaker after a refresh has failed."""
+        self.consecutive_failures += 1
+        delay = min(
+            self.max_backoff,
+            self.backoff * 2 ** (self.consecutive_failures - 1),
+        )
+        self.retry_at = time.monotonic() + delay
+        self.state = "open"
+        self.logger.warn(
+            "Retrying LDAP tree refresh in {delay:.0f} seconds after {n_failures} "
+            "consecutive failures.",
+            delay=delay,
+            n_failures=self.consecutive_failures,
+        )
+
+    def record_success(self: Self) -> None:
+        """Close the breaker after a refresh has succeeded."""
+        if self.consecutive_failures:
+            self.logger.info(
+                "LDAP tree refresh succeeded after {n_failures} consecutive failures.",
+                n_failures=self.consecutive_failures,
+            )
+        self.consecutive_failures = 0
+        self.state = "closed"
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import logging
+
+LOGGER_NAME = "apricot"
+
+
+def debug_enabled() -> bool:
+    """Whether debug messages from Apricot will be logged.
+
+    Twisted builds and publishes an event for every message before the Python logger
+    that it is forwarded to checks the level, so messages on hot paths should only be
+    logged if this is True.
+
+    Returns:
+        True if the Apricot logger is enabled for debug messages.
+    """
+    return logging.getLogger(LOGGER_NAME).isEnabledFor(logging.DEBUG)
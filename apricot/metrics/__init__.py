@@ -0,0 +1,14 @@
+from .metrics_registry import MetricsRegistry
+from .metrics_resource import MetricsResource
+from .refresh_profiler import RefreshProfiler
+
+metrics = MetricsRegistry()
+refresh_profiler = RefreshProfiler(metrics)
+
+__all__ = [
+    "MetricsRegistry",
+    "MetricsResource",
+    "RefreshProfiler",
+    "metrics",
+    "refresh_profiler",
+]
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, ClassVar, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterable
+
+    MetricLabels = tuple[tuple[str, str], ...]
+    MetricSample = tuple[str, dict[str, str], float]
+
+
+class MetricsRegistry:
+    """A registry of counters, gauges and histograms in the Prometheus text format.
+
+    Every metric is described in 'descriptions'. Values can be recorded from any
+    thread, as refreshes run outside the reactor thread. Nothing is recorded until the
+    registry is enabled, so instrumented code costs almost nothing when metrics are not
+    being served. Values that are cheaper to read when they are needed, such as the
+    size of the LDAP tree, are provided by collectors instead.
+    """
+
+    buckets: ClassVar[tuple[float, ...]] = (
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+        60,
+        120,
+        300,
+    )
+    descriptions: ClassVar[dict[str, tuple[str, str]]] = {
+        "apricot_ldap_active_connections": (
+            "gauge",
+            "Number of open LDAP connections.",
+        ),
+        "apricot_ldap_request_duration_seconds": (
+            "histogram",
+            "Time taken to respond to each LDAP request by operation.",
+        ),
+        "apricot_negative_cache_hits_total": (
+            "counter",
+            "Lookups and searches answered by the negative cache.",
+        ),
+        "apricot_negative_cache_misses_total": (
+            "counter",
+            "Lookups and searches not found in the negative cache.",
+        ),
+        "apricot_negative_cache_size": (
+            "gauge",
+            "Number of lookups and searches in the negative cache.",
+        ),
+        "apricot_oauth_request_duration_seconds": (
+            "histogram",
+            "Time taken by each HTTP request to the OAuth backend.",
+        ),
+        "apricot_oauth_throttled_requests_total": (
+            "counter",
+            "HTTP requests to the OAuth backend that were rate limited.",
+        ),
+        "apricot_refresh_breaker_state": (
+            "gauge",
+            "Whether the refresh circuit breaker is in each state.",
+        ),
+        "apricot_refresh_consecutive_failures": (
+            "gauge",
+            "Number of consecutive failed refreshes of the LDAP tree.",
+        ),
+        "apricot_refresh_consecutive_rejections": (
+            "gauge",
+            "Number of consecutive refreshes rejected for removing too many entries.",
+        ),
+        "apricot_refresh_duration_seconds": (
+            "histogram",
+            "Time taken by each phase of refreshing the LDAP tree.",
+        ),
+        "apricot_refreshes_total": (
+            "counter",
+            "Refreshes of the LDAP tree by result (success, failure or rejected).",
+        ),
+        "apricot_tree_entries": (
+            "gauge",
+            "Number of entries in the LDAP tree by organisational unit.",
+        ),
+        "apricot_tree_generation": (
+            "gauge",
+            "Number of times the LDAP tree has been built.",
+        ),
+        "apricot_tree_generation_age_seconds": (
+            "gauge",
+            "Time since the data in the LDAP tree was retrieved.",
+        ),
+        "apricot_uid_cache_request_duration_seconds": (
+            "histogram",
+            "Time taken by each round trip to the UID cache by operation.",
+        ),
+    }
+
+    def __init__(self: Self) -> None:
+        """Initialise a MetricsRegistry."""
+        self.collectors: list[Callable[[], Iterable[MetricSample]]] = []
+        self.enabled = False
+        self.histograms: dict[tuple[str, MetricLabels], list[float]] = {}
+        self.lock = threading.Lock()
+        self.logger = Logger()
+        self.values: dict[tuple[str, MetricLabels], float] = {}
+
+    def add_collector(
+        self: Self,
+        collector: Callable[[], Iterable[MetricSample]],
+    ) -> None:
+        """Add a function that provides samples whenever the metrics are rendered.
+
+        Args:
+            collector: A function returning the name, labels and value of each sample
+        """
+        self.collectors.append(collector)
+
+    def increment(self: Self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increment a counter or change a gauge.
+
+        Args:
+            name: Name of the metric
+            amount: Amount to add, which may be negative for a gauge
+            labels: Labels identifying the sample
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self: Self, name: str, value: float, **labels: str) -> None:
+        """Add an observation to a histogram.
+
+        Args:
+            name: Name of the metric
+            value: The observed value
+            labels: Labels identifying the sample
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            # Store a count for each bucket followed by the sum and the total count
+            if (counts := self.histograms.get(key)) is None:
+                counts = self.histograms[key] = [0] * (len(self.buckets) + 2)
+            bucket = bisect.bisect_left(self.buckets, value)
+            if bucket < len(self.buckets):
+                counts[bucket] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def timer(self: Self, name: str, **labels: str) -> Generator[None, None, None]:
+        """Observe the time taken to run a block of code in a histogram.
+
+        Args:
+            name: Name of the metric
+            labels: Labels identifying the sample
+
+        Yields:
+            None
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self: Self) -> str:
+        """Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            The metrics as text.
+        """
+        samples: dict[str, list[str]] = {}
+        with self.lock:
+            for (name, labels), value in self.values.items():
+                samples.setdefault(name, []).append(
+                    self.sample(name, dict(labels), value),
+                )
+            for (name, labels), counts in self.histograms.items():
+                samples.setdefault(name, []).extend(
+                    self.histogram_samples(name, dict(labels), counts),
+                )
+        for name, sample_labels, value in self.collect():
+            samples.setdefault(name, []).append(self.sample(name, sample_labels, value))
+        lines = []
+        for name in sorted(samples):
+            kind, description = self.descriptions.get(name, ("untyped", ""))
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            lines += samples[name]
+        return "\n".join([*lines, ""])
+
+    def collect(self: Self) -> list[MetricSample]:
+        """Get samples from every collector.
+
+        Returns:
+            The name, labels and value of each sample. Collectors that fail are
+            skipped so that the remaining metrics can still be served.
+        """
+        samples: list[MetricSample] = []
+        for collector in self.collectors:
+            try:
+                samples += collector()
+            except Exception as exc:  # noqa: BLE001, PERF203
+                self.logger.warn("Failed to collect metrics. {error}", error=exc)
+        return samples
+
+    def histogram_samples(
+        self: Self,
+        name: str,
+        labels: dict[str, str],
+        counts: list[float],
+    ) -> list[str]:
+        """Render the samples for one histogram.
+
+        Args:
+            name: Name of the metric
+            labels: Labels identifying the histogram
+            counts: Count for each bucket followed by the sum and the total count
+
+        Returns:
+            A line for each cumulative bucket, the sum and the total count.
+        """
+        lines = []
+        cumulative = 0.0
+        for bound, count in zip(self.buckets, counts, strict=False):
+            cumulative += count
+            lines.append(
+                self.sample(f"{name}_bucket", {**labels, "le": str(bound)}, cumulative),
+            )
+        lines += [
+            self.sample(f"{name}_bucket", {**labels, "le": "+Inf"}, counts[-1]),
+            self.sample(f"{name}_sum", labels, counts[-2]),
+            self.sample(f"{name}_count", labels, counts[-1]),
+        ]
+        return lines
+
+    @staticmethod
+    def escape(label: str) -> str:
+        """Escape a label value.
+
+        Args:
+            label: The label value
+
+        Returns:
+            The label value with backslashes, quotes and newlines escaped.
+        """
+        return label.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    @staticmethod
+    def sample(name: str, labels: dict[str, str], value: float) -> str:
+        """Render a single sample.
+
+        Args:
+            name: Name of the sample
+            labels: Labels identifying the sample
+            value: Value of the sample
+
+        Returns:
+            The sample as a line of text.
+        """
+        if labels:
+            pairs = ",".join(
+                f'{key}="{MetricsRegistry.escape(label)}"'
+                for key, label in labels.items()
+            )
+            name = f"{name}{{{pairs}}}"
+        if float(value).is_integer():
+            return f"{name} {int(value)}"
+        return f"{name} {value!r}"
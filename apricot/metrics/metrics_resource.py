@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Self
+
+from twisted.web.resource import Resource
+
+if TYPE_CHECKING:
+    from twisted.web.server import Request
+
+    from .metrics_registry import MetricsRegistry
+
+
+class MetricsResource(Resource):
+    """A Twisted web resource that serves metrics for Prometheus to scrape."""
+
+    isLeaf = True  # noqa: N815
+
+    def __init__(self: Self, registry: MetricsRegistry) -> None:
+        """Initialise a MetricsResource.
+
+        Args:
+            registry: The registry whose metrics should be served
+        """
+        super().__init__()  # type: ignore[no-untyped-call]
+        self.registry = registry
+
+    def render_GET(self: Self, request: Request) -> bytes:  # noqa: N802
+        """Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            request: The HTTP request
+
+        Returns:
+            The metrics as UTF-8 encoded text.
+        """
+        request.setHeader(  # type: ignore[no-untyped-call]
+            b"Content-Type",
+            b"text/plain; version=0.0.4; charset=utf-8",
+        )
+        return self.registry.render().encode("utf-8")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import cProfile
+import pathlib
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from .metrics_registry import MetricsRegistry
+
+
+class RefreshProfiler:
+    """Time each phase of refreshing the LDAP tree.
+
+    The duration of every phase is logged when a refresh finishes and recorded in
+    the metrics registry. If a profile directory is set then each refresh also runs
+    under cProfile, and the statistics for any refresh that takes longer than the
+    threshold are written to that directory for inspection with pstats or snakeviz.
+    Refreshes are serialised by the LDAP tree, so only one is timed at a time.
+    """
+
+    metric = "apricot_refresh_duration_seconds"
+
+    def __init__(self: Self, registry: MetricsRegistry) -> None:
+        """Initialise a RefreshProfiler.
+
+        Args:
+            registry: The registry in which to record the duration of each phase
+        """
+        self.logger = Logger()
+        self.profile_directory: pathlib.Path | None = None
+        self.profile_threshold = 0.0
+        self.registry = registry
+        self.timings: dict[str, float] = {}
+
+    def enable_profiling(self: Self, directory: str, threshold: float) -> None:
+        """Profile each refresh, keeping the profiles of slow refreshes.
+
+        Args:
+            directory: Directory in which to write profiles
+            threshold: Time in seconds above which a refresh is slow
+        """
+        self.profile_directory = pathlib.Path(directory)
+        self.profile_threshold = threshold
+
+    @contextmanager
+    def phase(self: Self, name: str) -> Generator[None, None, None]:
+        """Time one phase of a refresh.
+
+        Args:
+            name: Name of the phase
+
+        Yields:
+            None
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0) + duration
+            self.registry.observe(self.metric, duration, phase=name)
+
+    @contextmanager
+    def refresh(self: Self) -> Generator[None, None, None]:
+        """Time a whole refresh, reporting each of its phases when it finishes.
+
+        Yields:
+            None
+        """
+        self.timings = {}
+        profiler = cProfile.Profile() if self.profile_directory else None
+        start = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            duration = time.perf_counter() - start
+            self.registry.observe(self.metric, duration, phase="total")
+            self.logger.info(
+                "Refresh took {duration:.2f}s ({phases}).",
+                duration=duration,
+                phases=", ".join(
+                    f"{name}={seconds:.2f}s" for name, seconds in self.timings.items()
+                ),
+            )
+            if profiler and duration > self.profile_threshold:
+                self.save_profile(profiler, duration)
+
+    def save_profile(self: Self, profiler: cProfile.Profile, duration: float) -> None:
+        """Write the profile of a slow refresh to the profile directory.
+
+        Args:
+            profiler: The profiler that ran during the refresh
+            duration: Time in seconds taken by the refresh
+        """
+        if not self.profile_directory:
+            return
+        path = self.profile_directory / time.strftime("refresh-%Y%m%d-%H%M%S.pstats")
+        try:
+            self.profile_directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as exc:
+            self.logger.warn(
+                "Failed to save refresh profile. {error}",
+                error=str(exc),
+            )
+            return
+        self.logger.warn(
+            "Refresh took {duration:.2f}s, longer than {threshold:.2f}s. "
+            "Saved a profile to '{path}'.",
+            duration=duration,
+            threshold=self.profile_threshold,
+            path=str(path),
+        )
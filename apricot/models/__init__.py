@@ -4,6 +4,7 @@ from .ldap_inetorgperson import LDAPInetOrgPerson
 from .ldap_object_class import LDAPObjectClass
 from .ldap_posix_account import LDAPPosixAccount
 from .ldap_posix_group import LDAPPosixGroup
+from .overlay_ismemberof import OverlayIsMemberOf
 from .overlay_memberof import OverlayMemberOf
 from .overlay_oauthentry import OverlayOAuthEntry
 
@@ -14,6 +15,7 @@ __all__ = [
     "LDAPObjectClass",
     "LDAPPosixAccount",
     "LDAPPosixGroup",
+    "OverlayIsMemberOf",
     "OverlayMemberOf",
     "OverlayOAuthEntry",
 ]
@@ -1,12 +1,48 @@
 from __future__ import annotations
 
+from functools import cache
 from typing import TYPE_CHECKING, Any, Self, Sequence
 
+from pydantic import TypeAdapter, ValidationError, create_model
+
 if TYPE_CHECKING:
+    from pydantic import BaseModel
+
     from apricot.models import LDAPObjectClass
     from apricot.typedefs import JSONDict, LDAPAttributeDict
 
 
+@cache
+def merged_object_class(
+    required_classes: tuple[type[LDAPObjectClass], ...],
+) -> tuple[type[BaseModel], TypeAdapter[list[BaseModel]], list[str]]:
+    """Construct a validator for objects that must satisfy several LDAP classes.
+
+    Validating against a single model that inherits from each of the required classes
+    is much faster than validating against each class in turn. As there are only a
+    handful of class combinations, the merged model is cached for each one.
+
+    Args:
+        required_classes: Tuple of required LDAP classes
+
+    Returns:
+        The merged model, a TypeAdapter for validating a list of objects against it
+        and the LDAP object class names for the merged model.
+    """
+    merged_model = create_model(
+        "".join(ldap_class.__name__ for ldap_class in required_classes),
+        __base__=required_classes,
+    )
+    object_class_names = ["top"]
+    for ldap_class in required_classes:
+        object_class_names += ldap_class.names()
+    return (
+        merged_model,
+        TypeAdapter(list[merged_model]),  # type: ignore[valid-type]
+        object_class_names,
+    )
+
+
 class LDAPAttributeAdaptor:
     """A class to convert attributes into LDAP format."""
 
@@ -43,12 +79,77 @@ class LDAPAttributeAdaptor:
         Returns:
             An LDAPAttributeAdaptor with these attributes
         """
-        attributes = {"objectclass": ["top"]}
-        for ldap_class in required_classes:
-            model = ldap_class(**input_dict)
-            attributes.update(model.model_dump())
-            attributes["objectclass"] += model.names()
-        return cls(attributes)
+        (output,) = cls.from_attributes_batch(
+            [input_dict],
+            required_classes=required_classes,
+        )
+        if isinstance(output, ValidationError):
+            raise output
+        return output
+
+    @classmethod
+    def from_attributes_batch(
+        cls: type[Self],
+        input_dicts: Sequence[JSONDict],
+        *,
+        required_classes: Sequence[type[LDAPObjectClass]],
+    ) -> list[LDAPAttributeAdaptor | ValidationError]:
+        """Construct LDAPAttributeAdaptors for a batch of objects with the same classes.
+
+        Args:
+            input_dicts: Sequence of dictionaries of attributes
+            required_classes: Sequence of LDAP classes required by every object
+
+        Returns:
+            A list with either an LDAPAttributeAdaptor or the ValidationError raised
+            when validating each input dictionary.
+        """
+        model, validator, object_class_names = merged_object_class(
+            tuple(required_classes),
+        )
+        outputs: list[LDAPAttributeAdaptor | ValidationError] = []
+        try:
+            models = validator.validate_python(input_dicts)
+        except ValidationError as exc:
+            # Validate the failing objects individually to get an error for each one,
+            # then validate all the others together
+            failed_indices = {error["loc"][0] for error in exc.errors()}
+            valid_dicts = [
+                input_dict
+                for idx, input_dict in enumerate(input_dicts)
+                if idx not in failed_indices
+            ]
+            valid_outputs = iter(
+                cls.from_attributes_batch(
+                    valid_dicts,
+                    required_classes=required_classes,
+                ),
+            )
+            for idx, input_dict in enumerate(input_dicts):
+                if idx in failed_indices:
+                    try:
+                        item_model = model.model_validate(input_dict)
+                    except ValidationError as item_exc:
+                        outputs.append(item_exc)
+                    else:
+                        # Objects can pass on their own if the batch error was not
+                        # specific to them
+                        outputs.append(
+                            cls(
+                                {
+                                    "objectclass": object_class_names,
+                                    **item_model.model_dump(),
+                                },
+                            ),
+                        )
+                else:
+                    outputs.append(next(valid_outputs))
+            return outputs
+        outputs.extend(
+            cls({"objectclass": object_class_names, **attributes})
+            for attributes in validator.dump_python(models)
+        )
+        return outputs
 
     def to_dict(self: Self) -> LDAPAttributeDict:
         """Convert the attributes to an LDAPAttributeDict.
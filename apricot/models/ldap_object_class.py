@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import cache
 from typing import Self
 
 from pydantic import BaseModel
@@ -12,17 +13,30 @@ class LDAPObjectClass(BaseModel):
     def names(cls: type[Self]) -> list[str]:
         """List of object-class names for this LDAP object-class.
 
+        Returns:
+            A sorted list of LDAP object class names for this class.
+        """
+        return list(cls._names())
+
+    @classmethod
+    @cache
+    def _names(cls: type[Self]) -> tuple[str, ...]:
+        """Tuple of object-class names for this LDAP object-class.
+
         We iterate through the parent classes in MRO order, getting an
         `_ldap_object_class_name` from each class that has one. We then sort these
-        before returning a list of names.
+        before returning a tuple of names. As this does not change, we cache the
+        result for each class.
 
         Returns:
-            A sorted list of LDAP object class names for this class.
+            A sorted tuple of LDAP object class names for this class.
         """
-        return sorted(
-            [
-                cls_._ldap_object_class_name.default  # noqa: SLF001
-                for cls_ in cls.__mro__
-                if hasattr(cls_, "_ldap_object_class_name")
-            ],
+        return tuple(
+            sorted(
+                [
+                    cls_._ldap_object_class_name.default  # noqa: SLF001
+                    for cls_ in cls.__mro__
+                    if hasattr(cls_, "_ldap_object_class_name")
+                ],
+            ),
         )
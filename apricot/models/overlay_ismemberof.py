@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from .ldap_object_class import LDAPObjectClass
+
+
+class OverlayIsMemberOf(LDAPObjectClass):
+    """Abstraction for tracking every group that an individual belongs to.
+
+    This includes groups that an individual belongs to through nested groups.
+
+    OID: n/a
+    Object class: Auxiliary
+    Parent: top
+    Schema: n/a
+    """
+
+    isMemberOf: list[str]  # noqa: N815
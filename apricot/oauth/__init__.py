@@ -1,6 +1,8 @@
 from apricot.typedefs import LDAPAttributeDict, LDAPControlTuple
 
-from .enums import OAuthBackend
+from .directory_client import DirectoryClient
+from .enums import KeycloakMembershipStrategy, OAuthBackend
+from .file_client import FileClient
 from .keycloak_client import KeycloakClient
 from .microsoft_entra_client import MicrosoftEntraClient
 from .oauth_client import OAuthClient
@@ -9,9 +11,13 @@ from .oauth_data_adaptor import OAuthDataAdaptor
 OAuthClientMap = {
     OAuthBackend.MICROSOFT_ENTRA: MicrosoftEntraClient,
     OAuthBackend.KEYCLOAK: KeycloakClient,
+    OAuthBackend.FILE: FileClient,
 }
 
 __all__ = [
+    "DirectoryClient",
+    "FileClient",
+    "KeycloakMembershipStrategy",
     "LDAPAttributeDict",
     "LDAPControlTuple",
     "OAuthBackend",
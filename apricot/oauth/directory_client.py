@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Self
+
+from twisted.logger import Logger
+
+if TYPE_CHECKING:
+    from apricot.cache import UidCache
+    from apricot.typedefs import JSONDict
+
+
+class DirectoryClient(ABC):
+    """Base class for clients that provide users and groups to the LDAP tree."""
+
+    def __init__(self: Self, *, uid_cache: UidCache) -> None:
+        """Initialise a DirectoryClient.
+
+        Args:
+            uid_cache: Cache for UIDs
+        """
+        self.logger = Logger()
+        self.uid_cache = uid_cache
+
+    @abstractmethod
+    def groups(self: Self) -> list[JSONDict]:
+        """Return JSON data about groups from the backend.
+
+        This should be a list of JSON dictionaries where 'None' is used to signify
+        missing values. Backends that support nested groups can list the 'cn' of each
+        direct subgroup under 'subgroups'.
+
+        Returns:
+            A list of group data in JSON format
+        """
+
+    @abstractmethod
+    def users(self: Self) -> list[JSONDict]:
+        """Return JSON data about users from the backend.
+
+        This should be a list of JSON dictionaries where 'None' is used to signify
+        missing values.
+
+        Returns:
+            A list of user data in JSON format
+        """
+
+    @abstractmethod
+    def verify(self: Self, username: str, password: str) -> bool:
+        """Verify username and password.
+
+        Args:
+            username: Username
+            password: User password
+
+        Returns:
+            Whether the username and password were correct
+        """
@@ -6,3 +6,12 @@ class OAuthBackend(str, Enum):
 
     MICROSOFT_ENTRA = "MicrosoftEntra"
     KEYCLOAK = "Keycloak"
+    FILE = "File"
+
+
+class KeycloakMembershipStrategy(str, Enum):
+    """Ways of finding the members of each Keycloak group."""
+
+    AUTO = "auto"
+    PER_GROUP = "per-group"
+    PER_USER = "per-user"
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import json
+import pathlib
+from typing import TYPE_CHECKING, Any, ClassVar, Self
+
+from ldaptor.protocols.ldap.distinguishedname import DistinguishedName
+from ldaptor.protocols.ldap.ldifprotocol import LDIF, LDIFParseError
+from typing_extensions import override
+
+from .directory_client import DirectoryClient
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from ldaptor.entry import BaseLDAPEntry
+
+    from apricot.typedefs import JSONDict
+
+
+class LDIFEntryReader(LDIF):
+    """Parse LDIF incrementally, collecting each entry as it is completed."""
+
+    # Allow long lines, such as those containing base64-encoded values
+    MAX_LENGTH = 2**20
+
+    def __init__(self: Self) -> None:
+        """Initialise an LDIFEntryReader."""
+        self.entries: list[BaseLDAPEntry] = []
+
+    @override
+    def gotEntry(self: Self, obj: BaseLDAPEntry) -> None:
+        self.entries.append(obj)
+
+
+class FileClient(DirectoryClient):
+    """Client that reads users and groups from a local export.
+
+    This allows Apricot to serve a recorded directory when the OAuth backend is
+    unavailable or for testing. The format is chosen by the file extension:
+
+    - .json: an object with 'groups' and 'users' lists
+    - .jsonl: one group or user per line, each with a 'type' of 'group' or 'user'
+    - .ldif: the entries under OU=groups and OU=users of an exported LDAP tree
+
+    Groups and users in JSON files use the same attributes as the output of the
+    other OAuth clients. JSONL and LDIF files are parsed as they are read, and
+    the parsed contents are reused until the file changes.
+    """
+
+    chunk_size = 2**16
+    formats: ClassVar[tuple[str, ...]] = (".json", ".jsonl", ".ldif")
+
+    def __init__(
+        self: Self,
+        file_path: str,
+        file_poll_interval: int = 5,
+        **kwargs: Any,
+    ) -> None:
+        """Initialise a FileClient.
+
+        Args:
+            file_path: Path to a JSON, JSONL or LDIF export of users and groups
+            file_poll_interval: Interval in seconds at which to check whether the
+                export has changed
+            kwargs: DirectoryClient keyword arguments
+
+        Raises:
+            ValueError: if the file format is not supported
+        """
+        self.path = pathlib.Path(file_path)
+        if self.path.suffix.lower() not in self.formats:
+            msg = (
+                f"Unsupported file format '{self.path.suffix}'. "
+                f"Please provide one of {', '.join(self.formats)}."
+            )
+            raise ValueError(msg)
+        self.poll_interval = file_poll_interval
+        self.records: tuple[list[JSONDict], list[JSONDict]] = ([], [])
+        self.signature: tuple[int, int] | None = None
+
+        super().__init__(**kwargs)
+
+    @override
+    def groups(self: Self) -> list[JSONDict]:
+        output = []
+        for group_dict in self.load()[0]:
+            attributes = dict(group_dict)
+            try:
+                if attributes.get("gidNumber") is None:
+                    attributes["gidNumber"] = self.uid_cache.get_group_uid(
+                        attributes["oauth_id"],
+                    )
+                attributes["memberUid"] = attributes.get("memberUid", [])
+                output.append(attributes)
+            except KeyError as exc:
+                self.logger.warn(
+                    "Failed to process group {group} due to a missing key {key}.",
+                    group=group_dict,
+                    key=str(exc),
+                )
+        return output
+
+    @override
+    def users(self: Self) -> list[JSONDict]:
+        output = []
+        for user_dict in self.load()[1]:
+            attributes = dict(user_dict)
+            try:
+                if attributes.get("uidNumber") is None:
+                    attributes["uidNumber"] = self.uid_cache.get_user_uid(
+                        attributes["oauth_id"],
+                    )
+                if attributes.get("gidNumber") is None:
+                    attributes["gidNumber"] = attributes["uidNumber"]
+                output.append(attributes)
+            except KeyError as exc:
+                self.logger.warn(
+                    "Failed to process user {user} due to a missing key {key}.",
+                    user=user_dict,
+                    key=str(exc),
+                )
+        return output
+
+    @override
+    def verify(self: Self, username: str, password: str) -> bool:
+        id(password)  # ignore unused arguments
+        self.logger.warn(
+            "Authentication failed for user '{user}'. Passwords cannot be verified "
+            "against a file export.",
+            user=username,
+        )
+        return False
+
+    def file_signature(self: Self) -> tuple[int, int]:
+        """Identify the current version of the export.
+
+        Returns:
+            The modification time in nanoseconds and size of the file.
+        """
+        stat = self.path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def has_changed(self: Self) -> bool:
+        """Whether the export has changed since it was last read.
+
+        Returns:
+            True if the file has been modified, replaced or removed.
+        """
+        try:
+            return self.file_signature() != self.signature
+        except OSError:
+            return self.signature is not None
+
+    def load(self: Self) -> tuple[list[JSONDict], list[JSONDict]]:
+        """Read groups and users from the export if it has changed.
+
+        Returns:
+            A list of groups and a list of users.
+
+        Raises:
+            ValueError: if the file could not be parsed
+        """
+        signature = self.file_signature()
+        if signature == self.signature:
+            return self.records
+        self.logger.info("Reading users and groups from '{path}'.", path=self.path)
+        try:
+            groups, users = self.read()
+        except (KeyError, LDIFParseError, TypeError, ValueError) as exc:
+            msg = f"Failed to parse '{self.path}'.\n{exc!s}"
+            raise ValueError(msg) from exc
+        self.logger.info(
+            "Read {n_groups} groups and {n_users} users from '{path}'.",
+            n_groups=len(groups),
+            n_users=len(users),
+            path=self.path,
+        )
+        self.records = (groups, users)
+        self.signature = signature
+        return self.records
+
+    def read(self: Self) -> tuple[list[JSONDict], list[JSONDict]]:
+        """Read groups and users from the export in the format given by its extension.
+
+        Returns:
+            A list of groups and a list of users.
+        """
+        suffix = self.path.suffix.lower()
+        if suffix == ".json":
+            with self.path.open(encoding="utf-8") as f_json:
+                data = json.load(f_json)
+            return (data["groups"], data["users"])
+        groups: list[JSONDict] = []
+        users: list[JSONDict] = []
+        records = self.read_ldif() if suffix == ".ldif" else self.read_jsonl()
+        for record_type, record in records:
+            (groups if record_type == "group" else users).append(record)
+        return (groups, users)
+
+    def read_jsonl(self: Self) -> Iterator[tuple[str, JSONDict]]:
+        """Read groups and users from a JSONL export one line at a time.
+
+        Yields:
+            The type of each record ('group' or 'user') and its attributes.
+        """
+        with self.path.open(encoding="utf-8") as f_jsonl:
+            for line_number, line in enumerate(f_jsonl, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record_type = record.pop("type", None)
+                if record_type not in {"group", "user"}:
+                    self.logger.warn(
+                        "Ignoring line {line_number} of '{path}' with unknown type "
+                        "'{record_type}'.",
+                        line_number=line_number,
+                        path=self.path,
+                        record_type=record_type,
+                    )
+                    continue
+                yield (record_type, record)
+
+    def read_ldif(self: Self) -> Iterator[tuple[str, JSONDict]]:
+        """Read groups and users from an LDIF export as it is parsed.
+
+        Generated entries such as primary and mirrored groups are skipped, as they
+        will be created again from the groups and users that they are based on.
+
+        Yields:
+            The type of each record ('group' or 'user') and its attributes.
+        """
+        reader = LDIFEntryReader()
+        with self.path.open("rb") as f_ldif:
+            while chunk := f_ldif.read(self.chunk_size):
+                reader.dataReceived(chunk)
+                yield from filter(None, map(self.record_from_ldif, reader.entries))
+                reader.entries.clear()
+        # Complete the final entry if there is no blank line after it
+        reader.dataReceived(b"\n\n")
+        yield from filter(None, map(self.record_from_ldif, reader.entries))
+
+    @staticmethod
+    def record_from_ldif(
+        entry: BaseLDAPEntry,
+    ) -> tuple[str, JSONDict] | None:
+        """Convert an LDIF entry into a group or user record.
+
+        Args:
+            entry: An LDAP entry parsed from LDIF
+
+        Returns:
+            The type of the record ('group' or 'user') and its attributes, or None if
+            the entry should be skipped.
+        """
+        rdns = entry.dn.split()
+        if len(rdns) < 2:  # noqa: PLR2004
+            return None
+        ou = rdns[1].getText().lower()
+        attributes = {
+            key.decode("utf-8"): [value.decode("utf-8") for value in values]
+            for key, values in entry.items()
+        }
+        if ou == "ou=groups":
+            # Only groups that came from the OAuth backend have an OAuth ID
+            if "oauth_id" not in attributes:
+                return None
+            group_cns = [
+                member_rdns[0].split()[0].value
+                for member_rdns in (
+                    DistinguishedName(member).split()
+                    for member in attributes.get("member", [])
+                )
+                if len(member_rdns) > 1
+                and member_rdns[1].getText().lower() == "ou=groups"
+            ]
+            return (
+                "group",
+                {
+                    "cn": attributes["cn"][0],
+                    "description": attributes.get("description", [""])[0],
+                    "gidNumber": int(attributes["gidNumber"][0]),
+                    "memberUid": attributes.get("memberUid", []),
+                    "oauth_id": attributes["oauth_id"][0],
+                    "subgroups": group_cns,
+                },
+            )
+        if ou == "ou=users":
+            # Users belong to the domain of the exported tree
+            user_dict: JSONDict = {
+                key: values[0]
+                for key, values in attributes.items()
+                if key not in {"isMemberOf", "memberOf", "objectClass"}
+            }
+            user_dict["domain"] = ".".join(
+                rdn.split()[0].value
+                for rdn in rdns
+                if rdn.split()[0].attributeType.lower() == "dc"
+            )
+            for key in ("gidNumber", "uidNumber"):
+                if key in user_dict:
+                    user_dict[key] = int(user_dict[key])
+            return ("user", user_dict)
+        return None
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-import operator
+import math
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TYPE_CHECKING, Any, Self, cast
 
 from typing_extensions import override
 
+from .enums import KeycloakMembershipStrategy
 from .oauth_client import OAuthClient
 
 if TYPE_CHECKING:
@@ -21,6 +25,10 @@ class KeycloakClient(OAuthClient):
         keycloak_base_url: str,
         keycloak_domain_attribute: str,
         keycloak_realm: str,
+        keycloak_membership_strategy: KeycloakMembershipStrategy = (
+            KeycloakMembershipStrategy.AUTO
+        ),
+        keycloak_write_back_workers: int = 4,
         **kwargs: Any,
     ) -> None:
         """Initialise a KeycloakClient.
@@ -29,11 +37,23 @@ class KeycloakClient(OAuthClient):
             keycloak_base_url: Base URL for Keycloak server
             keycloak_domain_attribute: Keycloak attribute used to define your domain
             keycloak_realm: Realm for Keycloak server
+            keycloak_membership_strategy: How to find the members of each group
+            keycloak_write_back_workers: Maximum number of concurrent requests used to
+                write generated attributes back to Keycloak
             kwargs: OAuthClient keyword arguments
         """
         self.base_url = keycloak_base_url
         self.domain_attribute = keycloak_domain_attribute
+        self.membership_requests = 0
+        self.membership_strategy = keycloak_membership_strategy
+        self.membership_strategy_used: KeycloakMembershipStrategy | None = None
         self.realm = keycloak_realm
+        self.write_back_executor = ThreadPoolExecutor(
+            max_workers=keycloak_write_back_workers,
+            thread_name_prefix="keycloak-write-back",
+        )
+        self.write_backs: dict[str, Future[dict[str, Any]]] = {}
+        self.write_backs_lock = threading.Lock()
 
         redirect_uri = "urn:ietf:wg:oauth:2.0:oob"  # this is the "no redirect" URL
         scopes: list[str] = []  # this is the default scope
@@ -55,107 +75,71 @@ class KeycloakClient(OAuthClient):
     @override
     def groups(self: Self) -> list[JSONDict]:
         output = []
-        try:
-            group_data: list[JSONDict] = []
-            while data := self.query(
-                f"{self.base_url}/admin/realms/{self.realm}/groups?first={len(group_data)}&max={self.max_rows}&briefRepresentation=false",
-                use_client_secret=False,
-            ):
-                group_data.extend(cast("list[JSONDict]", data))
-                if len(data) != self.max_rows:
-                    break
+        group_data, group_names, subgroup_ids = self.group_hierarchy()
 
-            # Ensure that gid attribute exists for all groups
-            for group_dict in group_data:
-                group_dict["attributes"] = group_dict.get("attributes", {})
-                if "gid" not in group_dict["attributes"]:
-                    group_dict["attributes"]["gid"] = None
-                # If group_gid exists then set the cache to the same value
-                # This ensures that any groups without a `gid` attribute will receive a
-                # UID that does not overlap with existing groups
-                if (group_gid := group_dict["attributes"]["gid"]) and len(
-                    group_dict["attributes"]["gid"],
-                ) == 1:
-                    self.uid_cache.overwrite_group_uid(
-                        group_dict["id"],
-                        int(group_gid[0], 10),
-                    )
-                # Set group attributes
-                if not group_dict["attributes"]["gid"]:
-                    group_dict["attributes"]["gid"] = [
-                        str(self.uid_cache.get_group_uid(group_dict["id"])),
-                    ]
-                    self.request(
-                        f"{self.base_url}/admin/realms/{self.realm}/groups/{group_dict['id']}",
-                        method="PUT",
-                        json=group_dict,
-                    )
+        # Ensure that gid attribute exists for all groups
+        valid_groups = []
+        for group_dict in group_data:
+            try:
+                self.ensure_group_gid(group_dict)
+                valid_groups.append(group_dict)
+            except KeyError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to process group {group} due to a missing key {key}.",
+                    group=group_dict,
+                    key=str(exc),
+                )
 
-            # Read group attributes
-            for group_dict in group_data:
+        # Read group attributes
+        group_members = self.group_members(valid_groups)
+        for group_dict in valid_groups:
+            try:
                 attributes: JSONDict = {}
-                attributes["cn"] = group_dict.get("name", None)
+                attributes["cn"] = group_names[group_dict["id"]]
                 attributes["description"] = group_dict.get("id", None)
                 attributes["gidNumber"] = group_dict["attributes"]["gid"][0]
                 attributes["oauth_id"] = group_dict.get("id", None)
                 # Add membership attributes
-                members = self.query(
-                    f"{self.base_url}/admin/realms/{self.realm}/groups/{group_dict['id']}/members",
-                    use_client_secret=False,
-                )
-                attributes["memberUid"] = [
-                    user["username"] for user in cast("list[JSONDict]", members)
+                attributes["memberUid"] = group_members.get(group_dict["id"], [])
+                attributes["subgroups"] = [
+                    group_names[subgroup_id]
+                    for subgroup_id in subgroup_ids[group_dict["id"]]
                 ]
                 output.append(attributes)
-        except KeyError as exc:
-            msg = f"Failed to process group {group_dict} due to a missing key {exc}."
-            self.logger.warn(msg)
+            except KeyError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to process group {group} due to a missing key {key}.",
+                    group=group_dict,
+                    key=str(exc),
+                )
         return output
 
     @override
     def users(self: Self) -> list[JSONDict]:
         output = []
-        try:
-            user_data: list[JSONDict] = []
-            while data := self.query(
-                f"{self.base_url}/admin/realms/{self.realm}/users?first={len(user_data)}&max={self.max_rows}&briefRepresentation=false",
-                use_client_secret=False,
-            ):
-                user_data.extend(cast("list[JSONDict]", data))
-                if len(data) != self.max_rows:
-                    break
+        user_data, _ = self.query_paged(
+            f"{self.base_url}/admin/realms/{self.realm}/users?briefRepresentation=false",
+        )
 
-            # Ensure that uid attribute exists for all users
-            for user_dict in user_data:
-                user_dict["attributes"] = user_dict.get("attributes", {})
-                if "uid" not in user_dict["attributes"]:
-                    user_dict["attributes"]["uid"] = None
-                # If user_uid exists then set the cache to the same value.
-                # This ensures that any groups without a `gid` attribute will receive a
-                # UID that does not overlap with existing groups
-                if (user_uid := user_dict["attributes"]["uid"]) and len(
-                    user_dict["attributes"]["uid"],
-                ) == 1:
-                    self.uid_cache.overwrite_user_uid(
-                        user_dict["id"],
-                        int(user_uid[0], 10),
-                    )
-                # Set user attributes
-                if not user_dict["attributes"]["uid"]:
-                    user_dict["attributes"]["uid"] = [
-                        str(self.uid_cache.get_user_uid(user_dict["id"])),
-                    ]
-                    self.request(
-                        f"{self.base_url}/admin/realms/{self.realm}/users/{user_dict['id']}",
-                        method="PUT",
-                        json=user_dict,
-                    )
+        # Ensure that uid attribute exists for all users
+        valid_users = []
+        for user_dict in user_data:
+            try:
+                self.ensure_user_uid(user_dict)
+                valid_users.append(user_dict)
+            except KeyError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to process user {user} due to a missing key {key}.",
+                    user=user_dict,
+                    key=str(exc),
+                )
 
-            # Read user attributes
-            for user_dict in sorted(
-                user_data,
-                key=operator.itemgetter("createdTimestamp"),
-            ):
+        # Read user attributes
+        for user_dict in sorted(
+            valid_users,
+            key=lambda user_dict: user_dict.get("createdTimestamp", 0),
+        ):
+            try:
                 # Get user attributes
                 first_name = user_dict.get("firstName", None)
                 last_name = user_dict.get("lastName", None)
@@ -179,7 +163,249 @@ class KeycloakClient(OAuthClient):
                 attributes["uid"] = username
                 attributes["uidNumber"] = user_dict["attributes"]["uid"][0]
                 output.append(attributes)
-        except KeyError as exc:
-            msg = f"Failed to process user {user_dict} due to a missing key {exc}."
-            self.logger.warn(msg)
+            except KeyError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to process user {user} due to a missing key {key}.",
+                    user=user_dict,
+                    key=str(exc),
+                )
         return output
+
+    def ensure_group_gid(self: Self, group_dict: JSONDict) -> None:
+        """Ensure that a group has a 'gid' attribute, generating one if necessary.
+
+        Args:
+            group_dict: Keycloak representation of the group
+        """
+        group_dict["attributes"] = group_dict.get("attributes", {})
+        if "gid" not in group_dict["attributes"]:
+            group_dict["attributes"]["gid"] = None
+        # If group_gid exists then set the cache to the same value
+        # This ensures that any groups without a `gid` attribute will receive a
+        # UID that does not overlap with existing groups
+        if (group_gid := group_dict["attributes"]["gid"]) and len(
+            group_dict["attributes"]["gid"],
+        ) == 1:
+            self.uid_cache.overwrite_group_uid(
+                group_dict["id"],
+                int(group_gid[0], 10),
+            )
+        # Set group attributes
+        if not group_dict["attributes"]["gid"]:
+            group_dict["attributes"]["gid"] = [
+                str(self.uid_cache.get_group_uid(group_dict["id"])),
+            ]
+            self.write_back(
+                f"{self.base_url}/admin/realms/{self.realm}/groups/{group_dict['id']}",
+                group_dict,
+            )
+
+    def ensure_user_uid(self: Self, user_dict: JSONDict) -> None:
+        """Ensure that a user has a 'uid' attribute, generating one if necessary.
+
+        Args:
+            user_dict: Keycloak representation of the user
+        """
+        user_dict["attributes"] = user_dict.get("attributes", {})
+        if "uid" not in user_dict["attributes"]:
+            user_dict["attributes"]["uid"] = None
+        # If user_uid exists then set the cache to the same value.
+        # This ensures that any groups without a `gid` attribute will receive a
+        # UID that does not overlap with existing groups
+        if (user_uid := user_dict["attributes"]["uid"]) and len(
+            user_dict["attributes"]["uid"],
+        ) == 1:
+            self.uid_cache.overwrite_user_uid(
+                user_dict["id"],
+                int(user_uid[0], 10),
+            )
+        # Set user attributes
+        if not user_dict["attributes"]["uid"]:
+            user_dict["attributes"]["uid"] = [
+                str(self.uid_cache.get_user_uid(user_dict["id"])),
+            ]
+            self.write_back(
+                f"{self.base_url}/admin/realms/{self.realm}/users/{user_dict['id']}",
+                user_dict,
+            )
+
+    def group_hierarchy(
+        self: Self,
+    ) -> tuple[list[JSONDict], dict[str, str], dict[str, list[str]]]:
+        """Retrieve every group, including subgroups at any depth.
+
+        Older Keycloak versions include the full hierarchy under 'subGroups'. Newer
+        versions only provide a 'subGroupCount', so the children of each group that
+        has any are listed with one paged request for that group.
+
+        Returns:
+            A list of Keycloak representations of each group, a dictionary mapping each
+            group ID to its name and a dictionary mapping each group ID to the IDs of
+            its direct subgroups. Subgroups are named using their path from the
+            top-level group, for example 'parent/child'.
+        """
+        top_level_groups, _ = self.query_paged(
+            f"{self.base_url}/admin/realms/{self.realm}/groups?briefRepresentation=false&subGroupsCount=true",
+        )
+        group_data: list[JSONDict] = []
+        group_names = {
+            group_dict["id"]: group_dict["name"] for group_dict in top_level_groups
+        }
+        subgroup_ids: dict[str, list[str]] = {}
+        pending = deque(top_level_groups)
+        while pending:
+            group_dict = pending.popleft()
+            if group_dict["id"] in subgroup_ids:
+                continue
+            group_data.append(group_dict)
+            if not (subgroups := group_dict.get("subGroups", [])) and group_dict.get(
+                "subGroupCount",
+                0,
+            ):
+                subgroups, _ = self.query_paged(
+                    f"{self.base_url}/admin/realms/{self.realm}/groups/{group_dict['id']}/children?briefRepresentation=false&subGroupsCount=true",
+                )
+            subgroup_ids[group_dict["id"]] = []
+            for subgroup_dict in subgroups:
+                group_names.setdefault(
+                    subgroup_dict["id"],
+                    f"{group_names[group_dict['id']]}/{subgroup_dict['name']}",
+                )
+                subgroup_ids[group_dict["id"]].append(subgroup_dict["id"])
+                pending.append(subgroup_dict)
+        return group_data, group_names, subgroup_ids
+
+    def group_members(self: Self, group_data: list[JSONDict]) -> dict[str, list[str]]:
+        """Find the usernames of the members of each group.
+
+        Members can either be listed for each group in turn or, when there are more
+        groups than users, by listing the groups for each user in turn. The strategy
+        that was used and the number of requests it needed are recorded.
+
+        Args:
+            group_data: Keycloak representations of each group
+
+        Returns:
+            A dictionary mapping each group ID to the usernames of its members.
+        """
+        strategy = self.membership_strategy
+        n_requests = 0
+        if strategy == KeycloakMembershipStrategy.AUTO:
+            n_users = int(
+                cast(
+                    "int",
+                    self.query(
+                        f"{self.base_url}/admin/realms/{self.realm}/users/count",
+                        use_client_secret=False,
+                    ),
+                ),
+            )
+            n_requests += 1
+            # Listing the groups of each user also requires listing the users
+            per_user_requests = n_users + math.ceil((n_users + 1) / self.max_rows)
+            strategy = (
+                KeycloakMembershipStrategy.PER_USER
+                if per_user_requests < len(group_data)
+                else KeycloakMembershipStrategy.PER_GROUP
+            )
+
+        members: dict[str, list[str]] = {}
+        if strategy == KeycloakMembershipStrategy.PER_USER:
+            user_data, user_requests = self.query_paged(
+                f"{self.base_url}/admin/realms/{self.realm}/users?briefRepresentation=true",
+            )
+            n_requests += user_requests
+            for user_dict in user_data:
+                user_groups, user_group_requests = self.query_paged(
+                    f"{self.base_url}/admin/realms/{self.realm}/users/{user_dict['id']}/groups?briefRepresentation=true",
+                )
+                n_requests += user_group_requests
+                for group_dict in user_groups:
+                    members.setdefault(group_dict["id"], []).append(
+                        user_dict["username"],
+                    )
+        else:
+            for group_dict in group_data:
+                member_data, group_requests = self.query_paged(
+                    f"{self.base_url}/admin/realms/{self.realm}/groups/{group_dict['id']}/members?briefRepresentation=true",
+                )
+                n_requests += group_requests
+                members[group_dict["id"]] = [user["username"] for user in member_data]
+
+        self.membership_requests = n_requests
+        self.membership_strategy_used = strategy
+        self.logger.info(
+            "Found members of {n_groups} groups using the {strategy} strategy with {n_requests} requests.",  # noqa: E501
+            n_groups=len(group_data),
+            n_requests=n_requests,
+            strategy=strategy.value,
+        )
+        return members
+
+    def query_paged(self: Self, url: str) -> tuple[list[JSONDict], int]:
+        """Retrieve every item from a Keycloak endpoint that returns results in pages.
+
+        Args:
+            url: The Keycloak URL, which may already have query parameters
+
+        Returns:
+            A list of all items together with the number of requests that were needed.
+        """
+        separator = "&" if "?" in url else "?"
+        items: list[JSONDict] = []
+        n_requests = 0
+        while True:
+            data = self.query(
+                f"{url}{separator}first={len(items)}&max={self.max_rows}",
+                use_client_secret=False,
+            )
+            n_requests += 1
+            if not data:
+                break
+            items.extend(cast("list[JSONDict]", data))
+            if len(data) != self.max_rows:
+                break
+        return items, n_requests
+
+    def write_back(self: Self, url: str, data: JSONDict) -> None:
+        """Queue an update to a Keycloak object without waiting for it to complete.
+
+        Updates are sent by a pool of worker threads so that a refresh does not have
+        to wait for them. If an update to the same object is still pending then the
+        new one is skipped, as it would write the same generated attributes.
+
+        The workers share the application session and bearer token with the refresh
+        thread. The session is not reconfigured once it has been created, and the
+        bearer token is only fetched by one thread at a time.
+
+        Args:
+            url: The Keycloak URL for the object
+            data: The complete representation of the object, which must not be
+                modified after it has been queued
+        """
+
+        def write_back_callback(future: Future[dict[str, Any]]) -> None:
+            with self.write_backs_lock:
+                if self.write_backs.get(url) is future:
+                    del self.write_backs[url]
+            if exc := future.exception():
+                self.logger.warn(
+                    "Failed to write attributes back to '{url}'. {error}",
+                    url=url,
+                    error=str(exc),
+                )
+
+        with self.write_backs_lock:
+            if (pending := self.write_backs.get(url)) and not pending.done():
+                return
+            self.logger.debug("Queueing a write back to '{url}'.", url=url)
+            future = self.write_back_executor.submit(
+                self.request,
+                url,
+                method="PUT",
+                json=data,
+            )
+            # Store the future before adding the callback, which runs immediately if
+            # the update has already completed
+            self.write_backs[url] = future
+        future.add_done_callback(write_back_callback)
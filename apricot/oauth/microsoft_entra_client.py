@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import operator
 from typing import TYPE_CHECKING, Any, Self, cast
 
 from typing_extensions import override
 
+from apricot.log_level import debug_enabled
+
 from .oauth_client import OAuthClient
 
 if TYPE_CHECKING:
@@ -14,6 +15,8 @@ if TYPE_CHECKING:
 class MicrosoftEntraClient(OAuthClient):
     """OAuth client for the Microsoft Entra backend."""
 
+    max_rows = 999  # change this number to a much lower to go into development
+
     def __init__(
         self: Self,
         entra_tenant_id: str,
@@ -51,24 +54,12 @@ class MicrosoftEntraClient(OAuthClient):
             "displayName",
             "id",
         ]
-        group_data: list[JSONDict] = []
-        max_rows = 999
-        current_query: str = (
-            f"https://graph.microsoft.com/v1.0/groups?$select={','.join(queries)}&$top={max_rows}"
+        group_data = self.query_paged(
+            f"https://graph.microsoft.com/v1.0/groups?$select={','.join(queries)}&$top={self.max_rows}",
         )
-        while response_data := self.query(current_query):
-            self.logger.debug(
-                "Retrieved group response object: {response}",
-                response=response_data,
-            )
-            group_data.extend(cast("list[JSONDict]", response_data["value"]))
-            if "@odata.nextLink" in response_data:
-                current_query = response_data["@odata.nextLink"]
-            else:
-                break
         for group_dict in sorted(
             group_data,
-            key=operator.itemgetter("createdDateTime"),
+            key=lambda group_dict: group_dict.get("createdDateTime", ""),
         ):
             try:
                 group_uid = self.uid_cache.get_group_uid(group_dict["id"])
@@ -78,12 +69,12 @@ class MicrosoftEntraClient(OAuthClient):
                 attributes["gidNumber"] = group_uid
                 attributes["oauth_id"] = group_dict.get("id", None)
                 # Add membership attributes
-                members = self.query(
-                    f"https://graph.microsoft.com/v1.0/groups/{group_dict['id']}/members",
+                members = self.query_paged(
+                    f"https://graph.microsoft.com/v1.0/groups/{group_dict['id']}/members?$top={self.max_rows}",
                 )
                 attributes["memberUid"] = [
                     str(user["userPrincipalName"]).split("@")[0]
-                    for user in members["value"]
+                    for user in members
                     if user.get("userPrincipalName")
                 ]
                 output.append(attributes)
@@ -98,37 +89,22 @@ class MicrosoftEntraClient(OAuthClient):
     @override
     def users(self: Self) -> list[JSONDict]:
         output: list[JSONDict] = []
-        current_query: str = ""
-        try:
-            queries = [
-                "createdDateTime",
-                "displayName",
-                "givenName",
-                "id",
-                "surname",
-                "userPrincipalName",
-            ]
-            max_rows = 999  # change this number to a much lower to go into development
-            user_data: list[JSONDict] = []
-            initial_query: str = (
-                f"https://graph.microsoft.com/v1.0/users?$select={','.join(queries)}&$top={max_rows}"
-            )
-            current_query = initial_query
-            while response_data := self.query(current_query):
-                self.logger.debug(
-                    "Retrieved user response object: {response}",
-                    response=response_data,
-                )
-                user_data.extend(cast("list[JSONDict]", response_data["value"]))
-                # @odata.nextLink - there is more data to retrieve
-                if "@odata.nextLink" in response_data:
-                    current_query = response_data["@odata.nextLink"]
-                else:
-                    break
-            for user_dict in sorted(
-                user_data,
-                key=operator.itemgetter("createdDateTime"),
-            ):
+        queries = [
+            "createdDateTime",
+            "displayName",
+            "givenName",
+            "id",
+            "surname",
+            "userPrincipalName",
+        ]
+        user_data = self.query_paged(
+            f"https://graph.microsoft.com/v1.0/users?$select={','.join(queries)}&$top={self.max_rows}",
+        )
+        for user_dict in sorted(
+            user_data,
+            key=lambda user_dict: user_dict.get("createdDateTime", ""),
+        ):
+            try:
                 # Get user attributes
                 given_name = user_dict.get("givenName", None)
                 surname = user_dict.get("surname", None)
@@ -148,11 +124,38 @@ class MicrosoftEntraClient(OAuthClient):
                 attributes["uid"] = uid or None
                 attributes["uidNumber"] = user_uid
                 output.append(attributes)
-
-        except KeyError as exc:
-            self.logger.warn(
-                "Failed to process user {user} due to a missing key {key}.",
-                user=user_dict,
-                key=str(exc),
-            )
+            except KeyError as exc:  # noqa: PERF203
+                self.logger.warn(
+                    "Failed to process user {user} due to a missing key {key}.",
+                    user=user_dict,
+                    key=str(exc),
+                )
         return output
+
+    def query_paged(self: Self, url: str) -> list[JSONDict]:
+        """Retrieve every item from a Graph endpoint that returns results in pages.
+
+        Graph returns at most '$top' items in each response, together with an
+        '@odata.nextLink' URL for the next page if there are more to retrieve.
+
+        Args:
+            url: The Graph URL for the first page
+
+        Returns:
+            A list of all items.
+        """
+        items: list[JSONDict] = []
+        current_query = url
+        while response_data := self.query(current_query):
+            if debug_enabled():
+                self.logger.debug(
+                    "Retrieved response object: {response}",
+                    response=response_data,
+                )
+            items.extend(cast("list[JSONDict]", response_data["value"]))
+            # @odata.nextLink - there is more data to retrieve
+            if "@odata.nextLink" in response_data:
+                current_query = response_data["@odata.nextLink"]
+            else:
+                break
+        return items
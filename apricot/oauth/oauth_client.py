@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import os
-from abc import ABC, abstractmethod
+import threading
+from abc import abstractmethod
 from http import HTTPStatus
 from typing import TYPE_CHECKING, Any, Self, Sequence
 
@@ -14,14 +15,18 @@ from oauthlib.oauth2 import (
     TokenExpiredError,
 )
 from requests_oauthlib import OAuth2Session
-from twisted.logger import Logger
+from typing_extensions import override
+
+from apricot.metrics import metrics
+
+from .directory_client import DirectoryClient
 
 if TYPE_CHECKING:
     from apricot.cache import UidCache
     from apricot.typedefs import JSONDict
 
 
-class OAuthClient(ABC):
+class OAuthClient(DirectoryClient):
     """Base class for OAuth client talking to a generic backend."""
 
     def __init__(  # noqa: PLR0913
@@ -49,12 +54,13 @@ class OAuthClient(ABC):
         Raises:
             RuntimeError: if the OAuth client could not be initialised
         """
+        super().__init__(uid_cache=uid_cache)
+
         # Set attributes
         self.bearer_token_: str | None = None
         self.client_secret = client_secret
-        self.logger = Logger()
+        self.token_lock = threading.Lock()
         self.token_url = token_url
-        self.uid_cache = uid_cache
         # Allow token scope to not match requested scope. (Other auth libraries allow
         # this, but Requests-OAuthlib raises exception on scope mismatch by default.)
         os.environ["OAUTHLIB_RELAX_TOKEN_SCOPE"] = "1"  # noqa: S105
@@ -99,8 +105,13 @@ class OAuthClient(ABC):
         Raises:
             RuntimeError: if a bearer token could not be retrieved
         """
-        try:
-            if not self.bearer_token_:
+        if bearer_token := self.bearer_token_:
+            return bearer_token
+        # Only one thread at a time should request a new token
+        with self.token_lock:
+            if bearer_token := self.bearer_token_:
+                return bearer_token
+            try:
                 self.logger.info(
                     "Requesting a new authentication token from the OAuth backend.",
                 )
@@ -108,41 +119,19 @@ class OAuthClient(ABC):
                     token_url=self.token_url,
                     client_secret=self.client_secret,
                 )
-                self.bearer_token_ = self.extract_token(json_response)
-        except Exception as exc:
-            msg = f"Failed to fetch bearer token from OAuth endpoint.\n{exc!s}"
-            self.logger.error(msg)  # noqa: TRY400
-            raise RuntimeError(msg) from exc
-        else:
-            return self.bearer_token_
+                self.bearer_token_ = bearer_token = self.extract_token(json_response)
+            except Exception as exc:
+                msg = f"Failed to fetch bearer token from OAuth endpoint.\n{exc!s}"
+                self.logger.error(msg)  # noqa: TRY400
+                raise RuntimeError(msg) from exc
+            else:
+                return bearer_token
 
     @staticmethod
     @abstractmethod
     def extract_token(json_response: JSONDict) -> str:
         """Extract the bearer token from an OAuth2Session JSON response."""
 
-    @abstractmethod
-    def groups(self: Self) -> list[JSONDict]:
-        """Return JSON data about groups from the OAuth backend.
-
-        This should be a list of JSON dictionaries where 'None' is used to signify
-        missing values.
-
-        Returns:
-            A list of group data in JSON format
-        """
-
-    @abstractmethod
-    def users(self: Self) -> list[JSONDict]:
-        """Return JSON data about users from the OAuth backend.
-
-        This should be a list of JSON dictionaries where 'None' is used to signify
-        missing values.
-
-        Returns:
-            A list of user data in JSON format
-        """
-
     def query(
         self: Self,
         url: str,
@@ -181,38 +170,41 @@ class OAuthClient(ABC):
         Returns:
             The JSON response from the OAuth backend.
         """
+        bearer_token = self.bearer_token
 
         def request_(*args: Any, **kwargs: Any) -> requests.Response:
-            return self.session_application.request(  # type: ignore[no-any-return]
-                method,
-                *args,
-                **kwargs,
-                headers={"Authorization": f"Bearer {self.bearer_token}"},
-            )
+            with metrics.timer(
+                "apricot_oauth_request_duration_seconds",
+                method=method,
+            ):
+                response: requests.Response = self.session_application.request(
+                    method,
+                    *args,
+                    **kwargs,
+                    headers={"Authorization": f"Bearer {bearer_token}"},
+                )
+            if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+                metrics.increment("apricot_oauth_throttled_requests_total")
+            return response
 
         try:
             result = request_(*args, **kwargs)
             result.raise_for_status()
         except (TokenExpiredError, requests.exceptions.HTTPError) as exc:
             self.logger.warn("Authentication token is invalid. {error}", error=exc)
-            self.bearer_token_ = None
+            # Discard the token unless another thread has already replaced it
+            with self.token_lock:
+                if self.bearer_token_ == bearer_token:
+                    self.bearer_token_ = None
+            bearer_token = self.bearer_token
             result = request_(*args, **kwargs)
         if result.status_code == HTTPStatus.NO_CONTENT:
             return {}
         return result.json()  # type: ignore[no-any-return]
 
+    @override
     def verify(self: Self, username: str, password: str) -> bool:
-        """Verify username and password.
-
-        This is done by attempting to authenticate against the OAuth backend.
-
-        Args:
-            username: Username
-            password: User password
-
-        Returns:
-            Whether the username and password were correct
-        """
+        # Attempt to authenticate against the OAuth backend
         try:
             self.session_interactive.fetch_token(
                 token_url=self.token_url,
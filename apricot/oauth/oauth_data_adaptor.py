@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import sys
 from typing import TYPE_CHECKING, Self
 
 from pydantic import ValidationError
 from twisted.logger import Logger
 
+from apricot.graph import MembershipGraph
+from apricot.log_level import debug_enabled
+from apricot.metrics import refresh_profiler
 from apricot.models import (
     LDAPAttributeAdaptor,
     LDAPGroupOfNames,
@@ -12,6 +16,7 @@ from apricot.models import (
     LDAPObjectClass,
     LDAPPosixAccount,
     LDAPPosixGroup,
+    OverlayIsMemberOf,
     OverlayMemberOf,
     OverlayOAuthEntry,
 )
@@ -20,19 +25,20 @@ if TYPE_CHECKING:
 
     from apricot.typedefs import JSONDict
 
-    from .oauth_client import OAuthClient
+    from .directory_client import DirectoryClient
 
 
 class OAuthDataAdaptor:
     """Adaptor for converting raw user and group data into LDAP format."""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self: Self,
         domain: str,
-        oauth_client: OAuthClient,
+        oauth_client: DirectoryClient,
         *,
         enable_mirrored_groups: bool,
         enable_primary_groups: bool,
+        enable_transitive_membership: bool = False,
         enable_user_domain_verification: bool,
     ) -> None:
         """Initialise an OAuthDataAdaptor.
@@ -42,6 +48,8 @@ class OAuthDataAdaptor:
             enable_mirrored_groups: Whether to create a mirrored LDAP group-of-groups
                 for each group-of-users
             enable_primary_groups: Whether to create an LDAP primary group for each user
+            enable_transitive_membership: Whether to add an isMemberOf attribute listing
+                every group that each user or group belongs to, including nested groups
             enable_user_domain_verification: Whether to verify users belong to the
                 correct domain
             oauth_client: An OAuth client used to construct the LDAP tree
@@ -49,43 +57,102 @@ class OAuthDataAdaptor:
         self.domain = domain
         self.enable_mirrored_groups = enable_mirrored_groups
         self.enable_primary_groups = enable_primary_groups
+        self.enable_transitive_membership = enable_transitive_membership
         self.enable_user_domain_verification = enable_user_domain_verification
         self.logger = Logger()
         self.oauth_client = oauth_client
         self.root_dn = "DC=" + domain.replace(".", ",DC=")
 
+    @staticmethod
+    def _batch_by_classes(
+        annotated_objects: list[tuple[JSONDict, list[type[LDAPObjectClass]]]],
+    ) -> list[tuple[list[JSONDict], tuple[type[LDAPObjectClass], ...]]]:
+        """Group objects that require the same LDAP classes into batches.
+
+        Args:
+            annotated_objects: a list of objects with their required LDAP classes
+
+        Returns:
+            A list of batches of objects, each with their shared required LDAP classes
+        """
+        batches: dict[tuple[type[LDAPObjectClass], ...], list[JSONDict]] = {}
+        for object_dict, required_classes in annotated_objects:
+            batches.setdefault(tuple(required_classes), []).append(object_dict)
+        return [
+            (object_dicts, required_classes)
+            for required_classes, object_dicts in batches.items()
+        ]
+
+    def _add_transitive_membership(
+        self: Self,
+        users: list[JSONDict],
+        groups: list[JSONDict],
+    ) -> None:
+        """Set isMemberOf for each user and group from the memberOf of each entry.
+
+        The closure is computed once for all entries, so nested groups are only
+        expanded once however many users belong to them.
+
+        Args:
+            users: a list of users with memberOf set
+            groups: a list of groups with memberOf set
+        """
+        graph = MembershipGraph()
+        for user_dict in users:
+            graph.add_memberships(
+                self._dn_from_user_cn(user_dict["cn"]),
+                user_dict["memberOf"],
+            )
+        for group_dict in groups:
+            graph.add_memberships(
+                self._dn_from_group_cn(group_dict["cn"]),
+                group_dict["memberOf"],
+            )
+        closure = graph.transitive_groups()
+        sorted_groups: dict[frozenset[str], list[str]] = {}
+        for user_dict in users:
+            user_groups = closure[self._dn_from_user_cn(user_dict["cn"])]
+            if (group_dns := sorted_groups.get(user_groups)) is None:
+                group_dns = sorted_groups[user_groups] = sorted(user_groups)
+            user_dict["isMemberOf"] = list(group_dns)
+        for group_dict in groups:
+            group_groups = closure[self._dn_from_group_cn(group_dict["cn"])]
+            if (group_dns := sorted_groups.get(group_groups)) is None:
+                group_dns = sorted_groups[group_groups] = sorted(group_groups)
+            group_dict["isMemberOf"] = list(group_dns)
+
     def _dn_from_group_cn(self: Self, group_cn: str) -> str:
-        return f"CN={group_cn},OU=groups,{self.root_dn}"
+        return sys.intern(f"CN={group_cn},OU=groups,{self.root_dn}")
 
     def _dn_from_user_cn(self: Self, user_cn: str) -> str:
-        return f"CN={user_cn},OU=users,{self.root_dn}"
+        return sys.intern(f"CN={user_cn},OU=users,{self.root_dn}")
 
-    def _retrieve_entries(  # noqa: C901
+    def _retrieve_entries(  # noqa: C901, PLR0912
         self: Self,
+        oauth_groups: list[JSONDict],
+        oauth_users: list[JSONDict],
     ) -> tuple[
         list[tuple[JSONDict, list[type[LDAPObjectClass]]]],
         list[tuple[JSONDict, list[type[LDAPObjectClass]]]],
     ]:
-        """Obtain lists of users and groups, and construct necessary meta-entries.
+        """Resolve memberships for users and groups, and construct meta-entries.
+
+        Args:
+            oauth_groups: a list of groups from the OAuth client
+            oauth_users: a list of users from the OAuth client
 
         Returns:
             Two lists, one for users and one for groups. Each list consists of tuples
             representing object information in JSON format, together with a list of LDAP
             object classes that should be used to validate this object.
         """
-        # Get the initial set of users and groups
-        oauth_groups = self.oauth_client.groups()
-        oauth_users = self.oauth_client.users()
-        self.logger.debug(
-            "Loaded {n_groups} groups and {n_users} users from OAuth client.",
-            n_groups=len(oauth_groups),
-            n_users=len(oauth_users),
-        )
-
-        # Ensure member is set for groups
+        # Ensure member is set for groups, including any nested subgroups
         for group_dict in oauth_groups:
             group_dict["member"] = [
                 self._dn_from_user_cn(user_cn) for user_cn in group_dict["memberUid"]
+            ] + [
+                self._dn_from_group_cn(group_cn)
+                for group_cn in group_dict.get("subgroups", [])
             ]
 
         # Add one self-titled primary group for each user
@@ -112,65 +179,73 @@ class OAuthDataAdaptor:
                 )
                 # Replace each member user with a member group
                 group_dict["member"] = [
-                    str(member).replace("OU=users", "OU=groups")
-                    for member in group["member"]
+                    self._dn_from_group_cn(user_cn) for user_cn in group["memberUid"]
                 ]
                 # Groups do not have UIDs so memberUid must be empty
                 group_dict["memberUid"] = []
                 groups_of_groups.append(group_dict)
 
-        # Ensure memberOf is set correctly for users
+        # Index the groups that each member belongs to, preserving the group order
+        all_groups = oauth_groups + user_primary_groups + groups_of_groups
+        parent_dns: dict[str, list[str]] = {}
+        for parent_dict in all_groups:
+            parent_dn = self._dn_from_group_cn(parent_dict["cn"])
+            for member_dn in dict.fromkeys(parent_dict["member"]):
+                parent_dns.setdefault(member_dn, []).append(parent_dn)
+
+        # Ensure memberOf is set correctly for users and groups
         for child_dict in oauth_users:
             child_dn = self._dn_from_user_cn(child_dict["cn"])
-            child_dict["memberOf"] = [
-                self._dn_from_group_cn(parent_dict["cn"])
-                for parent_dict in oauth_groups + user_primary_groups + groups_of_groups
-                if child_dn in parent_dict["member"]
-            ]
-            for group_name in child_dict["memberOf"]:
-                self.logger.debug(
-                    "... user '{user}' is a member of '{group_name}'",
-                    user=child_dict["cn"],
-                    group_name=group_name,
-                )
-
-        # Ensure memberOf is set correctly for groups
-        for child_dict in oauth_groups + user_primary_groups + groups_of_groups:
+            child_dict["memberOf"] = list(parent_dns.get(child_dn, []))
+        for child_dict in all_groups:
             child_dn = self._dn_from_group_cn(child_dict["cn"])
-            child_dict["memberOf"] = [
-                self._dn_from_group_cn(parent_dict["cn"])
-                for parent_dict in oauth_groups + user_primary_groups + groups_of_groups
-                if child_dn in parent_dict["member"]
-            ]
-            for group_name in child_dict["memberOf"]:
-                self.logger.debug(
-                    "... group '{group}' is a member of '{group_name}'",
-                    group=child_dict["cn"],
-                    group_name=group_name,
-                )
+            child_dict["memberOf"] = list(parent_dns.get(child_dn, []))
+
+        # Only log each membership if it will be shown
+        if debug_enabled():
+            for child_dict in oauth_users:
+                for group_name in child_dict["memberOf"]:
+                    self.logger.debug(
+                        "... user '{user}' is a member of '{group_name}'",
+                        user=child_dict["cn"],
+                        group_name=group_name,
+                    )
+            for child_dict in all_groups:
+                for group_name in child_dict["memberOf"]:
+                    self.logger.debug(
+                        "... group '{group}' is a member of '{group_name}'",
+                        group=child_dict["cn"],
+                        group_name=group_name,
+                    )
+
+        # Ensure isMemberOf is set to the transitive closure of memberOf
+        overlays: list[type[LDAPObjectClass]] = [OverlayMemberOf]
+        if self.enable_transitive_membership:
+            overlays.append(OverlayIsMemberOf)
+            self._add_transitive_membership(oauth_users, all_groups)
 
         # Annotate group and user dicts with the appropriate LDAP classes
-        annotated_groups = [
+        annotated_groups: list[tuple[JSONDict, list[type[LDAPObjectClass]]]] = [
             (
                 group,
-                [LDAPGroupOfNames, LDAPPosixGroup, OverlayMemberOf, OverlayOAuthEntry],
+                [LDAPGroupOfNames, LDAPPosixGroup, *overlays, OverlayOAuthEntry],
             )
             for group in oauth_groups
         ]
         annotated_groups += [
-            (group, [LDAPGroupOfNames, LDAPPosixGroup, OverlayMemberOf])
+            (group, [LDAPGroupOfNames, LDAPPosixGroup, *overlays])
             for group in user_primary_groups
         ]
         annotated_groups += [
-            (group, [LDAPGroupOfNames, OverlayMemberOf]) for group in groups_of_groups
+            (group, [LDAPGroupOfNames, *overlays]) for group in groups_of_groups
         ]
-        annotated_users = [
+        annotated_users: list[tuple[JSONDict, list[type[LDAPObjectClass]]]] = [
             (
                 user,
                 [
                     LDAPInetOrgPerson,
                     LDAPPosixAccount,
-                    OverlayMemberOf,
+                    *overlays,
                     OverlayOAuthEntry,
                 ],
             )
@@ -178,6 +253,20 @@ class OAuthDataAdaptor:
         ]
         return (annotated_groups, annotated_users)
 
+    def _log_validation_error(self: Self, exc: ValidationError) -> None:
+        """Log each error from a failed validation.
+
+        Args:
+            exc: the ValidationError to log
+        """
+        for error in exc.errors():
+            self.logger.warn(
+                " -> '{attribute}': {expected} but '{actual}' was provided.",
+                attribute=error["loc"][0],
+                expected=error["msg"],
+                actual=error["input"],
+            )
+
     def _validate_groups(
         self: Self,
         annotated_groups: list[tuple[JSONDict, list[type[LDAPObjectClass]]]],
@@ -195,27 +284,23 @@ class OAuthDataAdaptor:
             n_groups=len(annotated_groups),
         )
         output = []
-        for group_dict, required_classes in annotated_groups:
-            try:
-                output.append(
-                    LDAPAttributeAdaptor.from_attributes(
-                        group_dict,
-                        required_classes=required_classes,
-                    ),
-                )
-            except ValidationError as exc:  # noqa: PERF203
-                self.logger.warn(
-                    "... group '{group_name}' failed validation.",
-                    group_name=group_dict.get("cn", "unknown"),
-                )
-                for error in exc.errors():
+        for group_dicts, required_classes in self._batch_by_classes(annotated_groups):
+            for group_dict, group in zip(
+                group_dicts,
+                LDAPAttributeAdaptor.from_attributes_batch(
+                    group_dicts,
+                    required_classes=required_classes,
+                ),
+                strict=True,
+            ):
+                if isinstance(group, ValidationError):
                     self.logger.warn(
-                        " -> '{attribute}': {expected} but '{actual}' was provided.",
-                        attribute=error["loc"][0],
-                        expected=error["msg"],
-                        actual=error["input"],
+                        "... group '{group_name}' failed validation.",
+                        group_name=group_dict.get("cn", "unknown"),
                     )
-
+                    self._log_validation_error(group)
+                else:
+                    output.append(group)
         return output
 
     def _validate_users(
@@ -234,43 +319,44 @@ class OAuthDataAdaptor:
             "Attempting to validate {n_users} users.",
             n_users=len(annotated_users),
         )
-        output = []
+        # Verify user domain if enabled
+        verified_users = []
         for user_dict, required_classes in annotated_users:
-            try:
-                # Verify user domain if enabled
-                if (
-                    self.enable_user_domain_verification
-                    and (user_domain := user_dict.get("domain", None)) != self.domain
-                ):
-                    self.logger.warn(
-                        "... user '{user_name}' failed validation.",
-                        user_name=user_dict.get("cn", "unknown"),
-                    )
-                    self.logger.warn(
-                        " -> 'domain': expected '{expected_domain}' but '{actual_domain}' was provided.",  # noqa: E501
-                        expected_domain=self.domain,
-                        actual_domain=user_domain,
-                    )
-                    continue
-                # Construct an LDAPAttributeAdaptor from the user attributes
-                output.append(
-                    LDAPAttributeAdaptor.from_attributes(
-                        user_dict,
-                        required_classes=required_classes,
-                    ),
-                )
-            except ValidationError as exc:
+            if (
+                self.enable_user_domain_verification
+                and (user_domain := user_dict.get("domain", None)) != self.domain
+            ):
                 self.logger.warn(
                     "... user '{user_name}' failed validation.",
                     user_name=user_dict.get("cn", "unknown"),
                 )
-                for error in exc.errors():
+                self.logger.warn(
+                    " -> 'domain': expected '{expected_domain}' but '{actual_domain}' was provided.",  # noqa: E501
+                    expected_domain=self.domain,
+                    actual_domain=user_domain,
+                )
+                continue
+            verified_users.append((user_dict, required_classes))
+
+        # Construct an LDAPAttributeAdaptor from the user attributes
+        output = []
+        for user_dicts, user_classes in self._batch_by_classes(verified_users):
+            for user_dict, user in zip(
+                user_dicts,
+                LDAPAttributeAdaptor.from_attributes_batch(
+                    user_dicts,
+                    required_classes=user_classes,
+                ),
+                strict=True,
+            ):
+                if isinstance(user, ValidationError):
                     self.logger.warn(
-                        " -> '{attribute}': {expected} but '{actual}' was provided.",
-                        attribute=error["loc"][0],
-                        expected=error["msg"],
-                        actual=error["input"],
+                        "... user '{user_name}' failed validation.",
+                        user_name=user_dict.get("cn", "unknown"),
                     )
+                    self._log_validation_error(user)
+                else:
+                    output.append(user)
         return output
 
     def retrieve_all(
@@ -281,9 +367,27 @@ class OAuthDataAdaptor:
         Returns:
             A tuple of groups and users
         """
-        annotated_groups, annotated_users = self._retrieve_entries()
-        validated_groups = self._validate_groups(annotated_groups)
-        validated_users = self._validate_users(annotated_users)
+        # Get the initial set of users and groups
+        with refresh_profiler.phase("fetch_groups"):
+            oauth_groups = self.oauth_client.groups()
+        with refresh_profiler.phase("fetch_users"):
+            oauth_users = self.oauth_client.users()
+        self.logger.debug(
+            "Loaded {n_groups} groups and {n_users} users from OAuth client.",
+            n_groups=len(oauth_groups),
+            n_users=len(oauth_users),
+        )
+
+        # Resolve memberships and validate the results
+        with refresh_profiler.phase("resolve_memberships"):
+            annotated_groups, annotated_users = self._retrieve_entries(
+                oauth_groups,
+                oauth_users,
+            )
+        with refresh_profiler.phase("validate_groups"):
+            validated_groups = self._validate_groups(annotated_groups)
+        with refresh_profiler.phase("validate_users"):
+            validated_users = self._validate_users(annotated_users)
         self.logger.debug(
             "Validated {n_groups} groups and {n_users} users.",
             n_groups=len(validated_groups),
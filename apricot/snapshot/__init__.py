@@ -0,0 +1,11 @@
+from .directory_snapshot import DirectorySnapshot
+from .file_snapshot_store import FileSnapshotStore
+from .redis_snapshot_store import RedisSnapshotStore
+from .snapshot_store import SnapshotStore
+
+__all__ = [
+    "DirectorySnapshot",
+    "FileSnapshotStore",
+    "RedisSnapshotStore",
+    "SnapshotStore",
+]
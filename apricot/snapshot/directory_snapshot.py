@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Self
+
+from apricot.models import LDAPAttributeAdaptor
+
+
+class DirectorySnapshot:
+    """A validated set of users and groups that can be used to build an LDAP tree."""
+
+    version = 1
+
+    def __init__(
+        self: Self,
+        root_dn: str,
+        groups: list[LDAPAttributeAdaptor],
+        users: list[LDAPAttributeAdaptor],
+        created_at: float | None = None,
+    ) -> None:
+        """Initialise a DirectorySnapshot.
+
+        Args:
+            root_dn: Distinguished name of the root of the LDAP tree
+            groups: Validated LDAP attributes for each group
+            users: Validated LDAP attributes for each user
+            created_at: Unix time at which the data was retrieved (defaults to now)
+        """
+        self.created_at = time.time() if created_at is None else created_at
+        self.groups = groups
+        self.root_dn = root_dn
+        self.users = users
+
+    @property
+    def age(self: Self) -> float:
+        """Time in seconds since this snapshot was retrieved."""
+        return time.time() - self.created_at
+
+    @classmethod
+    def from_bytes(cls: type[Self], data: bytes) -> Self:
+        """Construct a DirectorySnapshot from its serialised form.
+
+        Args:
+            data: Serialised snapshot as produced by `to_bytes`
+
+        Returns:
+            The deserialised DirectorySnapshot
+
+        Raises:
+            ValueError: if the data is not a valid snapshot
+        """
+        try:
+            content = json.loads(data)
+            version = content["version"]
+        except (KeyError, TypeError, json.JSONDecodeError) as exc:
+            msg = f"Could not parse directory snapshot.\n{exc!s}"
+            raise ValueError(msg) from exc
+        if version != cls.version:
+            msg = f"Unsupported directory snapshot version {version}."
+            raise ValueError(msg)
+        try:
+            return cls(
+                root_dn=content["root_dn"],
+                groups=[LDAPAttributeAdaptor(attrs) for attrs in content["groups"]],
+                users=[LDAPAttributeAdaptor(attrs) for attrs in content["users"]],
+                created_at=float(content["created_at"]),
+            )
+        except (AttributeError, KeyError, TypeError) as exc:
+            msg = f"Could not parse directory snapshot.\n{exc!s}"
+            raise ValueError(msg) from exc
+
+    def to_bytes(self: Self) -> bytes:
+        """Serialise this DirectorySnapshot.
+
+        Returns:
+            The snapshot encoded as UTF-8 JSON.
+        """
+        return json.dumps(
+            {
+                "version": self.version,
+                "created_at": self.created_at,
+                "root_dn": self.root_dn,
+                "groups": [group.to_dict() for group in self.groups],
+                "users": [user.to_dict() for user in self.users],
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import tempfile
+from typing import Self
+
+from twisted.logger import Logger
+from typing_extensions import override
+
+from .directory_snapshot import DirectorySnapshot
+from .snapshot_store import SnapshotStore
+
+
+class FileSnapshotStore(SnapshotStore):
+    """Implementation of SnapshotStore using a file on local disk."""
+
+    def __init__(self: Self, snapshot_path: str) -> None:
+        """Initialise a FileSnapshotStore.
+
+        Args:
+            snapshot_path: Path to the snapshot file
+        """
+        self.logger = Logger()
+        self.path = pathlib.Path(snapshot_path)
+
+    @override
+    def load(self: Self) -> DirectorySnapshot | None:
+        try:
+            return DirectorySnapshot.from_bytes(self.path.read_bytes())
+        except FileNotFoundError:
+            self.logger.info(
+                "No directory snapshot found at '{path}'.",
+                path=str(self.path),
+            )
+        except (OSError, ValueError) as exc:
+            self.logger.warn(
+                "Ignoring unreadable directory snapshot at '{path}'. {error}",
+                path=str(self.path),
+                error=str(exc),
+            )
+        return None
+
+    @override
+    def save(self: Self, snapshot: DirectorySnapshot) -> None:
+        # Write to a temporary file and rename it so that readers never see a
+        # partially-written snapshot
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name)
+        try:
+            with os.fdopen(fd, "wb") as f_snapshot:
+                f_snapshot.write(snapshot.to_bytes())
+            pathlib.Path(tmp_path).replace(self.path)
+        except OSError:
+            pathlib.Path(tmp_path).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import uuid
+import zlib
+from typing import TYPE_CHECKING, Any, Callable, Self
+
+import redis
+from twisted.logger import Logger
+from typing_extensions import override
+
+from .directory_snapshot import DirectorySnapshot
+from .snapshot_store import SnapshotStore
+
+if TYPE_CHECKING:
+    from redis.client import PubSubWorkerThread
+
+# Take the lock if it is free or extend it if we already hold it
+ACQUIRE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class RedisSnapshotStore(SnapshotStore):
+    """Implementation of SnapshotStore that shares snapshots between replicas.
+
+    One replica at a time holds a leadership lock and is responsible for refreshing
+    from the OAuth backend. It publishes a compressed snapshot after each refresh and
+    notifies the other replicas, which load it instead of querying the backend.
+    """
+
+    def __init__(self: Self, redis_host: str, redis_port: int, namespace: str) -> None:
+        """Initialise a RedisSnapshotStore.
+
+        Args:
+            redis_host: Host for the Redis server
+            redis_port: Port for the Redis server
+            namespace: Prefix for Redis keys, allowing several directories to share
+                one Redis server
+        """
+        self.channel = f"{namespace}-snapshot-published"
+        self.client_: redis.Redis[bytes] | None = None
+        self.key_generation = f"{namespace}-snapshot-generation"
+        self.key_lock = f"{namespace}-refresh-lock"
+        self.key_snapshot = f"{namespace}-snapshot"
+        self.logger = Logger()
+        self.pubsub_thread: PubSubWorkerThread | None = None
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.token = uuid.uuid4().hex
+
+    @property
+    def client(self: Self) -> redis.Redis[bytes]:
+        """Lazy-load the Redis client on request.
+
+        Returns:
+            The Redis client.
+        """
+        if not self.client_:
+            self.client_ = redis.Redis(host=self.redis_host, port=self.redis_port)
+        return self.client_
+
+    def acquire_leadership(self: Self, ttl: int) -> bool:
+        """Attempt to become (or remain) the replica responsible for refreshing.
+
+        Args:
+            ttl: Time in seconds after which leadership lapses unless renewed
+
+        Returns:
+            Whether this replica is now the leader.
+        """
+        try:
+            acquire_lock = self.client.register_script(ACQUIRE_LOCK_SCRIPT)
+            return bool(
+                acquire_lock(keys=[self.key_lock], args=[self.token, ttl * 1000]),
+            )
+        except redis.RedisError as exc:
+            # Refreshing from every replica is better than refreshing from none
+            self.logger.warn(
+                "Could not reach Redis to elect a refresh leader. {error}",
+                error=str(exc),
+            )
+            return True
+
+    def generation(self: Self) -> float | None:
+        """Creation time of the most recently published snapshot.
+
+        Returns:
+            The Unix time at which the published snapshot was created, or None if no
+            snapshot has been published.
+        """
+        try:
+            value = self.client.get(self.key_generation)
+        except redis.RedisError as exc:
+            self.logger.warn(
+                "Could not read shared directory snapshot generation. {error}",
+                error=str(exc),
+            )
+            return None
+        return None if value is None else float(value)
+
+    @override
+    def load(self: Self) -> DirectorySnapshot | None:
+        try:
+            data = self.client.get(self.key_snapshot)
+            if data is None:
+                return None
+            return DirectorySnapshot.from_bytes(zlib.decompress(data))
+        except (ValueError, redis.RedisError, zlib.error) as exc:
+            self.logger.warn(
+                "Ignoring unreadable shared directory snapshot. {error}",
+                error=str(exc),
+            )
+        return None
+
+    @override
+    def save(self: Self, snapshot: DirectorySnapshot) -> None:
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.set(self.key_snapshot, zlib.compress(snapshot.to_bytes()))
+            pipeline.set(self.key_generation, repr(snapshot.created_at))
+            pipeline.publish(self.channel, repr(snapshot.created_at))
+            pipeline.execute()
+        except redis.RedisError as exc:
+            msg = f"Could not publish shared directory snapshot.\n{exc!s}"
+            raise OSError(msg) from exc
+
+    def subscribe(self: Self, callback: Callable[[], Any]) -> None:
+        """Call a function in a background thread whenever a snapshot is published.
+
+        Args:
+            callback: Function to call after each new snapshot is published
+        """
+
+        def handler(message: dict[str, Any]) -> None:
+            id(message)  # ignore unused arguments
+            try:
+                callback()
+            except Exception as exc:  # noqa: BLE001
+                self.logger.error(  # noqa: TRY400
+                    "Failed to load shared directory snapshot. {error}",
+                    error=str(exc),
+                )
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: handler})
+        self.pubsub_thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
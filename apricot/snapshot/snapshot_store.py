@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Self
+
+if TYPE_CHECKING:
+    from .directory_snapshot import DirectorySnapshot
+
+
+class SnapshotStore(ABC):
+    """Abstract store for persisting directory snapshots."""
+
+    @abstractmethod
+    def load(self: Self) -> DirectorySnapshot | None:
+        """Load the most recently saved snapshot.
+
+        Returns:
+            The saved DirectorySnapshot or None if there is no usable snapshot.
+        """
+
+    @abstractmethod
+    def save(self: Self, snapshot: DirectorySnapshot) -> None:
+        """Save a snapshot, replacing any existing one.
+
+        Args:
+            snapshot: The DirectorySnapshot to save
+
+        Raises:
+            OSError: if the snapshot could not be saved
+        """
@@ -0,0 +1,658 @@
+"""Generate LDAP load like that from nslcd and sssd and report latency percentiles.
+
+Many concurrent connections each send one request at a time, chosen from a weighted
+mix of the lookups made by NSS clients:
+
+- getpwnam: find a user by name
+- getgrnam: find a group by name
+- initgroups: find the groups that a user belongs to
+- enumeration: list every user
+- bind: bind as the configured DN, or anonymously
+
+The names used are discovered from the server before the load starts, and a fraction
+of lookups can be made for names that do not exist. Throughput and p50/p95/p99
+latency are reported for each operation. Results can be saved as a JSON baseline and
+later runs compared against it, failing if any operation has regressed.
+
+Usage: python -m benchmarks.ldap_load --domain example.com --connections 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import random
+import statistics
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, ClassVar, Self
+
+from ldaptor import ldapfilter
+from ldaptor.protocols import pureber, pureldap
+from ldaptor.protocols.ldap.ldapclient import LDAPClient
+from twisted.internet import defer, endpoints, protocol, task
+
+from apricot.ldap.oauth_ldap_filter_compiler import OAuthLDAPFilterCompiler
+
+if TYPE_CHECKING:
+    from twisted.internet.interfaces import IReactorTCP
+    from twisted.python.failure import Failure
+
+
+class LDAPQueryMix:
+    """A weighted mix of the LDAP requests made by NSS clients."""
+
+    default_weights: ClassVar[dict[str, float]] = {
+        "bind": 5,
+        "enumeration": 1,
+        "getgrnam": 20,
+        "getpwnam": 44,
+        "initgroups": 30,
+    }
+    group_attributes: ClassVar[list[str]] = [
+        "cn",
+        "gidNumber",
+        "member",
+        "memberUid",
+        "userPassword",
+    ]
+    user_attributes: ClassVar[list[str]] = [
+        "cn",
+        "description",
+        "gecos",
+        "gidNumber",
+        "homeDirectory",
+        "loginShell",
+        "objectClass",
+        "uid",
+        "uidNumber",
+        "userPassword",
+    ]
+
+    def __init__(  # noqa: PLR0913
+        self: Self,
+        root_dn: str,
+        users: list[str],
+        groups: list[str],
+        *,
+        bind_dn: str = "",
+        bind_password: str = "",
+        miss_rate: float = 0,
+        seed: int = 0,
+        weights: dict[str, float] | None = None,
+    ) -> None:
+        """Initialise an LDAPQueryMix.
+
+        Args:
+            root_dn: Distinguished name of the root of the LDAP tree
+            users: Names of the users to look up
+            groups: Names of the groups to look up
+            bind_dn: Distinguished name to bind as, or empty to bind anonymously
+            bind_password: Password to bind with
+            miss_rate: Fraction of lookups made for names that do not exist
+            seed: Seed for the random number generator
+            weights: Relative frequency of each operation
+
+        Raises:
+            ValueError: if an operation is unknown or there are no names to look up
+        """
+        weights = weights or self.default_weights
+        if unknown := set(weights) - set(self.default_weights):
+            msg = f"Unknown operations {', '.join(sorted(unknown))}."
+            raise ValueError(msg)
+        if not (users and groups):
+            msg = "There must be at least one user and one group to look up."
+            raise ValueError(msg)
+        self.bind_dn = bind_dn
+        self.bind_password = bind_password
+        self.encoded: dict[tuple[str, str], bytes] = {}
+        self.groups = groups
+        self.miss_rate = miss_rate
+        self.operations = list(weights)
+        self.rng = random.Random(seed)  # noqa: S311
+        self.root_dn = root_dn
+        self.users = users
+        self.weights = list(weights.values())
+
+    def choose(self: Self) -> tuple[str, bytes]:
+        """Choose the next request to send.
+
+        Returns:
+            The name of the operation and the BER encoding of its request.
+        """
+        operation = self.rng.choices(self.operations, weights=self.weights)[0]
+        if self.rng.random() < self.miss_rate:
+            name = f"missing{self.rng.randrange(1_000_000)}"
+        else:
+            names = self.groups if operation == "getgrnam" else self.users
+            name = self.rng.choice(names)
+        # Requests are encoded once, as each is sent many times
+        key = (operation, "" if operation in {"bind", "enumeration"} else name)
+        if key not in self.encoded:
+            self.encoded[key] = self.request(operation, name).toWire()
+        return operation, self.encoded[key]
+
+    def request(self: Self, operation: str, name: str) -> pureldap.LDAPProtocolRequest:
+        """Construct the request that an NSS client sends for an operation.
+
+        Args:
+            operation: Name of the operation
+            name: Name of the user or group to look up
+
+        Returns:
+            The LDAP request.
+        """
+        if operation == "bind":
+            return pureldap.LDAPBindRequest(dn=self.bind_dn, auth=self.bind_password)
+        if operation == "enumeration":
+            return self.search(
+                "users",
+                "(objectClass=posixAccount)",
+                self.user_attributes,
+            )
+        if operation == "getgrnam":
+            return self.search(
+                "groups",
+                f"(&(objectClass=posixGroup)(cn={name}))",
+                self.group_attributes,
+            )
+        if operation == "initgroups":
+            return self.search(
+                "groups",
+                f"(&(objectClass=posixGroup)(|(memberUid={name})"
+                f"(member=CN={name},OU=users,{self.root_dn})))",
+                ["gidNumber"],
+            )
+        return self.search(
+            "users",
+            f"(&(objectClass=posixAccount)(uid={name}))",
+            self.user_attributes,
+        )
+
+    def search(
+        self: Self,
+        organisational_unit: str,
+        filter_text: str,
+        attributes: list[str],
+    ) -> pureldap.LDAPSearchRequest:
+        """Construct a subtree search request.
+
+        Args:
+            organisational_unit: Name of the OU to search
+            filter_text: LDAP filter
+            attributes: Attributes to return
+
+        Returns:
+            The LDAP search request.
+        """
+        return pureldap.LDAPSearchRequest(
+            baseObject=f"OU={organisational_unit},{self.root_dn}",
+            scope=pureldap.LDAP_SCOPE_wholeSubtree,
+            filter=ldapfilter.parseFilter(filter_text),
+            attributes=attributes,
+        )
+
+
+class LDAPLoadResults:
+    """Latencies and result codes of the requests sent by a load test."""
+
+    percentiles: ClassVar[tuple[int, ...]] = (50, 95, 99)
+
+    def __init__(self: Self) -> None:
+        """Initialise LDAPLoadResults."""
+        self.failures: Counter[str] = Counter()
+        self.latencies: dict[str, list[float]] = {}
+        self.started_at = time.perf_counter()
+        self.finished_at = 0.0
+
+    def record(self: Self, operation: str, latency: float, result_code: int) -> None:
+        """Record the result of one request.
+
+        Args:
+            operation: Name of the operation
+            latency: Time in seconds between sending the request and its final response
+            result_code: LDAP result code of the final response
+        """
+        self.latencies.setdefault(operation, []).append(latency)
+        if result_code:
+            self.failures[operation] += 1
+
+    def summarise(self: Self, latencies: list[float], failures: int) -> dict[str, Any]:
+        """Summarise the requests for one operation or for all of them.
+
+        Args:
+            latencies: Latency of each request in seconds
+            failures: Number of requests that did not succeed
+
+        Returns:
+            The number of requests, failures, throughput and latency percentiles.
+        """
+        duration = (self.finished_at or time.perf_counter()) - self.started_at
+        output: dict[str, Any] = {
+            "failures": failures,
+            "requests": len(latencies),
+            "throughput": round(len(latencies) / duration, 2),
+        }
+        if len(latencies) > 1:
+            cut_points = statistics.quantiles(latencies, n=100, method="inclusive")
+            for percentile in self.percentiles:
+                output[f"p{percentile}_ms"] = round(
+                    cut_points[percentile - 1] * 1000,
+                    3,
+                )
+        return output
+
+    def to_dict(self: Self) -> dict[str, Any]:
+        """Summarise the load test.
+
+        Returns:
+            A summary of all requests together with one for each operation.
+        """
+        return {
+            "operations": {
+                operation: self.summarise(latencies, self.failures[operation])
+                for operation, latencies in sorted(self.latencies.items())
+            },
+            "total": self.summarise(
+                [
+                    latency
+                    for latencies in self.latencies.values()
+                    for latency in latencies
+                ],
+                sum(self.failures.values()),
+            ),
+        }
+
+    @staticmethod
+    def regressions(
+        current: dict[str, Any],
+        baseline: dict[str, Any],
+        tolerance: float,
+    ) -> list[str]:
+        """Compare a load test with a baseline.
+
+        Args:
+            current: Summary of this load test
+            baseline: Summary of the baseline load test
+            tolerance: Fractional change from the baseline that is allowed
+
+        Returns:
+            A description of each latency percentile that is slower, and each
+            throughput that is lower, than the baseline by more than the tolerance.
+        """
+        output = []
+        sections = {"total": baseline.get("total", {})} | {
+            f"operations.{operation}": summary
+            for operation, summary in baseline.get("operations", {}).items()
+        }
+        for section, expected in sections.items():
+            actual = current
+            for key in section.split("."):
+                actual = actual.get(key, {})
+            for metric, expected_value in expected.items():
+                if not (actual_value := actual.get(metric)) or not expected_value:
+                    continue
+                if metric.endswith("_ms"):
+                    regressed = actual_value > expected_value * (1 + tolerance)
+                elif metric == "throughput":
+                    regressed = actual_value < expected_value * (1 - tolerance)
+                else:
+                    continue
+                if regressed:
+                    output.append(
+                        f"{section} {metric}: {actual_value} "
+                        f"(baseline {expected_value})",
+                    )
+        return output
+
+
+class LDAPLoadProtocol(LDAPClient):
+    """An LDAP client that sends one request at a time until the load test ends.
+
+    Responses are only decoded far enough to find the end of each request, so that
+    the load generator spends as little time as possible on each response.
+    """
+
+    final_tags: ClassVar[set[int]] = {
+        pureber.STRUCTURED | pureldap.LDAPBindResponse.tag,
+        pureber.STRUCTURED | pureldap.LDAPSearchResultDone.tag,
+    }
+
+    def __init__(
+        self: Self,
+        mix: LDAPQueryMix,
+        results: LDAPLoadResults,
+        deadline: float,
+    ) -> None:
+        """Initialise an LDAPLoadProtocol.
+
+        Args:
+            mix: Mix of requests to send
+            results: Where to record the result of each request
+            deadline: Time after which no more requests are sent
+        """
+        super().__init__()
+        self.buffer: bytes = b""
+        self.deadline = deadline
+        self.finished: defer.Deferred[None] = defer.Deferred()
+        self.message_id = 0
+        self.mix = mix
+        self.operation = ""
+        self.results = results
+        self.sent_at = 0.0
+
+    def connectionMade(self: Self) -> None:  # noqa: N802
+        """Send the first request."""
+        super().connectionMade()
+        self.send_next()
+
+    def connectionLost(  # noqa: N802
+        self: Self,
+        reason: Failure = protocol.connectionDone,
+    ) -> None:
+        """Finish when the connection closes.
+
+        Args:
+            reason: Why the connection was closed
+        """
+        super().connectionLost(reason)
+        if not self.finished.called:
+            self.finished.callback(None)
+
+    def dataReceived(self: Self, data: bytes) -> None:  # noqa: N802
+        """Record the result of a request when its final response is received.
+
+        Args:
+            data: Bytes received from the server
+        """
+        self.buffer += data
+        while message := self.next_message():
+            tag, result_code = message
+            if tag in self.final_tags:
+                self.results.record(
+                    self.operation,
+                    time.perf_counter() - self.sent_at,
+                    result_code,
+                )
+                self.send_next()
+
+    def next_message(self: Self) -> tuple[int, int] | None:
+        """Remove the next complete LDAP message from the buffer.
+
+        Returns:
+            The tag of the message's operation and, for responses that have one, its
+            result code, or None if no complete message has been received.
+        """
+        try:
+            length, offset = self.read_length(self.buffer, 1)
+        except IndexError:
+            return None
+        if len(self.buffer) < offset + length:
+            return None
+        message = self.buffer[offset : offset + length]
+        self.buffer = self.buffer[offset + length :]
+        # Skip the message ID to find the operation
+        id_length, id_offset = self.read_length(message, 1)
+        tag = message[id_offset + id_length]
+        _, op_offset = self.read_length(message, id_offset + id_length + 1)
+        # The result code is an enumerated value at the start of each result
+        result_code = message[op_offset + 2] if tag in self.final_tags else 0
+        return tag, result_code
+
+    @staticmethod
+    def read_length(data: bytes, offset: int) -> tuple[int, int]:
+        """Read the length of a BER value.
+
+        Args:
+            data: BER encoded data
+            offset: Position of the first byte of the length
+
+        Returns:
+            The length of the value and the position of its first byte.
+
+        Raises:
+            IndexError: if the length has not been received in full
+        """
+        if data[offset] < 0x80:  # noqa: PLR2004
+            return data[offset], offset + 1
+        n_bytes = data[offset] & 0x7F
+        if len(data) < offset + 1 + n_bytes:
+            raise IndexError
+        return (
+            int.from_bytes(data[offset + 1 : offset + 1 + n_bytes]),
+            offset + 1 + n_bytes,
+        )
+
+    def send_next(self: Self) -> None:
+        """Send the next request, or close the connection if the test has ended."""
+        if time.perf_counter() >= self.deadline:
+            self.transport.loseConnection()
+            return
+        self.message_id += 1
+        self.operation, request = self.mix.choose()
+        content = pureber.BERInteger(self.message_id).toWire() + request
+        self.sent_at = time.perf_counter()
+        self.transport.write(
+            b"\x30" + pureber.int2berlen(len(content)) + content,
+        )
+
+
+async def discover_names(
+    endpoint: endpoints.TCP4ClientEndpoint,
+    root_dn: str,
+) -> tuple[list[str], list[str]]:
+    """Find the names of the users and groups served by an LDAP server.
+
+    Args:
+        endpoint: Endpoint of the LDAP server
+        root_dn: Distinguished name of the root of the LDAP tree
+
+    Returns:
+        The names of every user and every group.
+    """
+    client = await endpoints.connectProtocol(  # type: ignore[no-untyped-call]
+        endpoint,
+        LDAPClient(),
+    )
+    output: list[list[str]] = []
+    for organisational_unit, attribute in (("users", "uid"), ("groups", "cn")):
+        names: list[str] = []
+        finished: defer.Deferred[None] = defer.Deferred()
+
+        def collect(
+            response: pureldap.LDAPProtocolResponse,
+            names: list[str] = names,
+            attribute: str = attribute,
+            finished: defer.Deferred[None] = finished,
+        ) -> bool:
+            if not isinstance(response, pureldap.LDAPSearchResultEntry):
+                finished.callback(None)
+                return True
+            for key, values in response.attributes:
+                if OAuthLDAPFilterCompiler.decode(key).lower() == attribute.lower():
+                    names.extend(map(OAuthLDAPFilterCompiler.decode, values))
+            return False
+
+        client.send_multiResponse(
+            pureldap.LDAPSearchRequest(
+                baseObject=f"OU={organisational_unit},{root_dn}",
+                scope=pureldap.LDAP_SCOPE_singleLevel,
+                filter=pureldap.LDAPFilter_present(attribute),
+                attributes=[attribute],
+            ),
+            collect,
+        )
+        await finished
+        output.append(names)
+    client.unbind()
+    return output[0], output[1]
+
+
+async def run_load(
+    reactor: IReactorTCP,
+    args: argparse.Namespace,
+) -> dict[str, Any]:
+    """Run a load test against an LDAP server.
+
+    Args:
+        reactor: The Twisted reactor
+        args: Command line arguments
+
+    Returns:
+        A summary of the load test.
+    """
+    root_dn = "DC=" + args.domain.replace(".", ",DC=")
+    endpoint = endpoints.TCP4ClientEndpoint(  # type: ignore[no-untyped-call]
+        reactor,
+        args.host,
+        args.port,
+    )
+    users, groups = await discover_names(endpoint, root_dn)
+    mix = LDAPQueryMix(
+        root_dn,
+        users,
+        groups,
+        bind_dn=args.bind_dn,
+        bind_password=args.bind_password,
+        miss_rate=args.miss_rate,
+        seed=args.seed,
+        weights=(
+            {
+                operation: float(weight)
+                for operation, weight in (
+                    item.split("=") for item in args.mix.split(",")
+                )
+            }
+            if args.mix
+            else None
+        ),
+    )
+    results = LDAPLoadResults()
+    deadline = time.perf_counter() + args.duration
+    connections = [
+        LDAPLoadProtocol(mix, results, deadline) for _ in range(args.connections)
+    ]
+    for connection in connections:
+        await endpoints.connectProtocol(  # type: ignore[no-untyped-call]
+            endpoint,
+            connection,
+        )
+    await defer.gatherResults([connection.finished for connection in connections])
+    results.finished_at = time.perf_counter()
+
+    return {
+        "connections": args.connections,
+        "duration": args.duration,
+        "n_groups": len(groups),
+        "n_users": len(users),
+        **results.to_dict(),
+    }
+
+
+def report(summary: dict[str, Any], args: argparse.Namespace) -> None:
+    """Print the results of a load test and compare them with a baseline.
+
+    Args:
+        summary: Summary of the load test
+        args: Command line arguments
+
+    Raises:
+        SystemExit: if the results have regressed from the baseline
+    """
+    print(json.dumps(summary, indent=2, sort_keys=True))  # noqa: T201
+    if args.save_baseline:
+        pathlib.Path(args.save_baseline).write_text(
+            json.dumps(summary, indent=2, sort_keys=True) + "\n",
+            encoding="utf-8",
+        )
+    if args.baseline:
+        baseline = json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8"))
+        if regressions := LDAPLoadResults.regressions(
+            summary,
+            baseline,
+            args.tolerance,
+        ):
+            print("Regressions from the baseline:")  # noqa: T201
+            for regression in regressions:
+                print(f"  {regression}")  # noqa: T201
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate LDAP load and report latency percentiles.",
+    )
+    parser.add_argument("--host", type=str, default="localhost", help="LDAP host.")
+    parser.add_argument("--port", type=int, default=1389, help="LDAP port.")
+    parser.add_argument(
+        "--domain",
+        type=str,
+        required=True,
+        help="Domain served by the LDAP server.",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=20,
+        help="Number of concurrent connections.",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=30,
+        help="Time in seconds for which to send requests.",
+    )
+    parser.add_argument(
+        "--mix",
+        type=str,
+        default=None,
+        help=(
+            "Relative frequency of each operation, for example "
+            "'getpwnam=40,getgrnam=20,initgroups=30,enumeration=1,bind=5'."
+        ),
+    )
+    parser.add_argument(
+        "--miss-rate",
+        type=float,
+        default=0,
+        help="Fraction of lookups made for names that do not exist.",
+    )
+    parser.add_argument(
+        "--bind-dn",
+        type=str,
+        default="",
+        help="Distinguished name to bind as (default: bind anonymously).",
+    )
+    parser.add_argument(
+        "--bind-password",
+        type=str,
+        default="",
+        help="Password to bind with.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--save-baseline",
+        type=str,
+        default=None,
+        help="Save the results as a JSON baseline to this file.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare the results with a JSON baseline from this file.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Fractional regression from the baseline that is allowed.",
+    )
+    args = parser.parse_args()
+    task.react(
+        lambda reactor: defer.ensureDeferred(run_load(reactor, args)).addCallback(
+            report,
+            args,
+        ),
+    )
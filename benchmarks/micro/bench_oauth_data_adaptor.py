@@ -0,0 +1,88 @@
+"""Micro-benchmarks for resolving and validating users and groups."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from apricot.models import LDAPAttributeAdaptor
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from apricot.oauth import OAuthDataAdaptor
+
+
+def bench_retrieve_entries(
+    adaptor: OAuthDataAdaptor,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Resolve memberships and construct the primary and mirrored groups."""
+    oauth_groups = adaptor.oauth_client.groups()
+    oauth_users = adaptor.oauth_client.users()
+    _, annotated_users = measure(
+        adaptor._retrieve_entries,  # noqa: SLF001
+        oauth_groups,
+        oauth_users,
+        items=size,
+    )
+    assert len(annotated_users) == size  # noqa: S101
+
+
+def bench_validate_groups(
+    adaptor: OAuthDataAdaptor,
+    measure: Callable[..., Any],
+) -> None:
+    """Validate every group, including the primary and mirrored groups."""
+    annotated_groups, _ = adaptor._retrieve_entries(  # noqa: SLF001
+        adaptor.oauth_client.groups(),
+        adaptor.oauth_client.users(),
+    )
+    groups = measure(
+        adaptor._validate_groups,  # noqa: SLF001
+        annotated_groups,
+        items=len(annotated_groups),
+    )
+    assert len(groups) == len(annotated_groups)  # noqa: S101
+
+
+def bench_validate_users(
+    adaptor: OAuthDataAdaptor,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Verify the domain of every user and validate them."""
+    _, annotated_users = adaptor._retrieve_entries(  # noqa: SLF001
+        adaptor.oauth_client.groups(),
+        adaptor.oauth_client.users(),
+    )
+    users = measure(
+        adaptor._validate_users,  # noqa: SLF001
+        annotated_users,
+        items=size,
+    )
+    assert len(users) == size  # noqa: S101
+
+
+def bench_from_attributes(
+    adaptor: OAuthDataAdaptor,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Validate users one at a time rather than in batches."""
+    _, annotated_users = adaptor._retrieve_entries(  # noqa: SLF001
+        adaptor.oauth_client.groups(),
+        adaptor.oauth_client.users(),
+    )
+
+    def from_attributes() -> list[LDAPAttributeAdaptor]:
+        return [
+            LDAPAttributeAdaptor.from_attributes(
+                user_dict,
+                required_classes=required_classes,
+            )
+            for user_dict, required_classes in annotated_users
+        ]
+
+    users = measure(from_attributes, items=size)
+    assert len(users) == size  # noqa: S101
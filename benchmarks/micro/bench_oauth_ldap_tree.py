@@ -0,0 +1,33 @@
+"""Micro-benchmarks for refreshing the whole LDAP tree."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from apricot.ldap.oauth_ldap_tree import OAuthLDAPTree
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from apricot.oauth import OAuthDataAdaptor
+
+
+def bench_refresh(
+    adaptor: OAuthDataAdaptor,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Retrieve, resolve, validate and build the tree from an in-memory client."""
+    tree = OAuthLDAPTree(
+        adaptor,
+        adaptor.oauth_client,
+        background_refresh=True,
+        refresh_interval=60,
+    )
+
+    def refresh() -> None:
+        tree.stale = True
+        tree.refresh()
+
+    measure(refresh, items=size)
+    assert tree.entry_counts["users"] == size  # noqa: S101
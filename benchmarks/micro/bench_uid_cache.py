@@ -0,0 +1,67 @@
+"""Micro-benchmarks for allocating UIDs from a cache that already holds many."""
+
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING, Any
+
+import fakeredis
+import pytest
+
+from apricot.cache import LocalCache, RedisCache
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from apricot.cache import UidCache
+
+
+@pytest.fixture(params=["local", "redis"])
+def uid_cache(request: pytest.FixtureRequest, size: int) -> UidCache:
+    """Create a UID cache that already holds one UID for each of 'size' users.
+
+    Redis is replaced by an in-memory stand-in, so that only the cost of the
+    commands made by the cache is measured and not that of a network round trip.
+
+    Args:
+        request: The pytest request, whose parameter is the type of cache
+        size: Number of users
+
+    Returns:
+        A populated UID cache.
+    """
+    cache: UidCache
+    if request.param == "redis":
+        redis_cache = RedisCache(redis_host="localhost", redis_port=6379)
+        redis_cache.cache_ = fakeredis.FakeRedis(decode_responses=True)
+        cache = redis_cache
+    else:
+        cache = LocalCache()
+    for idx in range(size):
+        cache.set(f"user-existing{idx}", 2000 + idx)
+    return cache
+
+
+def bench_get_uid_existing(
+    uid_cache: UidCache,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Look up the UID of a user that already has one."""
+    uid = measure(uid_cache.get_user_uid, f"existing{size // 2}", items=1)
+    assert uid == 2000 + size // 2  # noqa: S101
+
+
+def bench_get_uid_new(
+    uid_cache: UidCache,
+    measure: Callable[..., Any],
+    size: int,
+) -> None:
+    """Allocate a UID for a user that does not yet have one."""
+    identifiers = (f"new{idx}" for idx in itertools.count())
+
+    def get_new_uid() -> int:
+        return uid_cache.get_user_uid(next(identifiers))
+
+    uid = measure(get_new_uid, items=1)
+    assert uid >= 2000 + size  # noqa: S101
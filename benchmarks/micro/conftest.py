@@ -0,0 +1,158 @@
+"""Shared fixtures for the micro-benchmarks.
+
+Each benchmark that takes a 'size' is run for synthetic directories with that many
+users, and its median time is recorded. At the end of the run the time per item is
+compared across sizes, so that any operation whose cost per item grows with the size
+of the directory, such as one that is accidentally quadratic, stands out.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+from typing import TYPE_CHECKING, Any, cast
+
+import pytest
+
+from apricot.oauth import OAuthDataAdaptor
+from benchmarks.synthetic_directory import SyntheticDirectory, SyntheticOAuthClient
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from pytest_benchmark.fixture import BenchmarkFixture
+
+# Synthetic UIDs start at 10000, so larger directories would exceed the POSIX ID range
+SIZES = (100, 1_000, 10_000, 50_000)
+# Report benchmarks whose time per item grows faster than this power of the size
+MAX_EXPONENT = 0.25
+
+# Median time in seconds per item for each benchmark at each size
+scaling: dict[str, dict[int, float]] = {}
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add command line options for the micro-benchmarks.
+
+    Args:
+        parser: The pytest command line parser
+    """
+    parser.addoption(
+        "--max-size",
+        type=int,
+        default=SIZES[-1],
+        help="Largest directory size to benchmark.",
+    )
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    """Run each benchmark that takes a 'size' at every size up to the maximum.
+
+    Args:
+        metafunc: The benchmark function being collected
+    """
+    if "size" in metafunc.fixturenames:
+        max_size = metafunc.config.getoption("max_size")
+        metafunc.parametrize("size", [size for size in SIZES if size <= max_size])
+
+
+def pytest_terminal_summary(terminalreporter: pytest.TerminalReporter) -> None:
+    """Report how the time per item of each benchmark changes with size.
+
+    The exponent is the power of the size with which the time per item grows
+    between the smallest and largest sizes: about 0 for an operation that scales
+    linearly and about 1 for one that is quadratic.
+
+    Args:
+        terminalreporter: The pytest terminal reporter
+    """
+    if not scaling:
+        return
+    terminalreporter.section("scaling")
+    for name, timings in sorted(scaling.items()):
+        sizes = sorted(timings)
+        per_item = ", ".join(f"{size}: {timings[size] * 1e6:.2f}us" for size in sizes)
+        exponent = (
+            math.log(timings[sizes[-1]] / timings[sizes[0]])
+            / math.log(sizes[-1] / sizes[0])
+            if len(sizes) > 1
+            else 0
+        )
+        terminalreporter.write_line(
+            f"{name}: exponent {exponent:.2f} ({per_item} per item)",
+            red=exponent > MAX_EXPONENT,
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def synthetic_client(size: int) -> SyntheticOAuthClient:
+    """Create an OAuth client serving a synthetic directory.
+
+    Directories are cached, as generating the largest takes several seconds.
+
+    Args:
+        size: Number of users
+
+    Returns:
+        A client for a directory with one group for every 100 users, where each
+        user belongs to five groups.
+    """
+    return SyntheticOAuthClient(SyntheticDirectory(size, max(5, size // 100), 5))
+
+
+@pytest.fixture
+def adaptor(size: int) -> OAuthDataAdaptor:
+    """Create an OAuth data adaptor for a synthetic directory.
+
+    Args:
+        size: Number of users
+
+    Returns:
+        An adaptor with primary and mirrored groups enabled.
+    """
+    client = synthetic_client(size)
+    return OAuthDataAdaptor(
+        client.directory.domain,
+        client,
+        enable_mirrored_groups=True,
+        enable_primary_groups=True,
+        enable_user_domain_verification=True,
+    )
+
+
+@pytest.fixture
+def measure(
+    benchmark: BenchmarkFixture,
+    request: pytest.FixtureRequest,
+    size: int,
+) -> Callable[..., Any]:
+    """Benchmark a function and record its time per item.
+
+    Larger sizes are run for fewer rounds so that every size takes a similar time.
+
+    Args:
+        benchmark: The pytest-benchmark fixture
+        request: The pytest request for the benchmark
+        size: Number of users
+
+    Returns:
+        A function that takes the function to benchmark, its arguments and the
+        number of items it processes, and returns its result.
+    """
+    node = cast("pytest.Function", request.node)
+    params = [str(v) for k, v in node.callspec.params.items() if k != "size"]
+    name = f"{node.originalname}[{'-'.join(params)}]" if params else node.originalname
+
+    def measure_(function: Callable[..., object], *args: Any, items: int) -> object:
+        result = benchmark.pedantic(  # type: ignore[no-untyped-call]
+            function,
+            args=args,
+            rounds=max(3, min(20, 10_000 // size)),
+            warmup_rounds=1,
+        )
+        # There are no statistics if benchmarks are disabled
+        if benchmark.stats:
+            scaling.setdefault(name, {})[size] = benchmark.stats.stats.median / items
+        return result
+
+    return measure_
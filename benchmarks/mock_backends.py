@@ -0,0 +1,693 @@
+"""Local HTTP servers that stand in for the Microsoft Graph and Keycloak admin APIs.
+
+Each server serves a SyntheticDirectory in the same shape as the real API, including
+its token endpoint, pagination and throttling, so that the OAuth clients can be
+benchmarked against directories of any size without a real tenant. The clients keep
+their usual HTTPS URLs: requests to those URLs are redirected to the local server by
+mounting a transport adapter on the client's session.
+
+The servers can also be run on their own, so that an Apricot server can be pointed
+at a mock Keycloak backend for end-to-end benchmarks:
+
+    python -m benchmarks.mock_backends --backend Keycloak --port 8080 --users 10000
+    OAUTHLIB_INSECURE_TRANSPORT=1 python run.py --backend Keycloak \
+        --keycloak-base-url http://127.0.0.1:8080 --keycloak-realm apricot \
+        --client-id client-id --client-secret client-secret --domain example.com
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import json
+import threading
+import time
+import urllib.parse
+from abc import abstractmethod
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, ClassVar, Self
+
+from requests.adapters import HTTPAdapter
+from typing_extensions import override
+
+from apricot.oauth import OAuthBackend
+
+from .synthetic_directory import SyntheticDirectory
+
+if TYPE_CHECKING:
+    import datetime as dt
+    from collections.abc import Callable, Sequence
+    from types import TracebackType
+
+    from requests import PreparedRequest, Response, Session
+
+    from apricot.typedefs import JSONDict
+
+
+class LocalRedirectAdapter(HTTPAdapter):
+    """A transport adapter that sends requests for a public URL to a local server."""
+
+    def __init__(self: Self, public_url: str, local_url: str) -> None:
+        """Initialise a LocalRedirectAdapter.
+
+        Args:
+            public_url: URL prefix that the client sends requests to
+            local_url: URL prefix of the local server
+        """
+        super().__init__()
+        self.local_url = local_url
+        self.public_url = public_url
+
+    @override
+    def send(
+        self: Self,
+        request: PreparedRequest,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Response:
+        # Requests for any URL under the public URL are sent to the local server
+        request.url = self.local_url + str(request.url).removeprefix(self.public_url)
+        return super().send(request, *args, **kwargs)
+
+
+class MockBackend:
+    """A local HTTP server that serves a synthetic directory in a thread."""
+
+    def __init__(
+        self: Self,
+        handler: type[MockRequestHandler],
+        directory: SyntheticDirectory,
+        *,
+        latency: float = 0,
+        port: int = 0,
+        throttle_every: int = 0,
+    ) -> None:
+        """Initialise a MockBackend.
+
+        Args:
+            handler: Request handler that implements the API
+            directory: The directory to serve
+            latency: Time in seconds to wait before answering each request
+            port: Port to listen on (0 to choose any free port)
+            throttle_every: Throttle every nth request for data (0 to disable)
+        """
+        self.directory = directory
+        self.group_indices = {
+            group["id"]: idx for idx, group in enumerate(directory.groups)
+        }
+        self.handler = handler
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.n_requests = 0
+        self.n_throttled = 0
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", port),
+            functools.partial(handler, backend=self),
+        )
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.throttle_every = throttle_every
+        self.updates: dict[str, JSONDict] = {}
+        self.user_indices = {
+            user["id"]: idx for idx, user in enumerate(directory.users)
+        }
+
+    def __enter__(self: Self) -> Self:
+        """Start serving requests.
+
+        Returns:
+            The running backend.
+        """
+        self.thread.start()
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Stop serving requests."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @property
+    def url(self: Self) -> str:
+        """URL of the local server."""
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def mount(self: Self, session: Session) -> None:
+        """Redirect requests for the public URLs of the API to the local server.
+
+        Args:
+            session: The requests session used by an OAuth client
+        """
+        for public_url in self.handler.public_urls:
+            session.mount(public_url, LocalRedirectAdapter(public_url, self.url))
+
+    def throttle(self: Self) -> bool:
+        """Count a request for data and decide whether to throttle it.
+
+        Returns:
+            Whether the request should be throttled.
+        """
+        with self.lock:
+            self.n_requests += 1
+            if self.throttle_every and self.n_requests % self.throttle_every == 0:
+                self.n_throttled += 1
+                return True
+        return False
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Base class for handlers that implement an OAuth backend's API."""
+
+    access_token = "mock-access-token"  # noqa: S105
+    disable_nagle_algorithm = True
+    protocol_version = "HTTP/1.1"
+    public_urls: ClassVar[tuple[str, ...]] = ()
+
+    def __init__(self: Self, *args: Any, backend: MockBackend, **kwargs: Any) -> None:
+        """Initialise a MockRequestHandler.
+
+        Args:
+            args: BaseHTTPRequestHandler arguments
+            backend: The backend that received the request
+            kwargs: BaseHTTPRequestHandler keyword arguments
+        """
+        self.backend = backend
+        self.directory = backend.directory
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self: Self) -> None:
+        """Handle a GET request."""
+        self.dispatch("GET")
+
+    def do_POST(self: Self) -> None:
+        """Handle a POST request."""
+        self.dispatch("POST")
+
+    def do_PUT(self: Self) -> None:
+        """Handle a PUT request."""
+        self.dispatch("PUT")
+
+    def dispatch(self: Self, method: str) -> None:
+        """Answer a request after checking its token and whether to throttle it.
+
+        Args:
+            method: HTTP request method
+        """
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+        if method == "POST" and url.path.endswith("/token"):
+            self.send_json(HTTPStatus.OK, self.token_response())
+        elif self.headers.get("Authorization") != f"Bearer {self.access_token}":
+            self.send_json(HTTPStatus.UNAUTHORIZED, self.error("Invalid token."))
+        elif self.backend.throttle():
+            self.send_json(
+                HTTPStatus.TOO_MANY_REQUESTS,
+                self.error("Too many requests."),
+                headers={"Retry-After": "1"},
+            )
+        else:
+            data = json.loads(body) if body else None
+            status, response = self.route(
+                method,
+                url.path.strip("/").split("/"),
+                params,
+                data,
+            )
+            self.send_json(status, response)
+
+    @override
+    def log_message(self: Self, format: str, *args: Any) -> None:
+        # Do not log each request
+        id((format, args))  # ignore unused arguments
+
+    def send_json(
+        self: Self,
+        status: HTTPStatus,
+        data: object,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Send a response with a JSON body.
+
+        Args:
+            status: HTTP status of the response
+            data: Body of the response, or None if it has no content
+            headers: Any extra headers to send
+        """
+        body = b"" if data is None else json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def error(message: str) -> JSONDict:
+        """Describe an error in the format used by the API.
+
+        Args:
+            message: Description of the error
+
+        Returns:
+            The body of an error response.
+        """
+        return {"error": message}
+
+    @abstractmethod
+    def route(
+        self: Self,
+        method: str,
+        path: list[str],
+        params: dict[str, str],
+        data: JSONDict | None,
+    ) -> tuple[HTTPStatus, Any]:
+        """Answer a request for data.
+
+        Args:
+            method: HTTP request method
+            path: Components of the URL path
+            params: Query parameters
+            data: JSON body of the request, if any
+
+        Returns:
+            The HTTP status and JSON body of the response.
+        """
+
+    @abstractmethod
+    def token_response(self: Self) -> JSONDict:
+        """Describe the access token returned by the token endpoint.
+
+        Returns:
+            The body of a response from the token endpoint.
+        """
+
+
+class MockGraphHandler(MockRequestHandler):
+    """Handler that implements the parts of the Microsoft Graph API used by Apricot.
+
+    Lists are returned in pages of at most '$top' items, linked by '@odata.nextLink'.
+    """
+
+    default_page_size = 100
+    max_page_size = 999
+    public_urls: ClassVar[tuple[str, ...]] = (
+        "https://graph.microsoft.com",
+        "https://login.microsoftonline.com",
+    )
+
+    @staticmethod
+    def error(message: str) -> JSONDict:
+        """Describe an error in the format used by Graph.
+
+        Args:
+            message: Description of the error
+
+        Returns:
+            The body of an error response.
+        """
+        return {"error": {"message": message}}
+
+    def group(self: Self, idx: int) -> JSONDict:
+        """Get the Graph representation of a group.
+
+        Args:
+            idx: Index of the group
+
+        Returns:
+            The group as a Graph group resource.
+        """
+        group = self.directory.groups[idx]
+        return {
+            "createdDateTime": self.timestamp(group["created"]),
+            "displayName": group["name"],
+            "id": group["id"],
+        }
+
+    def page(
+        self: Self,
+        path: list[str],
+        params: dict[str, str],
+        indices: Sequence[int],
+        represent: Callable[[int], JSONDict],
+    ) -> JSONDict:
+        """Get one page of a list of directory objects.
+
+        Args:
+            path: Components of the URL path
+            params: Query parameters, including '$top', '$select' and '$skiptoken'
+            indices: Indices of every object in the list
+            represent: Function giving the Graph representation of an object
+
+        Returns:
+            The page of objects, with a link to the next page if there is one.
+        """
+        top = min(int(params.get("$top", self.default_page_size)), self.max_page_size)
+        skip = int(params.get("$skiptoken", 0))
+        values = [represent(idx) for idx in indices[skip : skip + top]]
+        if select := params.get("$select"):
+            keys = ["@odata.type", "id", *select.split(",")]
+            values = [{key: v[key] for key in keys if key in v} for v in values]
+        output: JSONDict = {
+            "@odata.context": f"{self.public_urls[0]}/v1.0/$metadata#{path[-1]}",
+            "value": values,
+        }
+        if skip + top < len(indices):
+            query = urllib.parse.urlencode(
+                params | {"$skiptoken": str(skip + top)},
+                safe="$,",
+            )
+            output["@odata.nextLink"] = (
+                f"{self.public_urls[0]}/{'/'.join(path)}?{query}"
+            )
+        return output
+
+    def collection(
+        self: Self,
+        path: list[str],
+    ) -> tuple[Sequence[int], Callable[[int], JSONDict]] | None:
+        """Find the list of directory objects at a URL path.
+
+        Args:
+            path: Components of the URL path
+
+        Returns:
+            The indices of the objects in the list and a function giving the Graph
+            representation of each object, or None if there is no such list.
+        """
+        if path == ["v1.0", "users"]:
+            return range(len(self.directory.users)), self.user
+        if path == ["v1.0", "groups"]:
+            return range(len(self.directory.groups)), self.group
+        if (
+            len(path) == 4  # noqa: PLR2004
+            and path[:2] == ["v1.0", "groups"]
+            and path[3] == "members"
+            and (idx := self.backend.group_indices.get(path[2])) is not None
+        ):
+            return self.directory.group_members[idx], self.user
+        return None
+
+    @override
+    def route(
+        self: Self,
+        method: str,
+        path: list[str],
+        params: dict[str, str],
+        data: JSONDict | None,
+    ) -> tuple[HTTPStatus, Any]:
+        """Answer a request for users, groups or the members of a group.
+
+        Args:
+            method: HTTP request method
+            path: Components of the URL path
+            params: Query parameters
+            data: JSON body of the request, if any
+
+        Returns:
+            The HTTP status and JSON body of the response.
+        """
+        id(data)  # ignore unused arguments
+        if method == "GET" and (collection := self.collection(path)):
+            return HTTPStatus.OK, self.page(path, params, *collection)
+        return HTTPStatus.NOT_FOUND, self.error("Resource not found.")
+
+    @staticmethod
+    def timestamp(created: dt.datetime) -> str:
+        """Format a creation time as Graph does.
+
+        Args:
+            created: Time at which an object was created
+
+        Returns:
+            The time in ISO 8601 format.
+        """
+        return created.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    @override
+    def token_response(self: Self) -> JSONDict:
+        return {
+            "access_token": self.access_token,
+            "expires_in": 3599,
+            "token_type": "Bearer",
+        }
+
+    def user(self: Self, idx: int) -> JSONDict:
+        """Get the Graph representation of a user.
+
+        Args:
+            idx: Index of the user
+
+        Returns:
+            The user as a Graph user resource.
+        """
+        user = self.directory.users[idx]
+        return {
+            "@odata.type": "#microsoft.graph.user",
+            "createdDateTime": self.timestamp(user["created"]),
+            "displayName": f"{user['given_name']} {user['surname']}",
+            "givenName": user["given_name"],
+            "id": user["id"],
+            "surname": user["surname"],
+            "userPrincipalName": self.directory.principal_name(idx),
+        }
+
+
+class MockKeycloakHandler(MockRequestHandler):
+    """Handler that implements the parts of the Keycloak admin API used by Apricot.
+
+    Lists are returned in pages selected by the 'first' and 'max' query parameters.
+    Every user and group already has the 'uid' or 'gid' attribute that Apricot would
+    write back, as it would after the first refresh.
+    """
+
+    default_page_size = 100
+    domain_attribute = "domain"
+    public_urls: ClassVar[tuple[str, ...]] = ("https://keycloak.example.com",)
+    realm = "apricot"
+
+    def collection(
+        self: Self,
+        path: list[str],
+        *,
+        brief: bool,
+    ) -> tuple[Sequence[int], Callable[[int], JSONDict]] | None:
+        """Find the list of users or groups at a URL path within the realm.
+
+        Args:
+            path: Components of the URL path after the realm
+            brief: Whether to leave out the attributes of each user or group
+
+        Returns:
+            The indices of the objects in the list and a function giving the Keycloak
+            representation of each object, or None if there is no such list.
+        """
+        groups = functools.partial(self.group, brief=brief)
+        users = functools.partial(self.user, brief=brief)
+        if path == ["users"]:
+            return range(len(self.directory.users)), users
+        if path == ["groups"]:
+            return range(len(self.directory.groups)), groups
+        if len(path) != 3:  # noqa: PLR2004
+            return None
+        kind, object_id, relation = path
+        if (
+            kind == "users"
+            and relation == "groups"
+            and (idx := self.backend.user_indices.get(object_id)) is not None
+        ):
+            return self.directory.user_groups[idx], groups
+        if (
+            kind == "groups"
+            and (idx := self.backend.group_indices.get(object_id)) is not None
+        ):
+            return {
+                "children": ([], groups),
+                "members": (self.directory.group_members[idx], users),
+            }.get(relation)
+        return None
+
+    def group(self: Self, idx: int, *, brief: bool) -> JSONDict:
+        """Get the Keycloak representation of a group.
+
+        Args:
+            idx: Index of the group
+            brief: Whether to leave out the group's attributes
+
+        Returns:
+            The group as a Keycloak GroupRepresentation.
+        """
+        group = self.directory.groups[idx]
+        output: JSONDict = {
+            "id": group["id"],
+            "name": group["name"],
+            "path": f"/{group['name']}",
+            "subGroupCount": 0,
+            "subGroups": [],
+        }
+        if not brief:
+            output["attributes"] = self.backend.updates.get(group["id"], {}).get(
+                "attributes",
+                {"gid": [str(group["gid_number"])]},
+            )
+        return output
+
+    def page(
+        self: Self,
+        params: dict[str, str],
+        indices: Sequence[int],
+    ) -> Sequence[int]:
+        """Select one page of a list.
+
+        Args:
+            params: Query parameters, including 'first' and 'max'
+            indices: Indices of every object in the list
+
+        Returns:
+            The indices of the objects on the page.
+        """
+        first = int(params.get("first", 0))
+        return indices[first : first + int(params.get("max", self.default_page_size))]
+
+    @override
+    def route(
+        self: Self,
+        method: str,
+        path: list[str],
+        params: dict[str, str],
+        data: JSONDict | None,
+    ) -> tuple[HTTPStatus, Any]:
+        """Answer a request for users, groups, memberships or an update.
+
+        Args:
+            method: HTTP request method
+            path: Components of the URL path
+            params: Query parameters
+            data: JSON body of the request, if any
+
+        Returns:
+            The HTTP status and JSON body of the response.
+        """
+        if path[:3] != ["admin", "realms", self.realm]:
+            return HTTPStatus.NOT_FOUND, self.error("Realm not found")
+        path = path[3:]
+        if method == "GET" and path == ["users", "count"]:
+            return HTTPStatus.OK, len(self.directory.users)
+        if (
+            method == "PUT"
+            and path[:1] in (["users"], ["groups"])
+            and len(path) == 2  # noqa: PLR2004
+        ):
+            self.backend.updates[path[1]] = data or {}
+            return HTTPStatus.NO_CONTENT, None
+        brief = params.get("briefRepresentation", "false") == "true"
+        if method == "GET" and (collection := self.collection(path, brief=brief)):
+            indices, represent = collection
+            return HTTPStatus.OK, [represent(idx) for idx in self.page(params, indices)]
+        return HTTPStatus.NOT_FOUND, self.error("Resource not found")
+
+    @override
+    def token_response(self: Self) -> JSONDict:
+        return {
+            "access_token": self.access_token,
+            "expires_in": 300,
+            "refresh_expires_in": 0,
+            "scope": "profile email",
+            "token_type": "Bearer",
+        }
+
+    def user(self: Self, idx: int, *, brief: bool) -> JSONDict:
+        """Get the Keycloak representation of a user.
+
+        Args:
+            idx: Index of the user
+            brief: Whether to leave out the user's attributes
+
+        Returns:
+            The user as a Keycloak UserRepresentation.
+        """
+        user = self.directory.users[idx]
+        output: JSONDict = {
+            "createdTimestamp": int(user["created"].timestamp() * 1000),
+            "email": self.directory.principal_name(idx),
+            "enabled": True,
+            "firstName": user["given_name"],
+            "id": user["id"],
+            "lastName": user["surname"],
+            "username": user["username"],
+        }
+        if not brief:
+            output["attributes"] = self.backend.updates.get(user["id"], {}).get(
+                "attributes",
+                {
+                    self.domain_attribute: [self.directory.domain],
+                    "uid": [str(user["uid_number"])],
+                },
+            )
+        return output
+
+
+MockHandlerMap: dict[OAuthBackend, type[MockRequestHandler]] = {
+    OAuthBackend.MICROSOFT_ENTRA: MockGraphHandler,
+    OAuthBackend.KEYCLOAK: MockKeycloakHandler,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic directory from a mock OAuth backend.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=OAuthBackend,
+        default=OAuthBackend.KEYCLOAK,
+        help="Which OAuth backend to mock.",
+    )
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--users", type=int, default=5000, help="Number of users.")
+    parser.add_argument(
+        "--groups",
+        type=int,
+        default=None,
+        help="Number of groups (default: one for every 100 users).",
+    )
+    parser.add_argument(
+        "--groups-per-user",
+        type=int,
+        default=5,
+        help="Number of groups that each user belongs to.",
+    )
+    parser.add_argument(
+        "--distribution",
+        choices=SyntheticDirectory.distributions,
+        default="zipf",
+        help="How users are assigned to groups.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    mock_backend = MockBackend(
+        MockHandlerMap[args.backend],
+        SyntheticDirectory(
+            args.users,
+            args.groups or max(args.groups_per_user, args.users // 100),
+            args.groups_per_user,
+            distribution=args.distribution,
+            seed=args.seed,
+        ),
+        port=args.port,
+    )
+    print(f"Serving a mock backend at {mock_backend.url}")  # noqa: T201
+    with contextlib.suppress(KeyboardInterrupt):
+        mock_backend.server.serve_forever()
@@ -0,0 +1,150 @@
+"""Measure the time taken to refresh the LDAP tree from a mock OAuth backend.
+
+A synthetic directory is served by a local stand-in for the Microsoft Graph or
+Keycloak admin API, and the real OAuth client for that backend is used to refresh
+the LDAP tree several times. The first refresh may also assign a UID to every user
+and group, so it is reported separately from the median of the others. Latency and
+throttling can be added to each request to see how the number of requests made by a
+client affects its refresh time.
+
+Usage: python -m benchmarks.refresh_backends --backend Keycloak --users 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Any
+
+from apricot.cache import LocalCache
+from apricot.ldap.oauth_ldap_tree import OAuthLDAPTree
+from apricot.metrics import refresh_profiler
+from apricot.oauth import OAuthBackend, OAuthClient, OAuthDataAdaptor
+from apricot.oauth.keycloak_client import KeycloakClient
+from apricot.oauth.microsoft_entra_client import MicrosoftEntraClient
+
+from .mock_backends import MockBackend, MockHandlerMap, MockKeycloakHandler
+from .synthetic_directory import SyntheticDirectory
+
+
+def create_client(backend: OAuthBackend) -> OAuthClient:
+    """Create an OAuth client whose requests can be redirected to a mock backend.
+
+    Args:
+        backend: Which OAuth backend to create a client for
+
+    Returns:
+        An OAuth client for the backend.
+    """
+    kwargs: dict[str, Any] = {
+        "client_id": "client-id",
+        "client_secret": "client-secret",
+        "uid_cache": LocalCache(),
+    }
+    if backend == OAuthBackend.KEYCLOAK:
+        return KeycloakClient(
+            keycloak_base_url=MockKeycloakHandler.public_urls[0],
+            keycloak_domain_attribute=MockKeycloakHandler.domain_attribute,
+            keycloak_realm=MockKeycloakHandler.realm,
+            **kwargs,
+        )
+    return MicrosoftEntraClient(entra_tenant_id="tenant-id", **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the time taken to refresh the LDAP tree.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=OAuthBackend,
+        default=OAuthBackend.MICROSOFT_ENTRA,
+        help="Which OAuth backend to mock.",
+    )
+    parser.add_argument("--users", type=int, default=5000, help="Number of users.")
+    parser.add_argument(
+        "--groups",
+        type=int,
+        default=None,
+        help="Number of groups (default: one for every 100 users).",
+    )
+    parser.add_argument(
+        "--groups-per-user",
+        type=int,
+        default=5,
+        help="Number of groups that each user belongs to.",
+    )
+    parser.add_argument(
+        "--distribution",
+        choices=SyntheticDirectory.distributions,
+        default="zipf",
+        help="How users are assigned to groups.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Time in milliseconds to wait before answering each request.",
+    )
+    parser.add_argument(
+        "--throttle-every",
+        type=int,
+        default=0,
+        help="Throttle every nth request for data with a 429 response.",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Number of refreshes to time.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    directory = SyntheticDirectory(
+        args.users,
+        args.groups or max(args.groups_per_user, args.users // 100),
+        args.groups_per_user,
+        distribution=args.distribution,
+        seed=args.seed,
+    )
+    with MockBackend(
+        MockHandlerMap[args.backend],
+        directory,
+        latency=args.latency / 1000,
+        throttle_every=args.throttle_every,
+    ) as mock_backend:
+        client = create_client(args.backend)
+        mock_backend.mount(client.session_application)
+        tree = OAuthLDAPTree(
+            OAuthDataAdaptor(
+                directory.domain,
+                client,
+                enable_mirrored_groups=True,
+                enable_primary_groups=True,
+                enable_transitive_membership=False,
+                enable_user_domain_verification=True,
+            ),
+            client,
+            background_refresh=True,
+            refresh_interval=60,
+        )
+        durations = []
+        for _ in range(args.repeats):
+            tree.stale = True
+            start = time.perf_counter()
+            tree.refresh()
+            durations.append(time.perf_counter() - start)
+
+    n_requests = mock_backend.n_requests / args.repeats
+    print(f"Memberships:        {directory.n_memberships}")  # noqa: T201
+    print(f"Entries:            {sum(tree.entry_counts.values())}")  # noqa: T201
+    print(f"Requests:           {n_requests:.0f} per refresh")  # noqa: T201
+    print(f"Throttled:          {mock_backend.n_throttled}")  # noqa: T201
+    print(f"First refresh:      {durations[0]:.2f} seconds")  # noqa: T201
+    if len(durations) > 1:
+        median = statistics.median(durations[1:])
+        print(f"Later refreshes:    {median:.2f} seconds")  # noqa: T201
+    for name, seconds in refresh_profiler.timings.items():
+        print(f"  {name + ':':<20}{seconds:.2f} seconds")  # noqa: T201
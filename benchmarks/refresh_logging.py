@@ -0,0 +1,102 @@
+"""Measure the time taken to refresh the LDAP tree with and without debug logging.
+
+Synthetic users and groups are served by an in-memory OAuth client, and the LDAP
+tree is refreshed several times with Apricot logging at INFO and then at DEBUG level.
+Log messages are discarded after being formatted, so the difference between the two
+is the cost of debug logging rather than of writing the log.
+
+Usage: python -m benchmarks.refresh_logging --users 5000 --repeats 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import pathlib
+import statistics
+import time
+
+from twisted.logger import globalLogBeginner
+from twisted.python import log
+
+from apricot.ldap.oauth_ldap_tree import OAuthLDAPTree
+from apricot.log_level import LOGGER_NAME
+from apricot.oauth import OAuthDataAdaptor
+
+from .synthetic_directory import SyntheticDirectory, SyntheticOAuthClient
+
+
+def time_refresh(tree: OAuthLDAPTree, level: int, repeats: int) -> float:
+    """Measure the median time taken to refresh the LDAP tree at a logging level.
+
+    Args:
+        tree: The LDAP tree to refresh
+        level: Level at which Apricot messages are logged
+        repeats: Number of refreshes to time
+
+    Returns:
+        The median time in seconds taken by a refresh.
+    """
+    logging.getLogger(LOGGER_NAME).setLevel(level)
+    durations = []
+    for _ in range(repeats):
+        tree.stale = True
+        start = time.perf_counter()
+        tree.refresh()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the time taken to refresh the LDAP tree.",
+    )
+    parser.add_argument("--users", type=int, default=5000, help="Number of users.")
+    parser.add_argument(
+        "--groups-per-user",
+        type=int,
+        default=5,
+        help="Number of groups that each user belongs to.",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Number of refreshes to time at each logging level.",
+    )
+    args = parser.parse_args()
+
+    # Forward Twisted logs to a Python logger that formats and then discards them
+    globalLogBeginner.beginLoggingTo([], redirectStandardIO=False)
+    log.PythonLoggingObserver(LOGGER_NAME).start()  # type: ignore[no-untyped-call]
+    devnull = pathlib.Path(os.devnull).open("w", encoding="utf-8")  # noqa: SIM115
+    logging.getLogger(LOGGER_NAME).addHandler(logging.StreamHandler(devnull))
+    logging.getLogger(LOGGER_NAME).propagate = False
+
+    directory = SyntheticDirectory(
+        args.users,
+        max(args.groups_per_user, args.users // 100),
+        args.groups_per_user,
+        distribution="round-robin",
+    )
+    client = SyntheticOAuthClient(directory)
+    tree = OAuthLDAPTree(
+        OAuthDataAdaptor(
+            directory.domain,
+            client,
+            enable_mirrored_groups=True,
+            enable_primary_groups=True,
+            enable_transitive_membership=False,
+            enable_user_domain_verification=True,
+        ),
+        client,
+        background_refresh=True,
+        refresh_interval=60,
+    )
+    info_seconds = time_refresh(tree, logging.INFO, args.repeats)
+    debug_seconds = time_refresh(tree, logging.DEBUG, args.repeats)
+    print(f"Entries:            {sum(tree.entry_counts.values())}")  # noqa: T201
+    print(f"Refresh at INFO:    {info_seconds:.2f} seconds")  # noqa: T201
+    print(f"Refresh at DEBUG:   {debug_seconds:.2f} seconds")  # noqa: T201
+    print(f"Debug overhead:     {debug_seconds / info_seconds:.1f}x")  # noqa: T201
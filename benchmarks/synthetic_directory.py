@@ -0,0 +1,224 @@
+"""Generate reproducible synthetic directories of users and groups.
+
+Group memberships can follow one of several distributions:
+
+- round-robin: each user belongs to consecutive groups, so groups are equally sized
+- uniform: each user belongs to groups chosen uniformly at random
+- zipf: each user belongs to groups chosen with a probability that falls with their
+  rank, giving a few very large groups and many small ones, as in most real tenants
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import itertools
+import random
+import uuid
+from typing import TYPE_CHECKING, Any, ClassVar, Self
+
+from typing_extensions import override
+
+from apricot.cache import LocalCache
+from apricot.oauth import OAuthClient
+
+if TYPE_CHECKING:
+    from apricot.typedefs import JSONDict
+
+
+class SyntheticDirectory:
+    """A directory of synthetic users and groups generated from a random seed."""
+
+    distributions: ClassVar[tuple[str, ...]] = ("round-robin", "uniform", "zipf")
+
+    def __init__(  # noqa: PLR0913
+        self: Self,
+        n_users: int,
+        n_groups: int,
+        groups_per_user: int,
+        *,
+        distribution: str = "zipf",
+        domain: str = "example.com",
+        seed: int = 0,
+        zipf_exponent: float = 1.0,
+    ) -> None:
+        """Initialise a SyntheticDirectory.
+
+        Args:
+            n_users: Number of users
+            n_groups: Number of groups
+            groups_per_user: Number of groups that each user belongs to
+            distribution: How users are assigned to groups
+            domain: Domain of each user's principal name
+            seed: Seed for the random number generator
+            zipf_exponent: How quickly group sizes fall with rank for the 'zipf'
+                distribution
+
+        Raises:
+            ValueError: if the distribution is unknown or there are too few groups
+        """
+        if distribution not in self.distributions:
+            msg = f"Unknown membership distribution '{distribution}'."
+            raise ValueError(msg)
+        if groups_per_user > n_groups:
+            msg = f"Users cannot belong to {groups_per_user} of {n_groups} groups."
+            raise ValueError(msg)
+        self.distribution = distribution
+        self.domain = domain
+        self.rng = random.Random(seed)  # noqa: S311
+        self.zipf_cum_weights = list(
+            itertools.accumulate(
+                1 / (rank + 1) ** zipf_exponent for rank in range(n_groups)
+            ),
+        )
+        created = dt.datetime(2020, 1, 1, tzinfo=dt.UTC)
+
+        self.users: list[dict[str, Any]] = [
+            {
+                "created": created + dt.timedelta(minutes=idx),
+                "given_name": "User",
+                "id": str(uuid.UUID(int=self.rng.getrandbits(128))),
+                "surname": str(idx),
+                "uid_number": 10000 + idx,
+                "username": f"user{idx}",
+            }
+            for idx in range(n_users)
+        ]
+        self.groups: list[dict[str, Any]] = [
+            {
+                "created": created + dt.timedelta(minutes=idx),
+                "gid_number": 30000 + idx,
+                "id": str(uuid.UUID(int=self.rng.getrandbits(128))),
+                "name": f"group{idx}",
+            }
+            for idx in range(n_groups)
+        ]
+        # Indices of the groups that each user belongs to and of each group's members
+        self.user_groups = [
+            self.choose_groups(idx, n_groups, groups_per_user) for idx in range(n_users)
+        ]
+        self.group_members: list[list[int]] = [[] for _ in range(n_groups)]
+        for user_idx, group_indices in enumerate(self.user_groups):
+            for group_idx in group_indices:
+                self.group_members[group_idx].append(user_idx)
+
+    @property
+    def n_memberships(self: Self) -> int:
+        """Total number of group memberships."""
+        return sum(map(len, self.user_groups))
+
+    def choose_groups(
+        self: Self,
+        user_idx: int,
+        n_groups: int,
+        groups_per_user: int,
+    ) -> list[int]:
+        """Choose the groups that a user belongs to.
+
+        Args:
+            user_idx: Index of the user
+            n_groups: Number of groups
+            groups_per_user: Number of groups that the user belongs to
+
+        Returns:
+            The indices of the chosen groups in ascending order.
+        """
+        if self.distribution == "round-robin":
+            return sorted(
+                (user_idx + offset) % n_groups for offset in range(groups_per_user)
+            )
+        if self.distribution == "uniform":
+            return sorted(self.rng.sample(range(n_groups), groups_per_user))
+        chosen: set[int] = set()
+        while len(chosen) < groups_per_user:
+            chosen.update(
+                self.rng.choices(
+                    range(n_groups),
+                    cum_weights=self.zipf_cum_weights,
+                    k=groups_per_user - len(chosen),
+                ),
+            )
+        return sorted(chosen)
+
+    def principal_name(self: Self, user_idx: int) -> str:
+        """Get the principal name of a user.
+
+        Args:
+            user_idx: Index of the user
+
+        Returns:
+            The user's name qualified by the directory's domain.
+        """
+        return f"{self.users[user_idx]['username']}@{self.domain}"
+
+
+class SyntheticOAuthClient(OAuthClient):
+    """An OAuth client that serves a synthetic directory from memory.
+
+    Users and groups are returned as they would be by a real client, so that the
+    rest of a refresh can be measured without making any requests.
+    """
+
+    def __init__(self: Self, directory: SyntheticDirectory) -> None:
+        """Initialise a SyntheticOAuthClient.
+
+        Args:
+            directory: The directory to serve
+        """
+        super().__init__(
+            client_id="client-id",
+            client_secret="client-secret",  # noqa: S106
+            redirect_uri="urn:ietf:wg:oauth:2.0:oob",
+            scopes_application=[],
+            scopes_delegated=[],
+            token_url="https://example.com/token",  # noqa: S106
+            uid_cache=LocalCache(),
+        )
+        self.directory = directory
+
+    @override
+    @staticmethod
+    def extract_token(json_response: JSONDict) -> str:
+        return str(json_response["access_token"])
+
+    @override
+    def groups(self: Self) -> list[JSONDict]:
+        users = self.directory.users
+        return [
+            {
+                "cn": group["name"],
+                "description": "",
+                "gidNumber": group["gid_number"],
+                "memberUid": [
+                    users[user_idx]["username"]
+                    for user_idx in self.directory.group_members[idx]
+                ],
+                "oauth_id": group["id"],
+            }
+            for idx, group in enumerate(self.directory.groups)
+        ]
+
+    @override
+    def users(self: Self) -> list[JSONDict]:
+        return [
+            {
+                "cn": user["username"],
+                "description": "",
+                "displayName": f"{user['given_name']} {user['surname']}",
+                "domain": self.directory.domain,
+                "gidNumber": user["uid_number"],
+                "givenName": user["given_name"],
+                "homeDirectory": f"/home/{user['username']}",
+                "mail": self.directory.principal_name(idx),
+                "oauth_id": user["id"],
+                "oauth_username": self.directory.principal_name(idx),
+                "sn": user["surname"],
+                "uid": user["username"],
+                "uidNumber": user["uid_number"],
+            }
+            for idx, user in enumerate(self.directory.users)
+        ]
+
+    @override
+    def verify(self: Self, username: str, password: str) -> bool:
+        id((username, password))  # ignore unused arguments
+        return False
@@ -0,0 +1,196 @@
+"""Measure the memory used by each entry of an LDAP tree.
+
+The same synthetic directory is loaded into a plain ldaptor in-memory tree and into
+an Apricot LDAP tree, and the memory allocated per entry is reported for each.
+
+Usage: python -m benchmarks.tree_memory --users 20000 --groups-per-user 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from typing import TYPE_CHECKING, Any, cast
+
+from ldaptor.inmemory import ReadOnlyInMemoryLDAPEntry
+
+from apricot.ldap.oauth_ldap_tree import OAuthLDAPTree
+from apricot.models import LDAPAttributeAdaptor
+from apricot.snapshot import DirectorySnapshot
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from apricot.oauth import DirectoryClient, OAuthDataAdaptor
+
+
+def synthetic_snapshot(
+    root_dn: str,
+    n_users: int,
+    groups_per_user: int,
+) -> DirectorySnapshot:
+    """Construct a snapshot with one primary group per user and some shared groups.
+
+    Args:
+        root_dn: Distinguished name of the root of the LDAP tree
+        n_users: Number of users
+        groups_per_user: Number of shared groups that each user belongs to
+
+    Returns:
+        A DirectorySnapshot with the synthetic users and groups.
+    """
+    n_shared = max(groups_per_user, n_users // 100)
+    users, groups = [], []
+    for idx in range(n_users):
+        name = f"user{idx}"
+        memberships = [
+            f"CN=group{(idx + offset) % n_shared},OU=groups,{root_dn}"
+            for offset in range(groups_per_user)
+        ]
+        users.append(
+            LDAPAttributeAdaptor(
+                {
+                    "objectclass": [
+                        "top",
+                        "inetOrgPerson",
+                        "organizationalPerson",
+                        "person",
+                        "posixAccount",
+                    ],
+                    "cn": name,
+                    "description": "",
+                    "displayName": f"User {idx}",
+                    "gidNumber": 10000 + idx,
+                    "givenName": "User",
+                    "homeDirectory": f"/home/{name}",
+                    "memberOf": [*memberships, f"CN={name},OU=groups,{root_dn}"],
+                    "oauth_id": f"{idx:032x}",
+                    "oauth_username": f"{name}@example.com",
+                    "sn": str(idx),
+                    "uid": name,
+                    "uidNumber": 10000 + idx,
+                },
+            ),
+        )
+        groups.append(
+            LDAPAttributeAdaptor(
+                {
+                    "objectclass": ["top", "groupOfNames", "posixGroup"],
+                    "cn": name,
+                    "description": f"Primary user group for {name}",
+                    "gidNumber": 10000 + idx,
+                    "member": [f"CN={name},OU=users,{root_dn}"],
+                    "memberOf": [],
+                    "memberUid": [name],
+                    "oauth_id": f"{idx:032x}",
+                },
+            ),
+        )
+    for idx in range(n_shared):
+        members = [
+            f"user{user_idx}"
+            for user_idx in range(n_users)
+            if (idx - user_idx) % n_shared < groups_per_user
+        ]
+        groups.append(
+            LDAPAttributeAdaptor(
+                {
+                    "objectclass": ["top", "groupOfNames", "posixGroup"],
+                    "cn": f"group{idx}",
+                    "description": "",
+                    "gidNumber": 30000 + idx,
+                    "member": [f"CN={uid},OU=users,{root_dn}" for uid in members],
+                    "memberOf": [],
+                    "memberUid": members,
+                    "oauth_id": f"{n_users + idx:032x}",
+                },
+            ),
+        )
+    return DirectorySnapshot(root_dn=root_dn, groups=groups, users=users)
+
+
+def build_ldaptor_tree(snapshot: DirectorySnapshot) -> ReadOnlyInMemoryLDAPEntry:
+    """Build a tree of plain ldaptor entries as a reference.
+
+    Args:
+        snapshot: The snapshot to build the tree from
+
+    Returns:
+        The root of the tree.
+    """
+    root = ReadOnlyInMemoryLDAPEntry(snapshot.root_dn, {"objectClass": ["dcObject"]})
+    groups_ou = root.addChild("OU=groups", {"ou": ["groups"]})
+    users_ou = root.addChild("OU=users", {"ou": ["users"]})
+    for group in snapshot.groups:
+        groups_ou.addChild(f"CN={group.cn}", group.to_dict())
+    for user in snapshot.users:
+        users_ou.addChild(f"CN={user.cn}", user.to_dict())
+    return root
+
+
+def build_apricot_tree(snapshot: DirectorySnapshot) -> OAuthLDAPTree:
+    """Build an Apricot LDAP tree without connecting to an OAuth backend.
+
+    Args:
+        snapshot: The snapshot to build the tree from
+
+    Returns:
+        The LDAP tree.
+    """
+    # Building from a snapshot does not use the OAuth adaptor or client
+    tree = OAuthLDAPTree(
+        cast("OAuthDataAdaptor", None),
+        cast("DirectoryClient", None),
+        background_refresh=True,
+        refresh_interval=60,
+    )
+    tree.build(snapshot)
+    return tree
+
+
+def measure(
+    build: Callable[[DirectorySnapshot], Any],
+    snapshot: DirectorySnapshot,
+) -> float:
+    """Measure the memory retained by a tree after building it.
+
+    Args:
+        build: Function that builds a tree from a snapshot
+        snapshot: The snapshot to build the tree from
+
+    Returns:
+        The number of bytes retained for each entry in the tree.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tree = build(snapshot)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return (after - before) / (len(snapshot.groups) + len(snapshot.users))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the memory used by each entry of an LDAP tree.",
+    )
+    parser.add_argument("--users", type=int, default=5000, help="Number of users.")
+    parser.add_argument(
+        "--groups-per-user",
+        type=int,
+        default=5,
+        help="Number of shared groups that each user belongs to.",
+    )
+    args = parser.parse_args()
+
+    snapshot = synthetic_snapshot("DC=example,DC=com", args.users, args.groups_per_user)
+    n_entries = len(snapshot.groups) + len(snapshot.users)
+    ldaptor_bytes = measure(build_ldaptor_tree, snapshot)
+    apricot_bytes = measure(build_apricot_tree, snapshot)
+    print(f"Entries:            {n_entries}")  # noqa: T201
+    print(f"ldaptor entries:    {ldaptor_bytes:.0f} bytes per entry")  # noqa: T201
+    print(f"Apricot entries:    {apricot_bytes:.0f} bytes per entry")  # noqa: T201
+    print(f"Reduction:          {ldaptor_bytes / apricot_bytes:.1f}x")  # noqa: T201
@@ -16,6 +16,24 @@ if [ -n "${DEBUG}" ]; then
     EXTRA_OPTS="${EXTRA_OPTS} --debug"
 fi
 
+if [ -n "${LDIF_EXPORT}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --ldif-export $LDIF_EXPORT"
+    if [ -n "${LDIF_EXPORT_ONLY}" ]; then
+        EXTRA_OPTS="${EXTRA_OPTS} --ldif-export-only"
+    fi
+fi
+
+if [ -n "${METRICS_PORT}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --metrics-port $METRICS_PORT"
+fi
+
+if [ -n "${SLOW_QUERY_THRESHOLD}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --slow-query-threshold $SLOW_QUERY_THRESHOLD"
+    if [ -n "${SLOW_QUERY_LOG}" ]; then
+        EXTRA_OPTS="${EXTRA_OPTS} --slow-query-log $SLOW_QUERY_LOG"
+    fi
+fi
+
 
 # LDAP tree arguments
 if [ -z "${DOMAIN}" ]; then
@@ -39,6 +57,22 @@ if [ -n "${DISABLE_USER_DOMAIN_VERIFICATION}" ]; then
     EXTRA_OPTS="${EXTRA_OPTS} --disable-user-domain-verification"
 fi
 
+if [ -n "${ENABLE_TRANSITIVE_MEMBERSHIP}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --enable-transitive-membership"
+fi
+
+if [ -n "${MAX_VALUE_RANGE}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --max-value-range $MAX_VALUE_RANGE"
+fi
+
+if [ -n "${NEGATIVE_CACHE_SIZE}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --negative-cache-size $NEGATIVE_CACHE_SIZE"
+fi
+
+if [ -n "${NEGATIVE_CACHE_TTL}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --negative-cache-ttl $NEGATIVE_CACHE_TTL"
+fi
+
 
 # OAuth client arguments
 if [ -z "${BACKEND}" ]; then
@@ -46,14 +80,18 @@ if [ -z "${BACKEND}" ]; then
     exit 1
 fi
 
-if [ -z "${CLIENT_ID}" ]; then
-    echo "$(date +'%Y-%m-%d %H:%M:%S') [INFO    ] CLIENT_ID environment variable is not set"
-    exit 1
-fi
-
-if [ -z "${CLIENT_SECRET}" ]; then
-    echo "$(date +'%Y-%m-%d %H:%M:%S') [INFO    ] CLIENT_SECRET environment variable is not set"
-    exit 1
+# ... client credentials are not needed by the File backend
+if [ "${BACKEND}" != "File" ]; then
+    if [ -z "${CLIENT_ID}" ]; then
+        echo "$(date +'%Y-%m-%d %H:%M:%S') [INFO    ] CLIENT_ID environment variable is not set"
+        exit 1
+    fi
+    if [ -z "${CLIENT_SECRET}" ]; then
+        echo "$(date +'%Y-%m-%d %H:%M:%S') [INFO    ] CLIENT_SECRET environment variable is not set"
+        exit 1
+    fi
+    # ... pass these as positional arguments to keep them quoted
+    set -- "$@" --client-id "${CLIENT_ID}" --client-secret "${CLIENT_SECRET}"
 fi
 
 
@@ -62,10 +100,38 @@ if [ -n "${BACKGROUND_REFRESH}" ]; then
     EXTRA_OPTS="${EXTRA_OPTS} --background-refresh"
 fi
 
+if [ -n "${PROFILE_REFRESH}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --profile-refresh $PROFILE_REFRESH"
+fi
+
+if [ -n "${PROFILE_REFRESH_THRESHOLD}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --profile-refresh-threshold $PROFILE_REFRESH_THRESHOLD"
+fi
+
+if [ -n "${REFRESH_BACKOFF}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --refresh-backoff $REFRESH_BACKOFF"
+fi
+
 if [ -n "${REFRESH_INTERVAL}" ]; then
     EXTRA_OPTS="${EXTRA_OPTS} --refresh-interval $REFRESH_INTERVAL"
 fi
 
+if [ -n "${REFRESH_MAX_BACKOFF}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --refresh-max-backoff $REFRESH_MAX_BACKOFF"
+fi
+
+if [ -n "${REFRESH_MAX_SHRINK}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --refresh-max-shrink $REFRESH_MAX_SHRINK"
+fi
+
+if [ -n "${REFRESH_SHRINK_CONFIRMATIONS}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --refresh-shrink-confirmations $REFRESH_SHRINK_CONFIRMATIONS"
+fi
+
+if [ -n "${SNAPSHOT_PATH}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --snapshot-path $SNAPSHOT_PATH"
+fi
+
 
 # Backend arguments: Entra
 if [ -n "${ENTRA_TENANT_ID}" ]; then
@@ -73,6 +139,15 @@ if [ -n "${ENTRA_TENANT_ID}" ]; then
 fi
 
 
+# Backend arguments: File
+if [ -n "${FILE_PATH}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --file-path $FILE_PATH"
+fi
+if [ -n "${FILE_POLL_INTERVAL}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --file-poll-interval $FILE_POLL_INTERVAL"
+fi
+
+
 # Backend arguments: Keycloak
 if [ -n "${KEYCLOAK_BASE_URL}" ]; then
     if [ -z "${KEYCLOAK_REALM}" ]; then
@@ -84,6 +159,12 @@ fi
 if [ -n "${KEYCLOAK_DOMAIN_ATTRIBUTE}" ]; then
     EXTRA_OPTS="${EXTRA_OPTS} --keycloak-domain-attribute $KEYCLOAK_DOMAIN_ATTRIBUTE"
 fi
+if [ -n "${KEYCLOAK_MEMBERSHIP_STRATEGY}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --keycloak-membership-strategy $KEYCLOAK_MEMBERSHIP_STRATEGY"
+fi
+if [ -n "${KEYCLOAK_WRITE_BACK_WORKERS}" ]; then
+    EXTRA_OPTS="${EXTRA_OPTS} --keycloak-write-back-workers $KEYCLOAK_WRITE_BACK_WORKERS"
+fi
 
 
 # Redis arguments
@@ -93,6 +174,9 @@ if [ -n "${REDIS_HOST}" ]; then
         echo "$(date +'%Y-%m-%d %H:%M:%S') [INFO    ] REDIS_PORT environment variable is not set: using default of '${REDIS_PORT}'"
     fi
     EXTRA_OPTS="${EXTRA_OPTS} --redis-host $REDIS_HOST --redis-port $REDIS_PORT"
+    if [ -n "${SHARED_REFRESH}" ]; then
+        EXTRA_OPTS="${EXTRA_OPTS} --shared-refresh"
+    fi
 fi
 
 
@@ -118,8 +202,7 @@ fi
 # Run the server
 hatch run python run.py \
     --backend "${BACKEND}" \
-    --client-id "${CLIENT_ID}" \
-    --client-secret "${CLIENT_SECRET}"  \
     --domain "${DOMAIN}" \
     --port "${PORT}" \
-    $EXTRA_OPTS
+    $EXTRA_OPTS \
+    "$@"
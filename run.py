@@ -2,7 +2,7 @@ import argparse
 import sys
 
 from apricot import ApricotServer
-from apricot.oauth import OAuthBackend
+from apricot.oauth import KeycloakMembershipStrategy, OAuthBackend
 
 if __name__ == "__main__":
     try:
@@ -23,6 +23,21 @@ if __name__ == "__main__":
             action="store_true",
             help="Enable debug logging.",
         )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Port on which to serve Prometheus metrics at '/metrics'.",
+        )
+        parser.add_argument(
+            "--slow-query-threshold",
+            type=float,
+            help="Log LDAP requests that take longer than this many seconds.",
+        )
+        parser.add_argument(
+            "--slow-query-log",
+            type=str,
+            help="File to write slow LDAP requests to instead of the main log.",
+        )
 
         # LDAP tree settings
         ldap_group = parser.add_argument_group("LDAP tree settings")
@@ -61,6 +76,31 @@ if __name__ == "__main__":
             dest="enable_user_domain_verification",
             help="Disable check that users belong to the correct domain.",
         )
+        ldap_group.add_argument(
+            "--enable-transitive-membership",
+            action="store_true",
+            default=False,
+            dest="enable_transitive_membership",
+            help="Add an isMemberOf attribute listing nested group memberships.",
+        )
+        ldap_group.add_argument(
+            "--max-value-range",
+            type=int,
+            default=0,
+            help="Maximum number of values to return per attribute (0 for no limit).",
+        )
+        ldap_group.add_argument(
+            "--negative-cache-size",
+            type=int,
+            default=10000,
+            help="How many lookups and searches that found nothing to remember.",
+        )
+        ldap_group.add_argument(
+            "--negative-cache-ttl",
+            type=int,
+            default=60,
+            help="How long to remember lookups and searches that found nothing.",
+        )
 
         # OAuth client settings
         oauth_group = parser.add_argument_group("OAuth settings")
@@ -75,15 +115,27 @@ if __name__ == "__main__":
             "-i",
             "--client-id",
             type=str,
-            help="OAuth client ID.",
-            required=True,
+            help="OAuth client ID (not needed for the File backend).",
         )
         oauth_group.add_argument(
             "-s",
             "--client-secret",
             type=str,
-            help="OAuth client secret.",
-            required=True,
+            help="OAuth client secret (not needed for the File backend).",
+        )
+
+        # Options for exporting the tree
+        export_group = parser.add_argument_group("LDIF export")
+        export_group.add_argument(
+            "--ldif-export",
+            type=str,
+            help="File or UNIX socket to export the LDAP tree to as LDIF on SIGUSR1, or '-' for standard output.",  # noqa: E501
+        )
+        export_group.add_argument(
+            "--ldif-export-only",
+            action="store_true",
+            default=False,
+            help="Export the LDAP tree to --ldif-export once and exit.",
         )
 
         # Options for refreshing the tree
@@ -94,12 +146,55 @@ if __name__ == "__main__":
             default=False,
             help="Refresh in the background instead of as needed per request",
         )
+        refresh_group.add_argument(
+            "--profile-refresh",
+            type=str,
+            help="Directory in which to save a cProfile dump of each slow refresh.",
+        )
+        refresh_group.add_argument(
+            "--profile-refresh-threshold",
+            type=float,
+            default=30,
+            help="Refreshes taking longer than this many seconds are profiled.",
+        )
+        refresh_group.add_argument(
+            "--refresh-backoff",
+            type=float,
+            default=10,
+            help="Seconds to wait before retrying a failed refresh, doubling after "
+            "each consecutive failure.",
+        )
         refresh_group.add_argument(
             "--refresh-interval",
             type=int,
             default=60,
             help="How often to refresh the database in seconds",
         )
+        refresh_group.add_argument(
+            "--refresh-max-backoff",
+            type=float,
+            default=600,
+            help="Maximum number of seconds to wait before retrying a failed refresh.",
+        )
+        refresh_group.add_argument(
+            "--refresh-max-shrink",
+            type=float,
+            default=0.5,
+            help="Refuse refreshes that would remove more than this fraction of users "
+            "or groups (1 to allow any change).",
+        )
+        refresh_group.add_argument(
+            "--refresh-shrink-confirmations",
+            type=int,
+            default=3,
+            help="Accept a refused refresh once this many consecutive refreshes have "
+            "returned the same number of users and groups.",
+        )
+        refresh_group.add_argument(
+            "--snapshot-path",
+            type=str,
+            help="File used to persist the LDAP tree so it can be served on startup.",
+        )
 
         # Options for Microsoft Entra backend
         entra_group = parser.add_argument_group("Microsoft Entra backend")
@@ -127,6 +222,32 @@ if __name__ == "__main__":
             default="domain",
             help="The attribute in Keycloak that contains the users' domain.",
         )
+        keycloak_group.add_argument(
+            "--keycloak-membership-strategy",
+            type=KeycloakMembershipStrategy,
+            default=KeycloakMembershipStrategy.AUTO,
+            help="How to find group members: 'per-group', 'per-user' or 'auto' to choose based on the number of users and groups.",  # noqa: E501
+        )
+        keycloak_group.add_argument(
+            "--keycloak-write-back-workers",
+            type=int,
+            default=4,
+            help="How many concurrent requests to use when writing generated UIDs back to Keycloak.",  # noqa: E501
+        )
+
+        # Options for file backend
+        file_group = parser.add_argument_group("File backend")
+        file_group.add_argument(
+            "--file-path",
+            type=str,
+            help="JSON, JSONL or LDIF export of users and groups to serve.",
+        )
+        file_group.add_argument(
+            "--file-poll-interval",
+            type=int,
+            default=5,
+            help="How often to check whether the export has changed in seconds.",
+        )
 
         # Options for Redis cache
         redis_group = parser.add_argument_group("Redis")
@@ -140,6 +261,12 @@ if __name__ == "__main__":
             type=int,
             help="Port for Redis server.",
         )
+        redis_group.add_argument(
+            "--shared-refresh",
+            action="store_true",
+            default=False,
+            help="Share the LDAP tree with other replicas using the same Redis server.",
+        )
 
         # Options for TLS
         tls_group = parser.add_argument_group("TLS")